@@ -0,0 +1,143 @@
+"""Бенчмарк нормализации шрифтов.
+
+Сравнивает прежнюю схему (каждый запрос заново разбирает шаблон и
+переписывает шрифт во всех run, сохраняя и восстанавливая размер,
+начертание и цвет) с текущей: шрифт применяется один раз при загрузке
+шаблона в кэш, на запрос меняются только заполняемые run.
+
+Запуск из корня репозитория:
+    python -m benchmarks.fonts --runs 20
+"""
+import argparse
+import statistics
+import time
+
+from pptx import Presentation
+
+from bot.ppt_service import PPTService
+
+SAMPLE_DATA = {
+    'company_name': 'ООО Ромашка',
+    'hr_licenses': 3,
+    'employee_licenses': 250,
+    'on_premises': 'Да',
+}
+
+
+def legacy_font_writes(run, font_name):
+    """Прежняя обработка run: шрифт плюс перезапись сохранённых свойств"""
+    original_size = run.font.size
+    original_color = run.font.color.rgb if run.font.color and run.font.color.rgb else None
+
+    writes = 0
+    run.font.name = font_name
+    writes += 1
+    if original_size:
+        run.font.size = original_size
+        writes += 1
+    run.font.bold = run.font.bold
+    run.font.italic = run.font.italic
+    run.font.underline = run.font.underline
+    writes += 3
+    if original_color:
+        run.font.color.rgb = original_color
+        writes += 1
+    return writes
+
+
+def legacy_normalize(prs, font_name):
+    """Прежний _ensure_consistent_fonts + _set_table_font для таблицы с расчётами"""
+    writes = 0
+    table_count = 0
+    for slide in prs.slides:
+        for shape in slide.shapes:
+            if shape.has_text_frame:
+                frames = [shape.text_frame]
+            elif shape.has_table:
+                table_count += 1
+                if table_count != 3:
+                    continue
+                frames = [cell.text_frame for row in shape.table.rows
+                          for cell in row.cells]
+            else:
+                continue
+            for frame in frames:
+                for paragraph in frame.paragraphs:
+                    for run in paragraph.runs:
+                        writes += legacy_font_writes(run, font_name)
+    return writes
+
+
+class CountingService(PPTService):
+    """PPTService, считающий записи в XML при заполнении"""
+
+    writes = 0
+
+    def _set_run_text(self, run, new_text):
+        self.writes += 1
+        super()._set_run_text(run, new_text)
+
+    def _apply_primary_font(self, run):
+        changed = super()._apply_primary_font(run)
+        self.writes += changed
+        return changed
+
+
+def measure(func, runs):
+    timings = []
+    for _ in range(runs):
+        started = time.perf_counter()
+        func()
+        timings.append((time.perf_counter() - started) * 1000)
+    return statistics.median(timings)
+
+
+def bench_template(template_type, runs):
+    service = CountingService()
+    template_path = service._template_path(template_type)
+    data = dict(SAMPLE_DATA, template_type=template_type)
+
+    def legacy():
+        prs = Presentation(template_path)
+        legacy_normalize(prs, service.primary_font)
+
+    def cached():
+        cached = service.template_cache.entry(template_path)
+        prs = service.template_cache.clone(cached)
+        service._replace_company_name(prs, cached.index, data['company_name'])
+        total = service._update_third_table(prs, cached.index, data)
+        service._update_price_text(prs, cached.index, total)
+
+    # Прогрев кэша не входит в замер на запрос
+    service.template_cache.entry(template_path)
+
+    legacy_writes = legacy_normalize(Presentation(template_path), service.primary_font)
+    service.writes = 0
+    cached()
+    cached_writes = service.writes
+
+    return {
+        'template': template_type,
+        'legacy_ms': measure(legacy, runs),
+        'cached_ms': measure(cached, runs),
+        'legacy_writes': legacy_writes,
+        'cached_writes': cached_writes,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--runs', type=int, default=20)
+    args = parser.parse_args()
+
+    print(f"{'шаблон':<8}{'было, мс':>10}{'стало, мс':>11}"
+          f"{'записей было':>15}{'стало':>7}")
+    for template_type in ('long', 'short'):
+        result = bench_template(template_type, args.runs)
+        print(f"{result['template']:<8}{result['legacy_ms']:>10.1f}"
+              f"{result['cached_ms']:>11.1f}{result['legacy_writes']:>15}"
+              f"{result['cached_writes']:>7}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,103 @@
+"""Бенчмарк хранилищ FSM.
+
+Прогоняет анкету FormKP (set_state + update_data на каждом шаге) для
+множества пользователей и печатает p50/p99 одного update_data для
+MemoryStorage, SQLiteStorage с записью пачками и той же базы с записью
+на каждом шаге (для сравнения), а также время сброса пачки на диск.
+
+Запуск из корня репозитория:
+    python -m benchmarks.fsm_storage --users 500
+"""
+import argparse
+import asyncio
+import os
+import shutil
+import statistics
+import tempfile
+import time
+
+from aiogram.fsm.storage.base import StorageKey
+from aiogram.fsm.storage.memory import MemoryStorage
+
+from bot.fsm_storage import SQLiteStorage
+from bot.states import FormKP
+
+STEPS = [
+    (FormKP.company_name, {'template_type': 'long'}),
+    (FormKP.hr_licenses, {'company_name': 'ООО Ромашка'}),
+    (FormKP.employee_licenses, {'hr_licenses': 3}),
+    (FormKP.on_premises, {'employee_licenses': 250}),
+    (None, {'on_premises': 'Да'}),
+]
+
+
+def percentile(values, share):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * share))]
+
+
+async def run_form(storage, users, write_through=False):
+    """Проходит анкету всеми пользователями по шагам вперемешку,
+    возвращает длительности update_data в секундах"""
+    keys = [StorageKey(bot_id=1, chat_id=user, user_id=user)
+            for user in range(1, users + 1)]
+    timings = []
+    for state, data in STEPS:
+        for key in keys:
+            await storage.set_state(key, state)
+            started = time.perf_counter()
+            await storage.update_data(key, data)
+            if write_through:
+                await storage.flush()
+            timings.append(time.perf_counter() - started)
+    return timings
+
+
+async def measure_flush(storage, users):
+    """Время сброса на диск пачки из users изменённых сессий"""
+    for user in range(1, users + 1):
+        key = StorageKey(bot_id=2, chat_id=user, user_id=user)
+        await storage.set_state(key, FormKP.company_name)
+        await storage.update_data(key, {'template_type': 'short'})
+    started = time.perf_counter()
+    await storage.flush()
+    return time.perf_counter() - started
+
+
+def report(name, timings):
+    ms = [value * 1000 for value in timings]
+    print(f"  {name:<22}{statistics.median(ms):>8.4f}{percentile(ms, 0.99):>8.4f}"
+          f"{max(ms):>8.3f}")
+
+
+async def run(args):
+    directory = tempfile.mkdtemp(prefix='kp_bench_fsm_')
+    print(f"Пользователей: {args.users}, шагов анкеты: {len(STEPS)}")
+    print(f"  {'update_data, мс':<22}{'p50':>8}{'p99':>8}{'max':>8}")
+
+    report('memory', await run_form(MemoryStorage(), args.users))
+
+    batched = SQLiteStorage(os.path.join(directory, 'batched.sqlite3'), ttl=3600,
+                            flush_interval=args.flush_interval)
+    report('sqlite, пачками', await run_form(batched, args.users))
+    flush = await measure_flush(batched, args.users)
+    await batched.close()
+
+    direct = SQLiteStorage(os.path.join(directory, 'direct.sqlite3'), ttl=3600,
+                           flush_interval=3600)
+    report('sqlite, каждый шаг', await run_form(direct, args.users, write_through=True))
+    await direct.close()
+
+    print(f"\nСброс пачки из {args.users} сессий: {flush * 1000:.1f} мс")
+    shutil.rmtree(directory, ignore_errors=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--users', type=int, default=500)
+    parser.add_argument('--flush-interval', type=float, default=0.2)
+    asyncio.run(run(parser.parse_args()))
+
+
+if __name__ == '__main__':
+    main()
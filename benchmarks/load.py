@@ -0,0 +1,431 @@
+"""Нагрузочный тест бота с локальной заменой Telegram Bot API.
+
+Поднимает в отдельном потоке aiohttp-сервер, который отвечает на запросы
+бота вместо api.telegram.org, и прогоняет через настоящие dp и router
+сотни виртуальных пользователей: /make_kp -> анкета FormKP -> КП ->
+«Сделать PDF». Пользователи приходят с заданной частотой и «думают»
+между шагами. Печатает задержку ответа на каждом шаге (от апдейта до
+сообщения бота), отставание event loop и долю ошибок по шагам и причинам.
+Сеть не нужна; для шага PDF нужен LibreOffice.
+
+Запуск из корня репозитория:
+    python -m benchmarks.load --users 300 --rate 20
+    python -m benchmarks.load --users 100 --rate 50 --think 0 --pdf-share 0
+    GENERATION_MODE=workers python -m benchmarks.load --output load.json
+"""
+import argparse
+import asyncio
+import itertools
+import json
+import os
+import platform
+import random
+import shutil
+import tempfile
+import threading
+import time
+from collections import Counter
+from datetime import datetime
+
+# Бот импортируется с токеном-заглушкой: все запросы всё равно уходят на
+# локальный сервер. Хранилища — в памяти, прогрев — до первого апдейта,
+# временные файлы — в своей папке, чтобы уборщик не трогал рабочую
+os.environ.setdefault('BOT_TOKEN', '123456:load-test-token')
+os.environ.setdefault('OUTPUT_SPOOL_DIR', tempfile.mkdtemp(prefix='kp_load_'))
+os.environ.setdefault('FSM_STORAGE', 'memory')
+os.environ.setdefault('ARTIFACT_STORE', 'memory')
+os.environ.setdefault('STARTUP_WARMUP', 'blocking')
+os.environ.setdefault('METRICS_PORT', '0')
+os.environ.setdefault('LOG_LEVEL', 'WARNING')
+
+from aiogram import types
+from aiogram.dispatcher.event.bases import UNHANDLED
+from aiogram.client.session.aiohttp import AiohttpSession
+from aiogram.client.telegram import TelegramAPIServer
+from aiohttp import web
+
+import main as bot_main
+from benchmarks.pipeline import percentile, summarize, peak_rss_mb, git_revision
+from bot.app import dp, bot
+from config.config import LIBREOFFICE_BIN, OUTPUT_SPOOL_DIR
+
+COMPANIES = ['ООО Ромашка', 'ИП Иванов', 'АО «Очень длинное название холдинговой компании»']
+# Шаги анкеты; на шагах DOCUMENT_STEPS ответом считается только файл
+STEPS = ['make_kp', 'template', 'company', 'hr', 'employees', 'on_premises', 'pdf']
+DOCUMENT_STEPS = ('on_premises', 'pdf')
+# Сообщения о ходе работы не завершают шаг, ошибки и отказы — завершают
+PROGRESS_PREFIX = '🔄'
+ERROR_PREFIXES = ('❌', '⏳')
+
+
+class FakeBotAPI:
+    """Bot API на 127.0.0.1 в своём потоке и своём event loop.
+
+    Каждый запрос бота передаётся в основной цикл через on_request, ответ
+    приходит через latency секунд — как задержка сети до Telegram.
+    """
+
+    def __init__(self, latency: float, on_request):
+        self.latency = latency
+        self.on_request = on_request
+        self.port = None
+        self.requests = Counter()
+        self._ids = itertools.count(1)
+        self._loop = None
+        self._runner = None
+        self._thread = None
+
+    async def _handle(self, request):
+        method = request.match_info['method'].lower()
+        if request.content_type == 'application/json':
+            fields = await request.json()
+        else:
+            fields = {}
+            for name, value in (await request.post()).items():
+                # Содержимое файла не нужно, только имя
+                fields[name] = value if isinstance(value, str) else value.filename
+        self.requests[method] += 1
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        # Пользователь видит сообщение, когда Telegram его принял
+        self.on_request(method, fields)
+        return web.json_response({'ok': True, 'result': self._result(method, fields)})
+
+    def _result(self, method: str, fields: dict):
+        if method == 'getme':
+            return {'id': 1, 'is_bot': True, 'first_name': 'KP', 'username': 'kp_load_bot'}
+        if not method.startswith(('send', 'edit')):
+            return True
+        message = {
+            'message_id': next(self._ids),
+            'date': int(time.time()),
+            'chat': {'id': int(fields.get('chat_id') or 1), 'type': 'private'},
+        }
+        if method == 'senddocument':
+            message['document'] = {'file_id': f"doc{message['message_id']}",
+                                   'file_unique_id': f"u{message['message_id']}"}
+        elif method == 'sendphoto':
+            message['photo'] = [{'file_id': f"photo{message['message_id']}",
+                                 'file_unique_id': f"u{message['message_id']}",
+                                 'width': 1, 'height': 1}]
+        else:
+            message['text'] = fields.get('text', '')
+        return message
+
+    async def _serve(self, started: threading.Event):
+        app = web.Application(client_max_size=64 * 1024 * 1024)
+        app.router.add_route('*', '/bot{token}/{method}', self._handle)
+        self._runner = web.AppRunner(app, access_log=None)
+        await self._runner.setup()
+        await web.TCPSite(self._runner, '127.0.0.1', 0).start()
+        self.port = self._runner.addresses[0][1]
+        started.set()
+
+    def start(self) -> str:
+        """Запускает сервер и возвращает его адрес для TelegramAPIServer"""
+        started = threading.Event()
+        self._loop = asyncio.new_event_loop()
+
+        def run():
+            asyncio.set_event_loop(self._loop)
+            self._loop.create_task(self._serve(started))
+            self._loop.run_forever()
+
+        self._thread = threading.Thread(target=run, name='fake-bot-api', daemon=True)
+        self._thread.start()
+        started.wait()
+        return f"http://127.0.0.1:{self.port}"
+
+    def stop(self):
+        asyncio.run_coroutine_threadsafe(self._runner.cleanup(), self._loop).result()
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread.join()
+
+
+class Simulation:
+    """Виртуальные пользователи и то, что бот им ответил"""
+
+    def __init__(self, args):
+        self.args = args
+        self.random = random.Random(args.seed)
+        self.loop = None
+        # chat_id -> очередь ответов бота этому пользователю
+        self.inbox = {}
+        self.update_ids = itertools.count(1)
+        self.message_ids = itertools.count(1)
+        self.latencies = {step: [] for step in STEPS}
+        self.flows = []
+        self.errors = Counter()
+        self.completed = 0
+        self.lag = []
+
+    def on_request(self, method: str, fields: dict):
+        """Вызывается в потоке сервера для каждого запроса бота"""
+        chat_id = fields.get('chat_id')
+        if method == 'answercallbackquery':
+            # id колбэка начинается с chat_id, иначе не понять, чей это ответ
+            chat_id = str(fields.get('callback_query_id', '')).split('_')[0]
+        if chat_id is None:
+            return
+        self.loop.call_soon_threadsafe(self._deliver, int(chat_id), (method, fields))
+
+    def _deliver(self, chat_id: int, event):
+        queue = self.inbox.get(chat_id)
+        if queue is not None:
+            queue.put_nowait(event)
+
+    def _message(self, user_id: int, text: str):
+        return types.Update(update_id=next(self.update_ids), message=types.Message(
+            message_id=next(self.message_ids), date=datetime.now(),
+            chat=types.Chat(id=user_id, type='private'),
+            from_user=types.User(id=user_id, is_bot=False, first_name='Менеджер'),
+            text=text,
+        ))
+
+    def _callback(self, user_id: int, data: str):
+        return types.Update(update_id=next(self.update_ids), callback_query=types.CallbackQuery(
+            id=f"{user_id}_{next(self.update_ids)}",
+            from_user=types.User(id=user_id, is_bot=False, first_name='Менеджер'),
+            chat_instance=str(user_id),
+            message=types.Message(message_id=next(self.message_ids), date=datetime.now(),
+                                  chat=types.Chat(id=user_id, type='private'), text='КП'),
+            data=data,
+        ))
+
+    async def _feed(self, user_id: int, update):
+        try:
+            result = await dp.feed_update(bot, update)
+        except Exception as e:
+            self._deliver(user_id, ('exception', {'text': f"{type(e).__name__}: {e}"}))
+            return
+        if result is UNHANDLED:
+            # Ни один хендлер не подошёл: например, ответ пришёл раньше смены состояния
+            self._deliver(user_id, ('unhandled', {}))
+
+    async def _step(self, user_id: int, step: str, update):
+        """Отправляет апдейт и ждёт ответа, завершающего шаг.
+        Возвращает поля ответа или None при ошибке"""
+        queue = self.inbox[user_id]
+        started = time.perf_counter()
+        asyncio.ensure_future(self._feed(user_id, update))
+        deadline = started + self.args.step_timeout
+        while True:
+            try:
+                method, fields = await asyncio.wait_for(
+                    queue.get(), max(0, deadline - time.perf_counter()))
+            except asyncio.TimeoutError:
+                self.errors[(step, 'timeout')] += 1
+                return None
+
+            text = str(fields.get('text') or fields.get('caption') or '')
+            if method == 'exception':
+                self.errors[(step, text)] += 1
+                return None
+            if method == 'unhandled':
+                self.errors[(step, 'апдейт не обработан')] += 1
+                return None
+            if method == 'answercallbackquery':
+                if not text:
+                    continue
+                # Всплывающий отказ: лимит частоты, занятая очередь
+                self.errors[(step, text.splitlines()[0][:60])] += 1
+                return None
+            if text.startswith(PROGRESS_PREFIX):
+                continue
+            if text.startswith(ERROR_PREFIXES):
+                self.errors[(step, text.splitlines()[0][:60])] += 1
+                return None
+            if step in DOCUMENT_STEPS and method != 'senddocument':
+                continue
+            self.latencies[step].append((time.perf_counter() - started) * 1000)
+            return fields
+
+    async def _think(self):
+        if self.args.think:
+            await asyncio.sleep(self.random.uniform(0.5, 1.5) * self.args.think)
+
+    async def user(self, number: int):
+        """Один менеджер проходит анкету от /make_kp до PDF"""
+        user_id = 100000 + number
+        self.inbox[user_id] = asyncio.Queue()
+        on_premises = self.random.choice(('yes', 'no'))
+        answers = [
+            ('make_kp', self._message(user_id, '/make_kp')),
+            ('template', self._callback(user_id, self.random.choice(
+                ('template_long', 'template_short')))),
+            ('company', self._message(user_id, f"{self.random.choice(COMPANIES)} {number}")),
+            ('hr', self._message(user_id, str(self.random.randint(1, 50)))),
+            ('employees', self._message(user_id, str(self.random.randint(10, 5000)))),
+            ('on_premises', self._callback(user_id, f"on_premises_{on_premises}")),
+        ]
+        waited = 0.0
+        try:
+            reply = None
+            for step, update in answers:
+                if step != 'make_kp':
+                    await self._think()
+                step_started = time.perf_counter()
+                reply = await self._step(user_id, step, update)
+                waited += time.perf_counter() - step_started
+                if reply is None:
+                    return
+
+            if self.random.random() < self.args.pdf_share:
+                markup = json.loads(reply.get('reply_markup') or '{}')
+                buttons = [button.get('callback_data', '')
+                           for row in markup.get('inline_keyboard', []) for button in row]
+                make_pdf = next((data for data in buttons if data.startswith('make_pdf_')), None)
+                if make_pdf is None:
+                    self.errors[('pdf', 'нет кнопки PDF')] += 1
+                    return
+                await self._think()
+                step_started = time.perf_counter()
+                reply = await self._step(user_id, 'pdf', self._callback(user_id, make_pdf))
+                waited += time.perf_counter() - step_started
+                if reply is None:
+                    return
+
+            self.completed += 1
+            # Сколько пользователь ждал бота за всю анкету, без пауз на раздумья
+            self.flows.append(waited * 1000)
+        finally:
+            del self.inbox[user_id]
+
+    async def monitor_lag(self, interval: float = 0.05):
+        """Насколько позже запланированного просыпается event loop"""
+        while True:
+            started = self.loop.time()
+            await asyncio.sleep(interval)
+            self.lag.append(max(0.0, self.loop.time() - started - interval) * 1000)
+
+
+async def run(args):
+    simulation = Simulation(args)
+    simulation.loop = asyncio.get_running_loop()
+    api = FakeBotAPI(args.api_latency / 1000, simulation.on_request)
+    bot.session = AiohttpSession(api=TelegramAPIServer.from_base(api.start()))
+
+    if args.pdf_share and not shutil.which(LIBREOFFICE_BIN):
+        print(f"LibreOffice ({LIBREOFFICE_BIN}) не найден — шаг PDF будет с ошибками, "
+              f"уберите его через --pdf-share 0")
+
+    startup_started = time.perf_counter()
+    await bot_main.on_startup()
+    startup = time.perf_counter() - startup_started
+
+    monitor = asyncio.ensure_future(simulation.monitor_lag())
+    users = []
+    started = time.perf_counter()
+    try:
+        # Открытая модель: пользователи приходят сами по себе, не дожидаясь остальных
+        for number in range(args.users):
+            users.append(asyncio.ensure_future(simulation.user(number)))
+            if args.rate:
+                await asyncio.sleep(simulation.random.expovariate(args.rate))
+        await asyncio.gather(*users)
+    finally:
+        wall = time.perf_counter() - started
+        monitor.cancel()
+        await bot_main.on_shutdown()
+        await dp.storage.close()
+        await bot.session.close()
+        api.stop()
+        shutil.rmtree(OUTPUT_SPOOL_DIR, ignore_errors=True)
+
+    failed = args.users - simulation.completed
+    return {
+        'meta': {
+            'timestamp': datetime.now().isoformat(timespec='seconds'),
+            'revision': git_revision(),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'cpu_count': os.cpu_count(),
+            'users': args.users,
+            'rate': args.rate,
+            'think_s': args.think,
+            'api_latency_ms': args.api_latency,
+            'pdf_share': args.pdf_share,
+            'generation_mode': os.getenv('GENERATION_MODE', 'thread'),
+        },
+        'startup_s': startup,
+        'wall_s': wall,
+        'completed': simulation.completed,
+        'error_rate': failed / args.users if args.users else 0.0,
+        'throughput_per_s': simulation.completed / wall if wall else 0.0,
+        'peak_rss_mb': peak_rss_mb(),
+        'steps': {step: summarize(values)
+                  for step, values in simulation.latencies.items() if values},
+        'flow': summarize(simulation.flows) if simulation.flows else None,
+        'loop_lag_ms': {
+            'p50': percentile(simulation.lag, 0.5),
+            'p99': percentile(simulation.lag, 0.99),
+            'max': max(simulation.lag, default=None),
+        },
+        'errors': [
+            {'step': step, 'reason': reason, 'count': count}
+            for (step, reason), count in simulation.errors.most_common()
+        ],
+        'api_requests': dict(api.requests),
+    }
+
+
+def print_report(report):
+    meta = report['meta']
+    print(f"Пользователей: {meta['users']}, приходят {meta['rate']}/с, "
+          f"пауза на шаге ~{meta['think_s']} с, задержка API {meta['api_latency_ms']} мс, "
+          f"режим генерации {meta['generation_mode']}")
+    print(f"Прогрев {report['startup_s']:.1f} с, прогон {report['wall_s']:.1f} с, "
+          f"пиковый RSS {report['peak_rss_mb']:.0f} МБ")
+    print(f"Прошли анкету: {report['completed']}, ошибок {report['error_rate']:.1%}, "
+          f"{report['throughput_per_s']:.2f} анкет/с")
+
+    print(f"\n{'шаг':<13}{'ответов':>8}{'p50, мс':>10}{'p95, мс':>10}{'max, мс':>10}")
+    for step in STEPS:
+        data = report['steps'].get(step)
+        if data:
+            print(f"{step:<13}{data['count']:>8}{data['p50_ms']:>10.1f}"
+                  f"{data['p95_ms']:>10.1f}{data['max_ms']:>10.1f}")
+    if report['flow']:
+        flow = report['flow']
+        print(f"{'вся анкета':<13}{flow['count']:>8}{flow['p50_ms']:>10.1f}"
+              f"{flow['p95_ms']:>10.1f}{flow['max_ms']:>10.1f}")
+
+    lag = report['loop_lag_ms']
+    if lag['max'] is not None:
+        print(f"\nОтставание event loop, мс: p50 {lag['p50']:.1f}, "
+              f"p99 {lag['p99']:.1f}, max {lag['max']:.1f}")
+
+    if report['errors']:
+        print("\nОшибки:")
+        for error in report['errors']:
+            print(f"  {error['step']:<13}{error['count']:>6}  {error['reason']}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--users', type=int, default=200,
+                        help='сколько пользователей пройдут анкету')
+    parser.add_argument('--rate', type=float, default=20,
+                        help='сколько новых пользователей в секунду (0 — все сразу)')
+    parser.add_argument('--think', type=float, default=1.0,
+                        help='средняя пауза пользователя между шагами, секунды')
+    parser.add_argument('--pdf-share', type=float, default=1.0,
+                        help='доля пользователей, которые нажимают «Сделать PDF»')
+    parser.add_argument('--api-latency', type=float, default=50,
+                        help='задержка ответа Bot API, миллисекунды')
+    parser.add_argument('--step-timeout', type=float, default=180,
+                        help='сколько ждать ответа бота на шаге, секунды')
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--output', help='куда сохранить JSON с результатами')
+    args = parser.parse_args()
+
+    report = asyncio.run(run(args))
+    print_report(report)
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+
+
+if __name__ == '__main__':
+    main()
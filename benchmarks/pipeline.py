@@ -0,0 +1,304 @@
+"""Бенчмарк конвейера КП: загрузка шаблона, нормализация шрифтов,
+заполнение, сохранение и конвертация в PDF.
+
+Генерирует КП по матрице входных данных для обоих шаблонов с заданной
+параллельностью и печатает p50/p95 по этапам, пиковый RSS и (с
+--trace-alloc) пик выделенной памяти на этапе. Результат сохраняется в
+JSON, с --compare сравнивается с прошлым прогоном.
+
+Запуск из корня репозитория:
+    python -m benchmarks.pipeline --repeat 5 --parallel 4 --output bench.json
+    python -m benchmarks.pipeline --pdf --compare bench.json
+    python -m benchmarks.pipeline --engine pptx --output pptx.json
+"""
+import argparse
+import asyncio
+import io
+import itertools
+import json
+import os
+import platform
+import resource
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime
+
+from pptx import Presentation
+
+from bot.pdf_converter import pdf_converter
+from bot.ppt_service import PPTService
+
+# Матрица входных данных: каждое сочетание генерируется для обоих шаблонов
+COMPANIES = ['ООО Ромашка', 'ИП Иванов', 'АО «Очень длинное название холдинговой компании»']
+HR_LICENSES = [1, 25]
+EMPLOYEE_LICENSES = [10, 5000]
+ON_PREMISES = ['Да', 'Нет']
+TEMPLATES = ['long', 'short']
+
+STAGES = ['load', 'fonts', 'prepare', 'clone', 'fill', 'save', 'convert']
+
+
+def build_matrix():
+    jobs = []
+    for template_type, company, hr, employees, on_premises in itertools.product(
+            TEMPLATES, COMPANIES, HR_LICENSES, EMPLOYEE_LICENSES, ON_PREMISES):
+        jobs.append({
+            'template_type': template_type,
+            'company_name': company,
+            'hr_licenses': hr,
+            'employee_licenses': employees,
+            'on_premises': on_premises,
+        })
+    return jobs
+
+
+class StageTimer:
+    """Время и (по желанию) пик выделенной памяти на этапах одного КП"""
+
+    def __init__(self, trace_alloc: bool):
+        self.trace_alloc = trace_alloc
+        self.times = {}
+        self.allocations = {}
+
+    def run(self, stage, func, *args):
+        if self.trace_alloc:
+            tracemalloc.reset_peak()
+            before = tracemalloc.get_traced_memory()[0]
+        started = time.perf_counter()
+        result = func(*args)
+        self.times[stage] = (time.perf_counter() - started) * 1000
+        if self.trace_alloc:
+            self.allocations[stage] = tracemalloc.get_traced_memory()[1] - before
+        return result
+
+
+def cold_load(service, template_type, trace_alloc):
+    """Холодная загрузка шаблона: разбор, шрифты и подготовка для кэша"""
+    timer = StageTimer(trace_alloc)
+    path = service._template_path(template_type)
+    prs = timer.run('load', Presentation, path)
+    timer.run('fonts', service._ensure_consistent_fonts, prs)
+    # Полная подготовка для кэша: повторный проход шрифтов уже без записей + индекс
+    timer.run('prepare', service._prepare_template, prs)
+    return timer
+
+
+def render(service, data, trace_alloc):
+    """Заполнение КП из кэша по тем же шагам, что в PPTService"""
+    timer = StageTimer(trace_alloc)
+    path = service._template_path(data['template_type'])
+    cached = service.template_cache.entry(path)
+
+    if service.render_engine == 'zip':
+        template = service.zip_templates.get(cached)
+        deck = timer.run('clone', template.open)
+        timer.run('fill', service._fill_presentation, deck, cached.index, data)
+        content = timer.run('save', template.save, deck)
+        return timer, content
+
+    prs = timer.run('clone', service.template_cache.clone, cached)
+    timer.run('fill', service._fill_presentation, prs, cached.index, data)
+
+    def save():
+        buffer = io.BytesIO()
+        prs.save(buffer)
+        return buffer.getvalue()
+
+    content = timer.run('save', save)
+    return timer, content
+
+
+async def run_job(service, data, semaphore, args, spool_dir, number):
+    async with semaphore:
+        started = time.perf_counter()
+        timer, content = await asyncio.to_thread(render, service, data, args.trace_alloc)
+        if args.pdf:
+            path = os.path.join(spool_dir, f'{number:04d}.pptx')
+            with open(path, 'wb') as f:
+                f.write(content)
+            convert_started = time.perf_counter()
+            pdf_path = await pdf_converter.convert(path)
+            timer.times['convert'] = (time.perf_counter() - convert_started) * 1000
+            if pdf_path is None:
+                timer.times['convert_failed'] = 1
+        timer.times['total'] = (time.perf_counter() - started) * 1000
+        return data['template_type'], timer
+
+
+def percentile(values, share):
+    values = sorted(values)
+    if not values:
+        return None
+    position = (len(values) - 1) * share
+    lower = int(position)
+    upper = min(lower + 1, len(values) - 1)
+    return values[lower] + (values[upper] - values[lower]) * (position - lower)
+
+
+def summarize(values):
+    return {
+        'count': len(values),
+        'mean_ms': statistics.fmean(values),
+        'p50_ms': percentile(values, 0.5),
+        'p95_ms': percentile(values, 0.95),
+        'max_ms': max(values),
+    }
+
+
+def peak_rss_mb():
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux отдаёт килобайты, macOS — байты
+    return peak / 1024 / (1024 if sys.platform == 'darwin' else 1)
+
+
+def git_revision():
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'],
+            capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+async def run(args):
+    service = PPTService()
+    service.render_engine = args.engine
+    if args.trace_alloc:
+        tracemalloc.start()
+
+    cold = {}
+    for template_type in TEMPLATES:
+        timer = cold_load(service, template_type, args.trace_alloc)
+        cold[template_type] = {'times_ms': timer.times, 'alloc_bytes': timer.allocations}
+        cached = service.template_cache.entry(service._template_path(template_type))
+        if args.engine == 'zip':
+            service.zip_templates.get(cached)
+
+    if args.pdf:
+        await pdf_converter.start()
+
+    jobs = build_matrix() * args.repeat
+    semaphore = asyncio.Semaphore(args.parallel)
+    spool_dir = tempfile.mkdtemp(prefix='kp_bench_')
+    started = time.perf_counter()
+    try:
+        results = await asyncio.gather(*(
+            run_job(service, data, semaphore, args, spool_dir, number)
+            for number, data in enumerate(jobs)
+        ))
+    finally:
+        wall = time.perf_counter() - started
+        shutil.rmtree(spool_dir, ignore_errors=True)
+        if args.pdf:
+            await pdf_converter.close()
+
+    stages = {}
+    per_template = {}
+    allocations = {}
+    failed_pdf = 0
+    for template_type, timer in results:
+        failed_pdf += int(timer.times.pop('convert_failed', 0))
+        for stage, value in timer.times.items():
+            stages.setdefault(stage, []).append(value)
+            per_template.setdefault(template_type, {}).setdefault(stage, []).append(value)
+        for stage, value in timer.allocations.items():
+            allocations.setdefault(stage, []).append(value)
+
+    return {
+        'meta': {
+            'timestamp': datetime.now().isoformat(timespec='seconds'),
+            'revision': git_revision(),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'cpu_count': os.cpu_count(),
+            'parallel': args.parallel,
+            'repeat': args.repeat,
+            'pdf': args.pdf,
+            'engine': args.engine,
+        },
+        'jobs': len(jobs),
+        'wall_s': wall,
+        'throughput_per_s': len(jobs) / wall,
+        'peak_rss_mb': peak_rss_mb(),
+        'pdf_failures': failed_pdf,
+        'cold_load': cold,
+        'stages': {stage: summarize(values) for stage, values in stages.items()},
+        'templates': {
+            template_type: {stage: summarize(values) for stage, values in data.items()}
+            for template_type, data in per_template.items()
+        },
+        'alloc_peak_bytes': {
+            stage: {'p50': percentile(values, 0.5), 'max': max(values)}
+            for stage, values in allocations.items()
+        },
+    }
+
+
+def print_report(report, baseline=None):
+    print(f"КП: {report['jobs']}, параллельно: {report['meta']['parallel']}, "
+          f"{report['throughput_per_s']:.1f} КП/с, пиковый RSS {report['peak_rss_mb']:.0f} МБ")
+    if report['pdf_failures']:
+        print(f"Не сконвертировано в PDF: {report['pdf_failures']}")
+
+    print("\nХолодная загрузка шаблонов, мс:")
+    for template_type, data in report['cold_load'].items():
+        times = ', '.join(f"{stage} {value:.1f}" for stage, value in data['times_ms'].items())
+        print(f"  {template_type:<6} {times}")
+
+    header = f"\n{'этап':<9}{'p50, мс':>10}{'p95, мс':>10}"
+    if baseline:
+        header += f"{'p50 было':>10}{'Δ p50':>9}"
+    print(header)
+    order = [stage for stage in STAGES + ['total'] if stage in report['stages']]
+    for stage in order:
+        data = report['stages'][stage]
+        line = f"{stage:<9}{data['p50_ms']:>10.1f}{data['p95_ms']:>10.1f}"
+        old = (baseline or {}).get('stages', {}).get(stage)
+        if old:
+            delta = (data['p50_ms'] - old['p50_ms']) / old['p50_ms'] * 100
+            line += f"{old['p50_ms']:>10.1f}{delta:>+8.0f}%"
+        print(line)
+
+    if report['alloc_peak_bytes']:
+        print("\nПик выделенной памяти на этапе (p50), КБ:")
+        for stage, data in report['alloc_peak_bytes'].items():
+            print(f"  {stage:<9}{data['p50'] / 1024:>10.0f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--repeat', type=int, default=3,
+                        help='сколько раз прогнать всю матрицу')
+    parser.add_argument('--parallel', type=int, default=1,
+                        help='сколько КП генерируется одновременно')
+    parser.add_argument('--pdf', action='store_true',
+                        help='замерять и конвертацию в PDF (нужен LibreOffice)')
+    parser.add_argument('--trace-alloc', action='store_true',
+                        help='считать память по этапам через tracemalloc '
+                             '(замедляет; точно только при --parallel 1)')
+    parser.add_argument('--engine', choices=('pptx', 'zip'), default='zip',
+                        help='движок сборки КП (как RENDER_ENGINE)')
+    parser.add_argument('--output', help='куда сохранить JSON с результатами')
+    parser.add_argument('--compare', help='JSON прошлого прогона для сравнения')
+    args = parser.parse_args()
+
+    report = asyncio.run(run(args))
+    baseline = None
+    if args.compare:
+        with open(args.compare, encoding='utf-8') as f:
+            baseline = json.load(f)
+    print_report(report, baseline)
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,36 @@
+"""Экземпляры Bot и Dispatcher с подключёнными роутерами.
+
+Пакет bot сам ничего не создаёт при импорте: его модули импортируют
+процессы пула генерации и forkserver, которым не нужны ни сессия
+Telegram, ни хранилище FSM, ни обработчики.
+"""
+from aiogram import Bot, Dispatcher
+from aiogram.enums.parse_mode import ParseMode
+from aiogram.client.default import DefaultBotProperties
+from aiogram.client.session.aiohttp import AiohttpSession
+from aiogram.client.telegram import TelegramAPIServer
+from config.config import BOT_TOKEN, TELEGRAM_API_URL
+from bot.fsm_storage import create_fsm_storage
+from bot.handlers import router
+from bot.middlewares import MetricsMiddleware, ThrottlingMiddleware
+from bot.rate_limit import rate_limiter
+
+
+session = None
+if TELEGRAM_API_URL:
+    session = AiohttpSession(api=TelegramAPIServer.from_base(TELEGRAM_API_URL))
+
+bot = Bot(
+    token=BOT_TOKEN,
+    session=session,
+    default=DefaultBotProperties(parse_mode=ParseMode.HTML)
+)
+dp = Dispatcher(storage=create_fsm_storage())
+
+# Регистрация роутеров
+router.message.middleware(MetricsMiddleware())
+router.callback_query.middleware(MetricsMiddleware())
+router.inline_query.middleware(MetricsMiddleware())
+router.message.middleware(ThrottlingMiddleware(rate_limiter))
+router.callback_query.middleware(ThrottlingMiddleware(rate_limiter))
+dp.include_router(router)
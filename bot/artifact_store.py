@@ -0,0 +1,231 @@
+import abc
+import asyncio
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+from config.config import (
+    ARTIFACT_STORE,
+    ARTIFACT_STORE_PATH,
+    ARTIFACT_MAX_MB,
+    OUTPUT_TTL_MINUTES,
+    REDIS_URL,
+)
+
+try:
+    # Нужен только для ARTIFACT_STORE=redis
+    from redis import asyncio as redis_asyncio
+except ImportError:
+    redis_asyncio = None
+
+
+class Artifact:
+    """Сохранённый файл: имя, содержимое и момент истечения (time.time())"""
+
+    def __init__(self, key: str, filename: str, content: bytes, expires_at: float):
+        self.key = key
+        self.filename = filename
+        self.content = content
+        self.expires_at = expires_at
+
+
+class ArtifactStore(abc.ABC):
+    """Реестр готовых файлов с TTL; ключ — идентификатор из callback_data"""
+
+    def __init__(self, ttl: float):
+        self.ttl = ttl
+
+    @abc.abstractmethod
+    async def put(self, key: str, filename: str, content: bytes):
+        """Сохраняет файл на ttl секунд"""
+
+    @abc.abstractmethod
+    async def get(self, key: str):
+        """Artifact по ключу или None, если его нет или он истёк"""
+
+    @abc.abstractmethod
+    async def delete(self, key: str):
+        """Удаляет файл по ключу"""
+
+    async def cleanup(self):
+        """Удаляет истёкшие записи"""
+
+    async def close(self):
+        pass
+
+
+class MemoryArtifactStore(ArtifactStore):
+    """Хранилище в памяти процесса с ограничением по объёму"""
+
+    def __init__(self, ttl: float, max_bytes: int):
+        super().__init__(ttl)
+        self.max_bytes = max_bytes
+        self._items = OrderedDict()
+        self._size = 0
+
+    def _drop(self, key: str):
+        artifact = self._items.pop(key, None)
+        if artifact is not None:
+            self._size -= len(artifact.content)
+
+    async def put(self, key: str, filename: str, content: bytes):
+        self._drop(key)
+        self._items[key] = Artifact(key, filename, content, time.time() + self.ttl)
+        self._size += len(content)
+        await self.cleanup()
+        # При нехватке места первыми уходят самые старые записи
+        while self._size > self.max_bytes and len(self._items) > 1:
+            self._drop(next(iter(self._items)))
+
+    async def get(self, key: str):
+        artifact = self._items.get(key)
+        if artifact is None or artifact.expires_at < time.time():
+            self._drop(key)
+            return None
+        return artifact
+
+    async def delete(self, key: str):
+        self._drop(key)
+
+    async def cleanup(self):
+        now = time.time()
+        # Записи добавляются по порядку истечения, поэтому хватает начала очереди
+        while self._items:
+            key, artifact = next(iter(self._items.items()))
+            if artifact.expires_at >= now:
+                break
+            self._drop(key)
+
+
+class SQLiteArtifactStore(ArtifactStore):
+    """Общее для нескольких процессов хранилище в файле SQLite"""
+
+    def __init__(self, ttl: float, path: str, max_bytes: int):
+        super().__init__(ttl)
+        self.path = path
+        self.max_bytes = max_bytes
+        self._local = threading.local()
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with self._connect() as conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS artifacts ("
+                " key TEXT PRIMARY KEY,"
+                " filename TEXT NOT NULL,"
+                " content BLOB NOT NULL,"
+                " size INTEGER NOT NULL,"
+                " expires_at REAL NOT NULL)"
+            )
+            conn.execute(
+                "CREATE INDEX IF NOT EXISTS artifacts_expires"
+                " ON artifacts (expires_at)"
+            )
+
+    def _connect(self):
+        # Соединение на поток: вызовы идут через asyncio.to_thread
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=10)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def _put(self, key, filename, content):
+        now = time.time()
+        with self._connect() as conn:
+            conn.execute("DELETE FROM artifacts WHERE expires_at < ?", (now,))
+            conn.execute(
+                "INSERT OR REPLACE INTO artifacts VALUES (?, ?, ?, ?, ?)",
+                (key, filename, content, len(content), now + self.ttl)
+            )
+            # Вытесняем самые старые записи сверх лимита
+            conn.execute(
+                "DELETE FROM artifacts WHERE key IN ("
+                " SELECT key FROM ("
+                "  SELECT key, SUM(size) OVER (ORDER BY expires_at DESC) AS total"
+                "  FROM artifacts)"
+                " WHERE total > ? AND key != ?)",
+                (self.max_bytes, key)
+            )
+
+    def _get(self, key):
+        row = self._connect().execute(
+            "SELECT filename, content, expires_at FROM artifacts"
+            " WHERE key = ? AND expires_at >= ?",
+            (key, time.time())
+        ).fetchone()
+        if row is None:
+            return None
+        return Artifact(key, row[0], row[1], row[2])
+
+    def _delete(self, key):
+        with self._connect() as conn:
+            conn.execute("DELETE FROM artifacts WHERE key = ?", (key,))
+
+    def _cleanup(self):
+        with self._connect() as conn:
+            conn.execute("DELETE FROM artifacts WHERE expires_at < ?", (time.time(),))
+
+    async def put(self, key: str, filename: str, content: bytes):
+        await asyncio.to_thread(self._put, key, filename, content)
+
+    async def get(self, key: str):
+        return await asyncio.to_thread(self._get, key)
+
+    async def delete(self, key: str):
+        await asyncio.to_thread(self._delete, key)
+
+    async def cleanup(self):
+        await asyncio.to_thread(self._cleanup)
+
+
+class RedisArtifactStore(ArtifactStore):
+    """Хранилище в Redis; истечение делает сам Redis"""
+
+    def __init__(self, ttl: float, url: str, prefix: str = 'kp_bot:artifact:'):
+        super().__init__(ttl)
+        if redis_asyncio is None:
+            raise RuntimeError("Для ARTIFACT_STORE=redis установите пакет redis")
+        self.redis = redis_asyncio.from_url(url)
+        self.prefix = prefix
+
+    async def put(self, key: str, filename: str, content: bytes):
+        name = self.prefix + key
+        async with self.redis.pipeline(transaction=True) as pipe:
+            pipe.hset(name, mapping={'filename': filename, 'content': content})
+            pipe.expire(name, int(self.ttl))
+            await pipe.execute()
+
+    async def get(self, key: str):
+        name = self.prefix + key
+        async with self.redis.pipeline(transaction=True) as pipe:
+            pipe.hgetall(name)
+            pipe.ttl(name)
+            data, ttl = await pipe.execute()
+        if not data:
+            return None
+        return Artifact(key, data[b'filename'].decode(), data[b'content'],
+                        time.time() + max(ttl, 0))
+
+    async def delete(self, key: str):
+        await self.redis.delete(self.prefix + key)
+
+    async def close(self):
+        await self.redis.aclose()
+
+
+def create_artifact_store(kind: str = ARTIFACT_STORE) -> ArtifactStore:
+    ttl = OUTPUT_TTL_MINUTES * 60
+    max_bytes = ARTIFACT_MAX_MB * 1024 * 1024
+    if kind == 'sqlite':
+        return SQLiteArtifactStore(ttl, ARTIFACT_STORE_PATH, max_bytes)
+    if kind == 'redis':
+        return RedisArtifactStore(ttl, REDIS_URL)
+    return MemoryArtifactStore(ttl, max_bytes)
+
+
+artifact_store = create_artifact_store()
@@ -0,0 +1,357 @@
+import asyncio
+import csv
+import functools
+import io
+import logging
+import os
+import re
+import zipfile
+
+import aiofiles
+
+from bot.executor import generation_executor, GenerationTimeout
+from bot.janitor import janitor
+from bot.pdf_converter import pdf_converter
+from bot.ppt_service import generate_kp
+from bot.pricing import pricing
+from bot.scheduler import generation_scheduler, pdf_scheduler
+from bot.validators import (
+    parse_company_name,
+    parse_license_count,
+    parse_on_premises,
+    parse_template_type,
+)
+from config.config import BATCH_ARCHIVE_MAX_MB
+
+logger = logging.getLogger('Batch')
+
+# Колонки файла в порядке следования; первая строка — заголовки
+COLUMNS = (
+    ("template_type", "Вариант КП (long/short)"),
+    ("company_name", "Компания"),
+    ("hr_licenses", "Лицензии кадровика"),
+    ("employee_licenses", "Лицензии сотрудников"),
+    ("on_premises", "On-premises (да/нет)"),
+)
+
+PARSERS = {
+    "template_type": parse_template_type,
+    "company_name": parse_company_name,
+    "hr_licenses": parse_license_count,
+    "employee_licenses": parse_license_count,
+    "on_premises": parse_on_premises,
+}
+
+# Колонки quotes.csv в архиве пакета
+QUOTE_COLUMNS = (
+    "Строка", "Компания", "Лицензии кадровика", "Лицензии сотрудников",
+    "On-premises", "Базовая лицензия", "Кадровики", "Сотрудники",
+    "Лицензия on-premise", "Итого",
+)
+
+XLSX_NS = {'m': 'http://schemas.openxmlformats.org/spreadsheetml/2006/main'}
+REL_NS = 'http://schemas.openxmlformats.org/officeDocument/2006/relationships'
+
+
+class BatchRow:
+    """Строка пакетного файла: данные для КП или текст ошибки"""
+
+    def __init__(self, number: int, data: dict = None, error: str = None):
+        self.number = number
+        self.data = data
+        self.error = error
+
+
+def build_template_xlsx() -> bytes:
+    """Пустой XLSX-шаблон с заголовками и примером строки"""
+    import xlsxwriter
+
+    buffer = io.BytesIO()
+    workbook = xlsxwriter.Workbook(buffer, {'in_memory': True})
+    sheet = workbook.add_worksheet("КП")
+    header = workbook.add_format({'bold': True})
+    for col, (_, title) in enumerate(COLUMNS):
+        sheet.write(0, col, title, header)
+        sheet.set_column(col, col, max(len(title) + 2, 16))
+    sheet.write_row(1, 0, ["long", "ООО Ромашка", 3, 250, "нет"])
+    workbook.close()
+    return buffer.getvalue()
+
+
+def _read_csv(content: bytes):
+    try:
+        text = content.decode('utf-8-sig')
+    except UnicodeDecodeError:
+        # Excel под Windows сохраняет CSV в cp1251
+        text = content.decode('cp1251')
+    try:
+        dialect = csv.Sniffer().sniff(text[:4096], delimiters=';,\t')
+    except csv.Error:
+        dialect = csv.excel
+    return list(csv.reader(io.StringIO(text), dialect))
+
+
+# Последний столбец листа Excel — XFD
+MAX_COLUMNS = 16384
+
+
+def _column_index(ref: str) -> int:
+    letters = re.match(r'[A-Z]+', ref).group(0)
+    index = 0
+    for letter in letters:
+        index = index * 26 + ord(letter) - ord('A') + 1
+    if index > MAX_COLUMNS:
+        raise ValueError(f"Неверная ссылка на ячейку: {ref}")
+    return index - 1
+
+
+def _cell_value(cell, shared):
+    kind = cell.get('t')
+    if kind == 'inlineStr':
+        return ''.join(cell.xpath('.//m:t/text()', namespaces=XLSX_NS))
+    value = cell.findtext('m:v', namespaces=XLSX_NS)
+    if value is None:
+        return ''
+    if kind == 's':
+        return shared[int(value)]
+    if kind in ('str', 'b'):
+        return value
+    # Числа Excel хранит как float: 3 -> "3.0"
+    number = float(value)
+    return str(int(number)) if number.is_integer() else value
+
+
+def _read_xlsx(content: bytes):
+    """Первый лист XLSX без сторонних библиотек: zip + lxml"""
+    from lxml import etree
+
+    with zipfile.ZipFile(io.BytesIO(content)) as archive:
+        names = set(archive.namelist())
+        shared = []
+        if 'xl/sharedStrings.xml' in names:
+            root = etree.fromstring(archive.read('xl/sharedStrings.xml'))
+            for item in root.iterfind('m:si', XLSX_NS):
+                shared.append(''.join(item.xpath('.//m:t/text()', namespaces=XLSX_NS)))
+
+        workbook = etree.fromstring(archive.read('xl/workbook.xml'))
+        first_sheet = workbook.find('m:sheets/m:sheet', XLSX_NS)
+        rel_id = first_sheet.get(f'{{{REL_NS}}}id')
+        rels = etree.fromstring(archive.read('xl/_rels/workbook.xml.rels'))
+        target = next(
+            rel.get('Target') for rel in rels if rel.get('Id') == rel_id
+        )
+        sheet_path = target.lstrip('/') if target.startswith('/') else 'xl/' + target
+        sheet = etree.fromstring(archive.read(sheet_path))
+
+    rows = []
+    for row in sheet.iterfind('m:sheetData/m:row', XLSX_NS):
+        values = []
+        for cell in row.iterfind('m:c', XLSX_NS):
+            index = _column_index(cell.get('r'))
+            values.extend([''] * (index - len(values)))
+            values.append(_cell_value(cell, shared))
+        rows.append(values)
+    return rows
+
+
+def parse_batch_file(filename: str, content: bytes, max_rows: int):
+    """Разбирает CSV/XLSX в список BatchRow; первая строка — заголовки.
+    Любой нечитаемый файл — ValueError"""
+    from lxml import etree
+
+    if filename.lower().endswith('.xlsx'):
+        reader = _read_xlsx
+    elif filename.lower().endswith('.csv'):
+        reader = _read_csv
+    else:
+        raise ValueError("Поддерживаются только файлы .csv и .xlsx")
+    try:
+        rows = reader(content)
+    except ValueError:
+        raise
+    except (KeyError, IndexError, StopIteration, TypeError, AttributeError,
+            zipfile.BadZipFile, etree.XMLSyntaxError, csv.Error) as e:
+        # Битый архив, XML без нужных частей, ячейки без адреса и т.п.
+        raise ValueError("файл повреждён или это не таблица") from e
+
+    result = []
+    # Номера строк как в Excel: заголовок — первая строка
+    for number, values in enumerate(rows[1:], start=2):
+        if not any(str(value).strip() for value in values):
+            continue
+        if len(result) >= max_rows:
+            raise ValueError(f"В файле больше {max_rows} строк")
+        values = list(values) + [''] * (len(COLUMNS) - len(values))
+        data = {}
+        try:
+            for (field, title), value in zip(COLUMNS, values):
+                try:
+                    data[field] = PARSERS[field](value)
+                except ValueError:
+                    raise ValueError(f"{title}: «{value}»")
+        except ValueError as e:
+            result.append(BatchRow(number, error=str(e)))
+            continue
+        result.append(BatchRow(number, data=data))
+    return result
+
+
+def build_zip(files, errors) -> bytes:
+    """ZIP с готовыми файлами [(имя, содержимое)] и списком ошибок"""
+    buffer = io.BytesIO()
+    # .pptx и .pdf уже сжаты, повторно их не жмём
+    with zipfile.ZipFile(buffer, 'w', zipfile.ZIP_STORED) as archive:
+        for name, content in files:
+            archive.writestr(name, content)
+        if errors:
+            archive.writestr('errors.txt', '\n'.join(errors).encode('utf-8'))
+    return buffer.getvalue()
+
+
+def _zip_entry_size(name: str, content: bytes) -> int:
+    # Локальный заголовок и запись центрального каталога: ~100 байт плюс имя дважды
+    return len(content) + 100 + 2 * len(name.encode('utf-8'))
+
+
+def build_zips(files, errors, max_bytes: int):
+    """Те же файлы, разложенные по архивам не больше max_bytes каждый.
+    КП и его PDF (одно имя без расширения) попадают в один архив,
+    errors.txt — в первый"""
+    groups = {}
+    for name, content in files:
+        groups.setdefault(os.path.splitext(name)[0], []).append((name, content))
+
+    first = [] if not errors else [('errors.txt', '\n'.join(errors).encode('utf-8'))]
+    parts = [[]]
+    size = sum(_zip_entry_size(name, content) for name, content in first)
+    for group in groups.values():
+        group_size = sum(_zip_entry_size(name, content) for name, content in group)
+        # Группа больше лимита всё равно уходит отдельным архивом
+        if parts[-1] and size + group_size > max_bytes:
+            parts.append([])
+            size = 0
+        parts[-1].extend(group)
+        size += group_size
+    parts[0] = first + parts[0]
+    return [build_zip(part, []) for part in parts]
+
+
+def build_quotes(rows):
+    """Стоимость всех корректных строк одним расчётом, без сборки КП.
+    Возвращает (quotes.csv, сумма по всем строкам)"""
+    valid = [row for row in rows if row.data]
+    amounts = pricing.current().quote_batch(
+        [row.data['hr_licenses'] for row in valid],
+        [row.data['employee_licenses'] for row in valid],
+        [row.data['on_premises'] == 'Да' for row in valid],
+    )
+    buffer = io.StringIO()
+    # Точка с запятой и BOM — чтобы Excel открыл файл без мастера импорта
+    writer = csv.writer(buffer, delimiter=';')
+    writer.writerow(QUOTE_COLUMNS)
+    columns = [amounts[name] for name in ('base', 'hr', 'employee', 'on_premise', 'total')]
+    for i, row in enumerate(valid):
+        writer.writerow([
+            row.number, row.data['company_name'], row.data['hr_licenses'],
+            row.data['employee_licenses'], row.data['on_premises'],
+            *(int(column[i]) for column in columns),
+        ])
+    return buffer.getvalue().encode('utf-8-sig'), int(sum(amounts['total']))
+
+
+async def _render_row(number: int, data: dict, user_id):
+    """Генерирует одно КП в общем пуле в очереди пользователя.
+    None — КП не создано: ошибка одной строки не останавливает пакет"""
+    job = None
+    try:
+        job = generation_scheduler.submit(
+            user_id,
+            functools.partial(generation_executor.run, generate_kp,
+                              data['template_type'], data),
+            bounded=False
+        )
+        return await asyncio.shield(job)
+    except GenerationTimeout:
+        return None
+    except asyncio.CancelledError:
+        # Отменили саму задачу в планировщике, а не весь пакет
+        if job is None or not job.cancelled():
+            raise
+        logger.warning("Задача строки %s отменена", number)
+        return None
+    except Exception:
+        # Упавший или зависший воркер, ошибка рендера и т.п.
+        logger.exception("Не удалось создать КП для строки %s", number)
+        return None
+
+
+async def _convert_decks(decks, user_id):
+    """PDF для всех КП одним запуском LibreOffice"""
+    async with janitor.spool() as spool_dir:
+        paths = []
+        for name, content in decks:
+            path = os.path.join(spool_dir, name)
+            async with aiofiles.open(path, 'wb') as f:
+                await f.write(content)
+            paths.append(path)
+
+        pdfs = []
+        pdf_paths = await pdf_scheduler.run(
+            user_id,
+            functools.partial(pdf_converter.convert_batch, paths),
+            bounded=False
+        )
+        for pdf_path in pdf_paths:
+            if pdf_path is None:
+                continue
+            async with aiofiles.open(pdf_path, 'rb') as f:
+                pdfs.append((os.path.basename(pdf_path), await f.read()))
+        return pdfs
+
+
+async def generate_batch(rows, with_pdf: bool = False, on_progress=None,
+                         user_id=0):
+    """Генерирует КП по строкам параллельно в пуле генерации.
+    Возвращает (список zip не больше BATCH_ARCHIVE_MAX_MB, число КП, список ошибок)"""
+    errors = [f"Строка {row.number}: {row.error}" for row in rows if row.error]
+    valid = [row for row in rows if row.data]
+    # Пакет держит в очереди не больше задач, чем воркеров в пуле;
+    # планировщик чередует их с задачами других пользователей
+    semaphore = asyncio.Semaphore(generation_executor.workers)
+    done = 0
+
+    async def render(row):
+        nonlocal done
+        async with semaphore:
+            result = await _render_row(row.number, row.data, user_id)
+        done += 1
+        if on_progress is not None:
+            await on_progress(done, len(valid))
+        return row, result
+
+    decks = []
+    for row, result in await asyncio.gather(*(render(row) for row in valid)):
+        if result is None:
+            errors.append(f"Строка {row.number}: не удалось создать КП")
+            continue
+        filename, content = result
+        # Номер строки в имени: у одинаковых компаний имена не совпадут
+        name = f"{row.number:03d}_{filename}"
+        decks.append((name, content))
+
+    # Расчёт — первым: он попадает в первый архив
+    files = [('quotes.csv', build_quotes(valid)[0])] if valid else []
+    files.extend(decks)
+    if with_pdf and decks:
+        try:
+            pdfs = await _convert_decks(decks, user_id)
+        except Exception:
+            # КП уже готовы — отдаём их и без PDF
+            logger.exception("Не удалось сконвертировать пакет в PDF")
+            pdfs = []
+        if len(pdfs) < len(decks):
+            errors.append(f"PDF: сконвертировано {len(pdfs)} из {len(decks)}")
+        files.extend(pdfs)
+
+    archives = build_zips(files, errors, int(BATCH_ARCHIVE_MAX_MB * 1024 * 1024))
+    return archives, len(decks), errors
@@ -0,0 +1,53 @@
+"""Данные анкеты для ссылок вида t.me/<бот>?start=kp_<ключ>.
+
+В параметр start помещается только 64 символа, поэтому в ссылке лежит
+ключ КП, а сами данные — здесь. Ссылки выдаёт инлайн-режим: по кнопке
+под ответом с ценой пользователь попадает в чат с ботом и сразу получает КП.
+"""
+import threading
+import time
+from collections import OrderedDict
+
+from bot.ppt_service import ppt_service
+from config.config import DEEP_LINK_TTL_MINUTES
+
+DEEP_LINK_PREFIX = 'kp_'
+MAX_LINKS = 5000
+
+
+class DeepLinkStore:
+    """LRU ключ КП -> данные анкеты с ограниченным сроком жизни"""
+
+    def __init__(self, ttl: float, max_entries: int = MAX_LINKS):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def put(self, data: dict) -> str:
+        """Запоминает данные и возвращает параметр для ссылки"""
+        key = ppt_service.cache_key(data['template_type'], data)
+        with self._lock:
+            self._entries[key] = (time.monotonic(), dict(data))
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return DEEP_LINK_PREFIX + key
+
+    def get(self, payload: str):
+        """Данные анкеты по параметру ссылки или None, если ссылка устарела"""
+        if not payload.startswith(DEEP_LINK_PREFIX):
+            return None
+        key = payload[len(DEEP_LINK_PREFIX):]
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            created, data = entry
+            if time.monotonic() - created > self.ttl:
+                del self._entries[key]
+                return None
+            return dict(data)
+
+
+deep_links = DeepLinkStore(ttl=DEEP_LINK_TTL_MINUTES * 60)
@@ -0,0 +1,146 @@
+import asyncio
+import logging
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+
+from bot.metrics import registry, Gauge, GENERATION_REJECTED, GENERATION_TIMEOUTS
+from bot.ppt_service import warm_templates
+from bot.worker_pool import WorkerPool
+from config.config import (
+    GENERATION_MODE,
+    GENERATION_WORKERS,
+    GENERATION_QUEUE_SIZE,
+    GENERATION_TIMEOUT,
+)
+
+
+class GenerationQueueFull(Exception):
+    """Очередь генерации переполнена"""
+
+
+class GenerationTimeout(Exception):
+    """Генерация не уложилась в отведённое время"""
+
+
+class GenerationExecutor:
+    """Ограниченный пул воркеров для тяжёлой генерации вне event loop"""
+
+    def __init__(self, workers: int, mode: str = "thread",
+                 queue_size: int = 0, timeout: float = 120,
+                 initializer=None):
+        self.workers = max(1, workers)
+        self.mode = mode
+        self.queue_size = max(0, queue_size)
+        self.timeout = timeout
+        # Вызывается в каждом процессе пула при старте
+        self.initializer = initializer
+        self.logger = logging.getLogger('GenerationExecutor')
+        self._pool = None
+        # Задачи, занимающие пул (выполняются или ждут воркера)
+        self._pending = 0
+        self._lock = threading.Lock()
+
+    @property
+    def pending(self) -> int:
+        return self._pending
+
+    @property
+    def capacity(self) -> int:
+        return self.workers + self.queue_size
+
+    def _get_pool(self):
+        if self._pool is None:
+            if self.mode == "workers":
+                self._pool = WorkerPool(
+                    self.workers,
+                    initializer=self.initializer,
+                    job_timeout=self.timeout
+                )
+            elif self.mode == "process":
+                self._pool = ProcessPoolExecutor(
+                    max_workers=self.workers,
+                    initializer=self.initializer
+                )
+            else:
+                self._pool = ThreadPoolExecutor(
+                    max_workers=self.workers,
+                    thread_name_prefix="kp-gen"
+                )
+        return self._pool
+
+    def _release(self, _future=None):
+        # Вызывается из потока воркера, когда задача реально завершилась
+        with self._lock:
+            self._pending -= 1
+
+    async def run(self, func, *args, timeout: float = None):
+        """Выполняет func(*args) в пуле и ждёт результат не дольше timeout"""
+        with self._lock:
+            if self._pending >= self.capacity:
+                GENERATION_REJECTED.inc()
+                raise GenerationQueueFull(
+                    f"В очереди уже {self._pending} задач"
+                )
+            self._pending += 1
+
+        try:
+            future = self._get_pool().submit(func, *args)
+        except Exception:
+            self._release()
+            raise
+        # Счётчик уменьшается только по факту завершения задачи в пуле:
+        # поток нельзя прервать, поэтому после таймаута он ещё занят
+        future.add_done_callback(self._release)
+
+        try:
+            return await asyncio.wait_for(
+                asyncio.wrap_future(future),
+                timeout or self.timeout
+            )
+        except asyncio.TimeoutError:
+            GENERATION_TIMEOUTS.inc()
+            self.logger.warning(
+                "Генерация %s превысила таймаут %s с",
+                getattr(func, '__name__', func), timeout or self.timeout
+            )
+            raise GenerationTimeout() from None
+
+    async def warm(self):
+        """Заранее поднимает процессы пула, чтобы initializer отработал
+        до первого запроса; потоки дешёвые и создаются по требованию"""
+        if self.mode == "thread":
+            return
+        pool = self._get_pool()
+        # По задаче на воркер: пул запускает процессы, пока нет свободных
+        await asyncio.gather(*(
+            asyncio.wrap_future(pool.submit(os.getpid))
+            for _ in range(self.workers)
+        ))
+
+    async def shutdown(self, wait: bool = True):
+        """Останавливает пул, по умолчанию дожидаясь текущих задач"""
+        if self._pool is None:
+            return
+        pool, self._pool = self._pool, None
+        await asyncio.to_thread(pool.shutdown, wait)
+
+
+generation_executor = GenerationExecutor(
+    workers=GENERATION_WORKERS,
+    mode=GENERATION_MODE,
+    queue_size=GENERATION_QUEUE_SIZE,
+    timeout=GENERATION_TIMEOUT,
+    initializer=warm_templates,
+)
+
+registry.register(Gauge(
+    'kp_generation_in_flight',
+    'Генерации, которые сейчас выполняются воркерами',
+    callback=lambda: min(generation_executor.pending, generation_executor.workers),
+))
+registry.register(Gauge(
+    'kp_generation_queued',
+    'Генерации, ожидающие свободного воркера',
+    callback=lambda: max(0, generation_executor.pending - generation_executor.workers),
+))
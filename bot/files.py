@@ -0,0 +1,27 @@
+"""Имена файлов КП и идентификаторы задач.
+
+Название компании попадает в имя файла как есть, поэтому перед этим из
+него убираются разделители путей и символы, недопустимые в именах файлов.
+"""
+import re
+import uuid
+
+# Разделители путей, символы, запрещённые в Windows, и управляющие символы
+_UNSAFE_CHARS = re.compile(r'[\x00-\x1f\x7f\\/:*?"<>|]+')
+_SPACES = re.compile(r'\s+')
+# Запас до 255 байт: в UTF-8 кириллица занимает по два
+MAX_NAME_LENGTH = 100
+
+
+def new_job_id() -> str:
+    """Уникальный идентификатор задачи для временных папок и файлов"""
+    return uuid.uuid4().hex[:16]
+
+
+def safe_filename(name: str, default: str = "без_названия") -> str:
+    """Часть имени файла из произвольного текста: без путей и спецсимволов"""
+    name = _UNSAFE_CHARS.sub('_', str(name))
+    name = _SPACES.sub(' ', name).strip(' .')
+    # Точки и пробелы в конце имени Windows отбрасывает
+    name = name[:MAX_NAME_LENGTH].rstrip(' .')
+    return name or default
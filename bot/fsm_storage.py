@@ -0,0 +1,206 @@
+import asyncio
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+
+from aiogram.fsm.storage.base import BaseStorage, DefaultKeyBuilder, StorageKey
+from aiogram.fsm.storage.memory import MemoryStorage
+
+from config.config import (
+    FSM_STORAGE,
+    FSM_STORAGE_PATH,
+    FSM_TTL_MINUTES,
+    FSM_FLUSH_INTERVAL,
+    REDIS_URL,
+)
+
+try:
+    # Нужен только для FSM_STORAGE=redis
+    from aiogram.fsm.storage.redis import RedisStorage
+except ImportError:
+    RedisStorage = None
+
+
+class _Session:
+    """Состояние и данные одного ключа FSM в памяти"""
+
+    __slots__ = ('state', 'data', 'updated_at')
+
+    def __init__(self, state=None, data=None, updated_at=0.0):
+        self.state = state
+        self.data = data if data is not None else {}
+        self.updated_at = updated_at
+
+    @property
+    def empty(self) -> bool:
+        return self.state is None and not self.data
+
+
+class SQLiteStorage(BaseStorage):
+    """FSM в файле SQLite (WAL) с записью пачками.
+
+    Чтение и запись идут в словарь в памяти, поэтому шаг анкеты не ждёт
+    диска; изменённые ключи раз в flush_interval секунд сбрасываются в базу
+    одной транзакцией. После перезапуска сессии поднимаются из файла при
+    первом обращении. Сессии без изменений дольше ttl удаляются.
+    Процессы с общим файлом видят изменения друг друга только после сброса,
+    для одновременной работы нескольких экземпляров бота нужен Redis.
+    """
+
+    def __init__(self, path: str, ttl: float, flush_interval: float = 0.2,
+                 cleanup_interval: float = 60):
+        self.path = path
+        self.ttl = ttl
+        self.flush_interval = flush_interval
+        self.cleanup_interval = cleanup_interval
+        self.key_builder = DefaultKeyBuilder(with_bot_id=True, with_destiny=True)
+        self.logger = logging.getLogger('SQLiteStorage')
+        self._sessions = {}
+        self._dirty = set()
+        self._flush_task = None
+        self._last_cleanup = time.time()
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        # Соединение используется из потоков asyncio.to_thread по очереди
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, timeout=10, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        with self._conn:
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS fsm ("
+                " key TEXT PRIMARY KEY,"
+                " state TEXT,"
+                " data TEXT NOT NULL,"
+                " updated_at REAL NOT NULL)"
+            )
+            self._conn.execute(
+                "CREATE INDEX IF NOT EXISTS fsm_updated ON fsm (updated_at)"
+            )
+
+    def _load(self, key: str) -> _Session:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT state, data, updated_at FROM fsm"
+                " WHERE key = ? AND updated_at >= ?",
+                (key, time.time() - self.ttl)
+            ).fetchone()
+        if row is None:
+            return _Session()
+        return _Session(row[0], json.loads(row[1]), row[2])
+
+    async def _session(self, key: StorageKey) -> _Session:
+        name = self.key_builder.build(key)
+        session = self._sessions.get(name)
+        if session is None:
+            session = await asyncio.to_thread(self._load, name)
+            # Пока ключ читался из базы, его мог записать другой апдейт
+            session = self._sessions.setdefault(name, session)
+        return session
+
+    def _touch(self, key: StorageKey, session: _Session):
+        session.updated_at = time.time()
+        self._dirty.add(self.key_builder.build(key))
+        if self._flush_task is None or self._flush_task.done():
+            self._flush_task = asyncio.create_task(self._flush_later())
+
+    async def set_state(self, key: StorageKey, state=None) -> None:
+        session = await self._session(key)
+        session.state = state.state if hasattr(state, 'state') else state
+        self._touch(key, session)
+
+    async def get_state(self, key: StorageKey):
+        return (await self._session(key)).state
+
+    async def set_data(self, key: StorageKey, data) -> None:
+        session = await self._session(key)
+        session.data = dict(data)
+        self._touch(key, session)
+
+    async def get_data(self, key: StorageKey):
+        return dict((await self._session(key)).data)
+
+    async def _flush_later(self):
+        # Изменения, пришедшие во время записи, уходят следующей пачкой
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            await self.flush()
+            if not self._dirty:
+                break
+
+    def _snapshot(self):
+        """Забирает изменённые ключи; пустые сессии удаляются из памяти"""
+        upserts, deletes = [], []
+        for name in self._dirty:
+            session = self._sessions.get(name)
+            if session is None or session.empty:
+                self._sessions.pop(name, None)
+                deletes.append((name,))
+            else:
+                upserts.append((name, session.state,
+                                json.dumps(session.data, ensure_ascii=False),
+                                session.updated_at))
+        self._dirty = set()
+        return upserts, deletes
+
+    def _write(self, upserts, deletes, expired_before):
+        with self._lock, self._conn:
+            if upserts:
+                self._conn.executemany(
+                    "INSERT OR REPLACE INTO fsm VALUES (?, ?, ?, ?)", upserts)
+            if deletes:
+                self._conn.executemany("DELETE FROM fsm WHERE key = ?", deletes)
+            if expired_before is not None:
+                self._conn.execute(
+                    "DELETE FROM fsm WHERE updated_at < ?", (expired_before,))
+
+    def _expire_sessions(self, now: float):
+        expired_before = now - self.ttl
+        for name in [name for name, session in self._sessions.items()
+                     if session.updated_at < expired_before]:
+            if name not in self._dirty:
+                del self._sessions[name]
+        return expired_before
+
+    async def flush(self):
+        """Записывает накопленные изменения одной транзакцией"""
+        expired_before = None
+        now = time.time()
+        if now - self._last_cleanup >= self.cleanup_interval:
+            self._last_cleanup = now
+            expired_before = self._expire_sessions(now)
+        upserts, deletes = self._snapshot()
+        if not (upserts or deletes or expired_before):
+            return
+        try:
+            await asyncio.to_thread(self._write, upserts, deletes, expired_before)
+        except sqlite3.Error as e:
+            self.logger.error("Не удалось сохранить состояние FSM: %s", e)
+
+    async def close(self) -> None:
+        task, self._flush_task = self._flush_task, None
+        if task is not None and not task.done():
+            task.cancel()
+        await self.flush()
+        with self._lock:
+            self._conn.close()
+
+
+def create_fsm_storage(kind: str = FSM_STORAGE) -> BaseStorage:
+    ttl = FSM_TTL_MINUTES * 60
+    if kind == 'sqlite':
+        return SQLiteStorage(FSM_STORAGE_PATH, ttl, FSM_FLUSH_INTERVAL)
+    if kind == 'redis':
+        if RedisStorage is None:
+            raise RuntimeError("Для FSM_STORAGE=redis установите пакет redis")
+        return RedisStorage.from_url(
+            REDIS_URL,
+            key_builder=DefaultKeyBuilder(with_bot_id=True, with_destiny=True),
+            state_ttl=int(ttl),
+            data_ttl=int(ttl),
+        )
+    return MemoryStorage()
@@ -1,34 +1,78 @@
-from aiogram import Router, types, F
-from aiogram.filters import Command
+from aiogram import Bot, Router, types, F
+from aiogram.exceptions import TelegramAPIError, TelegramBadRequest
+from aiogram.filters import Command, CommandObject, CommandStart
 from aiogram.fsm.context import FSMContext
 from aiogram.types import (
     InlineKeyboardButton, InlineKeyboardMarkup,
-    FSInputFile
+    BufferedInputFile, InlineQueryResultArticle, InputTextMessageContent
     )
-from bot.states import FormKP
-from bot.ppt_service import ppt_service
+from bot.states import FormKP, BatchKP
+from bot.batch import (
+    build_template_xlsx, parse_batch_file, generate_batch, build_quotes
+)
+from bot.validators import (
+    parse_license_count, parse_kp_args, parse_quote_args
+)
+from bot.ppt_service import ppt_service, generate_kp
+from bot.pricing import pricing, format_price
+from bot.result_cache import result_cache
+from bot.artifact_store import artifact_store
+from bot.pdf_converter import pdf_converter
+from bot.pdf_pages import pdf_pages
+from bot.janitor import janitor
+from bot.preview import render_calc_slide, preview_cache
+from bot.executor import (
+    generation_executor, GenerationQueueFull, GenerationTimeout
+)
+from bot.scheduler import generation_scheduler, pdf_scheduler, UserQueueFull
+from bot.speculative import speculative, kp_job_key
+from bot.deep_links import deep_links
+from config.config import BATCH_MAX_ROWS, BATCH_MAX_FILE_MB
+import aiofiles
+import aiofiles.os
 import asyncio
+import functools
+import html
+import logging
 import os
-import hashlib
+import time
 
 
 router = Router()
+logger = logging.getLogger('Handlers')
 
 
-file_mapping = {}
+LINK_EXPIRED_TEXT = ("⌛ <b>Ссылка устарела</b>\n"
+                     "Нажмите /make_kp, чтобы заполнить данные заново.")
+
+
+@router.message(CommandStart(deep_link=True), flags={'rate_limit': 1})
+async def start_deep_link(message: types.Message, state: FSMContext,
+                          command: CommandObject):
+    # Кнопка «Получить КП» из инлайн-режима: данные уже известны
+    data = deep_links.get(command.args)
+    if data is None:
+        await message.answer(LINK_EXPIRED_TEXT, parse_mode='HTML')
+        return
+    await state.clear()
+    await _send_kp(message, message.from_user.id, data,
+                   functools.partial(_answer_in_chat, message))
 
 
 @router.message(Command("start"))
 async def start(message: types.Message):
     await message.answer(
         "🤖 <b>Бот для создания коммерческих предложений HRlink</b>\n\n"
-        "▶️ <b>Нажмите /make_kp чтобы начать</b>",
+        "▶️ <b>Нажмите /make_kp чтобы начать</b>\n"
+        "⚡ Или одной командой: <code>/kp long \"ООО Ромашка\" 3 250 да</code>",
         parse_mode='HTML'
     )
 
 
 @router.message(Command("make_kp"))
 async def make_kp(message: types.Message, state: FSMContext):
+    # Анкета начата заново: заранее собранные варианты прошлой не понадобятся
+    speculative.cancel(message.from_user.id)
     keyboard = InlineKeyboardMarkup(inline_keyboard=[
         [InlineKeyboardButton(
             text="📊 КП длинный вариант (общий)",
@@ -40,19 +84,177 @@ async def make_kp(message: types.Message, state: FSMContext):
         )]
     ])
 
+    # Состояние — до ответа: иначе быстрое нажатие кнопки не найдёт хендлер
+    await state.set_state(FormKP.template_type)
     await message.answer(
         "🎯 <b>Выберите вариант коммерческого предложения:</b>",
         reply_markup=keyboard,
         parse_mode='HTML'
     )
-    await state.set_state(FormKP.template_type)
 
 
-async def delete_file_with_delay(file_path: str, delay: int = 600):
-    """Удаляет файл с задержкой (по умолчанию 10 минут)"""
-    await asyncio.sleep(delay)
-    if os.path.exists(file_path):
-        os.remove(file_path)
+@router.message(Command("batch_kp"))
+async def batch_kp(message: types.Message, state: FSMContext,
+                   command: CommandObject):
+    with_pdf = (command.args or "").strip().lower() == "pdf"
+    await state.set_state(BatchKP.file)
+    await state.update_data(with_pdf=with_pdf)
+
+    await message.answer_document(
+        document=BufferedInputFile(build_template_xlsx(), filename="kp_batch.xlsx"),
+        caption="📦 <b>Пакетное создание КП</b>\n\n"
+                "Заполните шаблон (одна строка — одна компания) "
+                "и пришлите его файлом .xlsx или .csv.\n"
+                f"До {BATCH_MAX_ROWS} строк за раз.\n\n"
+                "<i>Чтобы получить ещё и PDF, используйте /batch_kp pdf</i>",
+        parse_mode='HTML'
+    )
+
+
+QUOTE_USAGE_TEXT = (
+    "💰 <b>Быстрый расчёт стоимости</b>\n\n"
+    "Укажите лицензии кадровика, сотрудников и нужен ли on-premises:\n"
+    "<code>/quote 3 250 да</code>"
+)
+
+
+def quote_text(quote) -> str:
+    """Расшифровка стоимости для сообщения"""
+    lines = [
+        "💰 <b>Стоимость на 12 месяцев</b>\n",
+        f"Базовая лицензия: {format_price(quote.base)}",
+        f"Лицензии кадровика ({quote.hr_licenses} шт): {format_price(quote.hr)}",
+        f"Лицензии сотрудников ({quote.employee_licenses} шт): "
+        f"{format_price(quote.employee)}",
+    ]
+    if quote.on_premises:
+        lines.append(f"Лицензия on-premise: {format_price(quote.on_premise)}")
+    lines.append(f"\n<b>Итого: {format_price(quote.total)}</b>")
+    return "\n".join(lines)
+
+
+@router.message(Command("quote"))
+async def quote_command(message: types.Message, command: CommandObject):
+    try:
+        hr_licenses, employee_licenses, on_premises = parse_quote_args(command.args)
+    except ValueError:
+        await message.answer(QUOTE_USAGE_TEXT, parse_mode='HTML')
+        return
+
+    quote = pricing.current().quote(hr_licenses, employee_licenses,
+                                    on_premises == "Да")
+    await message.answer(quote_text(quote), parse_mode='HTML')
+
+
+KP_USAGE_TEXT = (
+    "📊 <b>КП одной командой</b>\n\n"
+    "Укажите вариант (long/short), компанию, лицензии кадровика, "
+    "сотрудников и нужен ли on-premises:\n"
+    "<code>/kp long \"ООО Ромашка\" 3 250 да</code>\n\n"
+    "<i>То же можно набрать в любом чате после @имени бота, "
+    "чтобы сразу увидеть цену</i>"
+)
+
+
+@router.message(Command("kp"), flags={'rate_limit': 1})
+async def kp_command(message: types.Message, state: FSMContext,
+                     command: CommandObject):
+    try:
+        data = parse_kp_args(command.args)
+    except ValueError:
+        await message.answer(KP_USAGE_TEXT, parse_mode='HTML')
+        return
+
+    # Все ответы анкеты уже есть, начатая анкета больше не нужна
+    await state.clear()
+    await _send_kp(message, message.from_user.id, data,
+                   functools.partial(_answer_in_chat, message))
+
+
+@router.inline_query()
+async def inline_quote(inline_query: types.InlineQuery, bot: Bot):
+    """Цена по строке запроса; с названием компании — и кнопка за КП"""
+    try:
+        data = parse_kp_args(inline_query.query)
+        hr_licenses, employee_licenses, on_premises = (
+            data['hr_licenses'], data['employee_licenses'], data['on_premises'])
+    except ValueError:
+        data = None
+        try:
+            hr_licenses, employee_licenses, on_premises = \
+                parse_quote_args(inline_query.query)
+        except ValueError:
+            await inline_query.answer([], cache_time=60, is_personal=True)
+            return
+
+    quote = pricing.current().quote(hr_licenses, employee_licenses,
+                                    on_premises == "Да")
+    text = quote_text(quote)
+    title = f"Итого: {format_price(quote.total)}"
+    reply_markup = None
+    result_id = f"quote_{hr_licenses}_{employee_licenses}_{on_premises == 'Да':d}"
+    if data is not None:
+        text = f"🏢 <b>{html.escape(data['company_name'])}</b>\n\n{text}"
+        title = f"{data['company_name']}: {format_price(quote.total)}"
+        # В чужом чате бот не может прислать файл — кнопка ведёт в чат с ботом
+        result_id = deep_links.put(data)
+        me = await bot.me()
+        reply_markup = InlineKeyboardMarkup(inline_keyboard=[[InlineKeyboardButton(
+            text="📊 Получить КП",
+            url=f"https://t.me/{me.username}?start={result_id}"
+        )]])
+
+    await inline_query.answer(
+        [InlineQueryResultArticle(
+            id=result_id,
+            title=title,
+            description=f"Кадровик: {hr_licenses}, сотрудники: {employee_licenses}, "
+                        f"on-premises: {on_premises}",
+            input_message_content=InputTextMessageContent(
+                message_text=text, parse_mode='HTML'),
+            reply_markup=reply_markup,
+        )],
+        # Цены перечитываются на лету, долго держать ответ в кэше Telegram нельзя
+        cache_time=60,
+        is_personal=True,
+    )
+
+
+@router.callback_query(F.data.startswith("preview_"))
+async def preview_handler(callback: types.CallbackQuery):
+    file_id = callback.data.replace("preview_", "")
+    caption = "🖼 <b>Расчёт стоимости</b>"
+
+    # Ключ КП — хэш шаблона, данных и цен, поэтому превью можно переиспользовать
+    cached = preview_cache.get(file_id)
+    if cached is not None:
+        png, photo_id = cached
+    else:
+        filename, content = await _stored_presentation(file_id)
+        if content is None:
+            await callback.message.answer(FILE_NOT_FOUND_TEXT, parse_mode='HTML')
+            await callback.answer()
+            return
+        try:
+            png = await asyncio.to_thread(render_calc_slide, content)
+        except Exception:
+            logger.exception("Не удалось нарисовать превью")
+            await callback.message.answer(
+                "❌ <b>Не удалось сделать превью</b>\n"
+                "Воспользуйтесь кнопкой «Сделать PDF».",
+                parse_mode='HTML'
+            )
+            await callback.answer()
+            return
+        photo_id = None
+
+    sent = await callback.message.answer_photo(
+        photo=photo_id or BufferedInputFile(png, filename="preview.png"),
+        caption=caption,
+        parse_mode='HTML'
+    )
+    preview_cache.put(file_id, png, sent.photo[-1].file_id)
+    await callback.answer()
 
 
 @router.callback_query(FormKP.template_type)
@@ -83,9 +285,7 @@ async def process_company_name(message: types.Message, state: FSMContext):
 @router.message(FormKP.hr_licenses)
 async def process_hr_licenses(message: types.Message, state: FSMContext):
     try:
-        hr_licenses = int(message.text.strip())
-        if hr_licenses <= 0:
-            raise ValueError
+        hr_licenses = parse_license_count(message.text)
     except ValueError:
         await message.answer(
             "❌ Пожалуйста, введите корректное число лицензий:"
@@ -104,9 +304,7 @@ async def process_hr_licenses(message: types.Message, state: FSMContext):
 @router.message(FormKP.employee_licenses)
 async def process_employee_licenses(message: types.Message, state: FSMContext):
     try:
-        employee_licenses = int(message.text.strip())
-        if employee_licenses <= 0:
-            raise ValueError
+        employee_licenses = parse_license_count(message.text)
     except ValueError:
         await message.answer(
             "❌ Пожалуйста, введите корректное число лицензий:"
@@ -115,6 +313,8 @@ async def process_employee_licenses(message: types.Message, state: FSMContext):
 
     await state.update_data(employee_licenses=employee_licenses)
     await state.set_state(FormKP.on_premises)
+    # Не известен только on-premises: оба варианта начинают собираться сразу
+    speculative.start(message.from_user.id, await state.get_data())
 
     keyboard = InlineKeyboardMarkup(inline_keyboard=[
         [InlineKeyboardButton(
@@ -130,40 +330,106 @@ async def process_employee_licenses(message: types.Message, state: FSMContext):
     )
 
 
-@router.callback_query(FormKP.on_premises)
-async def process_on_premises(callback: types.CallbackQuery, state: FSMContext):
-    on_premises = "Да" if callback.data == "on_premises_yes" else "Нет"
-    await state.update_data(on_premises=on_premises)
+QUEUE_FULL_TEXT = ("⏳ <b>Сейчас создаётся слишком много КП</b>\n"
+                   "Попробуйте ещё раз через минуту.")
+USER_BUSY_TEXT = "⏳ Дождитесь уже запущенных задач"
 
-    # Получаем все данные
-    data = await state.get_data()
+# Задачи КП, результат которых уже ждёт какой-то обработчик
+_awaited_kp_jobs = set()
 
-    # Создаем презентацию
-    await callback.message.answer("🔄 <b>Создаю коммерческое предложение...</b>", parse_mode='HTML')
 
-    presentation_path = ppt_service.create_kp_presentation(
-        data['template_type'],
-        data
-    )
+async def _answer_in_chat(message: types.Message, text: str = None, show_alert: bool = None):
+    """Для команд вместо всплывающего ответа на кнопку — обычное сообщение"""
+    if text:
+        await message.answer(text)
 
-    if presentation_path and os.path.exists(presentation_path):
-        file = FSInputFile(presentation_path)
 
-        # Генерируем уникальный идентификатор для файла
-        file_id = hashlib.md5(presentation_path.encode()).hexdigest()[:10]  # Используем первые 10 символов хэша
-        file_mapping[file_id] = presentation_path  # Сохраняем соответствие
+async def _send_kp(message: types.Message, user_id: int, data: dict, notify) -> bool:
+    """Собирает КП по данным анкеты и отправляет в чат message.
+    notify — всплывающий ответ (callback.answer). False — задача не принята"""
+    # Ключ результата служит и идентификатором для кнопки PDF
+    file_id = ppt_service.cache_key(data['template_type'], data)
+    # Вариант, собранный заранее, забираем, второй больше не нужен
+    job = speculative.claim(user_id, file_id)
+    cached = result_cache.get(file_id)
+
+    if cached is not None:
+        presentation = (cached.filename, cached.pptx)
+    else:
+        job_key = kp_job_key(user_id, file_id)
+        # Повторное нажатие, пока КП ещё создаётся, ничего не запускает
+        if job is None and job_key in _awaited_kp_jobs:
+            await notify("⏳ КП уже создаётся")
+            return False
+
+        if job is None:
+            # Задача с тем же ключом (например, сборка заранее, которую
+            # перестали ждать) не ставится заново — submit вернёт её future
+            try:
+                job = generation_scheduler.submit(
+                    user_id,
+                    functools.partial(generation_executor.run, generate_kp,
+                                      data['template_type'], data),
+                    key=job_key
+                )
+            except UserQueueFull:
+                await notify(USER_BUSY_TEXT, show_alert=True)
+                return False
+            except GenerationQueueFull:
+                await message.answer(QUEUE_FULL_TEXT, parse_mode='HTML')
+                await notify()
+                return False
+
+        # Создаем презентацию
+        if not job.done():
+            await message.answer("🔄 <b>Создаю коммерческое предложение...</b>", parse_mode='HTML')
+
+        _awaited_kp_jobs.add(job_key)
+        try:
+            presentation = await asyncio.shield(job)
+        except GenerationTimeout:
+            presentation = None
+        except asyncio.CancelledError:
+            # Отменили общую задачу (например, заранее собираемый вариант),
+            # а не сам обработчик — отвечаем ошибкой, а не молчим
+            if not job.cancelled():
+                raise
+            logger.warning("Задача создания КП %s отменена", file_id)
+            presentation = None
+        except Exception:
+            # Ошибка рендера, упавший воркер и т.п.
+            logger.exception("Не удалось создать КП %s", file_id)
+            presentation = None
+        finally:
+            _awaited_kp_jobs.discard(job_key)
+
+        if presentation:
+            result_cache.put(file_id, *presentation)
+
+    if presentation:
+        filename, content = presentation
+        await artifact_store.put(file_id, filename, content)  # Сохраняем соответствие
+
+        # Уже загруженный в Telegram файл отправляем по file_id,
+        # иначе — прямо из памяти, без записи на диск
+        file = (cached.file_ids.get('pptx') if cached else None) \
+            or BufferedInputFile(content, filename=filename)
 
         keyboard = InlineKeyboardMarkup(inline_keyboard=[
             [InlineKeyboardButton(
                 text="📄 Сделать PDF",
                 callback_data=f"make_pdf_{file_id}"
+            )],
+            [InlineKeyboardButton(
+                text="🖼 Превью расчёта",
+                callback_data=f"preview_{file_id}"
             )]
         ])
 
-        await callback.message.answer_document(
+        sent = await message.answer_document(
             document=file,
             caption=f"✅ <b>Коммерческое предложение готово!</b>\n\n"
-                    f"🏢 <b>Компания:</b> {data['company_name']}\n"
+                    f"🏢 <b>Компания:</b> {html.escape(data['company_name'])}\n"
                     f"👥 <b>Лицензии кадровика:</b> {data['hr_licenses']}\n"
                     f"👥 <b>Лицензии сотрудников:</b> {data['employee_licenses']}\n"
                     f"🏢 <b>On-premises:</b> {data['on_premises']}\n\n"
@@ -171,50 +437,136 @@ async def process_on_premises(callback: types.CallbackQuery, state: FSMContext):
             reply_markup=keyboard,
             parse_mode='HTML'
         )
-
-        # Планируем удаление презентации через 10 минут
-        asyncio.create_task(delete_file_with_delay(presentation_path))
+        result_cache.remember_file_id(file_id, 'pptx', sent.document.file_id)
     else:
-        await callback.message.answer(
+        await message.answer(
             "❌ <b>Ошибка при создании презентации</b>\n"
             "Попробуйте позже или обратитесь к администратору.",
             parse_mode='HTML'
         )
+    return True
 
-    await state.clear()
+
+@router.callback_query(FormKP.on_premises, flags={'rate_limit': 1})
+async def process_on_premises(callback: types.CallbackQuery, state: FSMContext):
+    on_premises = "Да" if callback.data == "on_premises_yes" else "Нет"
+    await state.update_data(on_premises=on_premises)
+
+    # Получаем все данные
+    data = await state.get_data()
+
+    if await _send_kp(callback.message, callback.from_user.id, data, callback.answer):
+        await state.clear()
+
+
+async def _convert_pdf(filename: str, content: bytes):
+    """Конвертирует КП в PDF, возвращает (имя, байты) или None"""
+    # Статичные страницы — из PDF шаблона, LibreOffice рендерит только изменённые
+    pdf = await pdf_pages.convert(content)
+    if pdf is not None:
+        return os.path.splitext(filename)[0] + '.pdf', pdf
+
+    # LibreOffice нужен файл на диске: выкладываем КП во временную папку,
+    # после конвертации она удаляется вместе с PDF
+    # Имя на диске своё: в папке задачи только этот файл, а имя для
+    # пользователя могло сохраниться в хранилище ещё до очистки имён
+    async with janitor.spool() as spool_dir:
+        pptx_path = os.path.join(spool_dir, 'kp.pptx')
+        async with aiofiles.open(pptx_path, 'wb') as f:
+            await f.write(content)
+
+        pdf_path = await pdf_converter.convert(pptx_path)
+        if not pdf_path or not await aiofiles.os.path.exists(pdf_path):
+            return None
+        async with aiofiles.open(pdf_path, 'rb') as f:
+            return os.path.splitext(filename)[0] + '.pdf', await f.read()
 
 
-@router.callback_query(F.data.startswith("make_pdf_"))
+FILE_NOT_FOUND_TEXT = ("❌ <b>Ошибка: файл не найден</b>\n"
+                       "Попробуйте снова или обратитесь к администратору.")
+
+
+async def _stored_presentation(file_id: str):
+    """(имя, содержимое) готового КП из хранилища или кэша, иначе (None, None)"""
+    stored = await artifact_store.get(file_id)
+    if stored is not None:
+        return stored.filename, stored.content
+    cached = result_cache.get(file_id)
+    if cached is not None:
+        return cached.filename, cached.pptx
+    return None, None
+
+
+@router.callback_query(F.data.startswith("make_pdf_"), flags={'rate_limit': 1})
 async def make_pdf_handler(callback: types.CallbackQuery):
     file_id = callback.data.replace("make_pdf_", "")
-    pptx_path = file_mapping.get(file_id)
-
-    if not pptx_path or not os.path.exists(pptx_path):
-        await callback.message.answer(
-            "❌ <b>Ошибка: файл не найден</b>\n"
-            "Попробуйте снова или обратитесь к администратору.",
+    pdf_caption = "📄 <b>PDF версия коммерческого предложения готова!</b>"
+
+    # PDF этого КП уже делали — отправляем готовый
+    cached = result_cache.get(file_id, 'pdf')
+    if cached is not None:
+        file = cached.file_ids.get('pdf') \
+            or BufferedInputFile(cached.pdf, filename=cached.pdf_filename)
+        sent = await callback.message.answer_document(
+            document=file,
+            caption=pdf_caption,
             parse_mode='HTML'
         )
+        result_cache.remember_file_id(file_id, 'pdf', sent.document.file_id)
+        await callback.answer()
+        return
+
+    filename, content = await _stored_presentation(file_id)
+    if content is None:
+        await callback.message.answer(FILE_NOT_FOUND_TEXT, parse_mode='HTML')
+        await callback.answer()
+        return
+
+    # Двойное нажатие на кнопку не запускает вторую конвертацию
+    job_key = f"{callback.from_user.id}:pdf:{file_id}"
+    if pdf_scheduler.is_pending(job_key):
+        await callback.answer("⏳ PDF уже готовится")
+        return
+
+    try:
+        job = pdf_scheduler.submit(
+            callback.from_user.id,
+            functools.partial(_convert_pdf, filename, content),
+            key=job_key
+        )
+    except UserQueueFull:
+        await callback.answer(USER_BUSY_TEXT, show_alert=True)
+        return
+    except GenerationQueueFull:
+        await callback.message.answer(QUEUE_FULL_TEXT, parse_mode='HTML')
         await callback.answer()
         return
 
     await callback.message.answer("🔄 <b>Конвертирую в PDF...</b>", parse_mode='HTML')
 
     # Конвертируем в PDF
-    pdf_path = ppt_service.convert_to_pdf(pptx_path)
-
-    if pdf_path and os.path.exists(pdf_path):
-        file = FSInputFile(pdf_path)
-        await callback.message.answer_document(
-            document=file,
-            caption="📄 <b>PDF версия коммерческого предложения готова!</b>",
+    try:
+        pdf = await asyncio.shield(job)
+    except asyncio.CancelledError:
+        if not job.cancelled():
+            raise
+        logger.warning("Задача конвертации %s в PDF отменена", file_id)
+        pdf = None
+    except Exception:
+        # Ошибка записи во временную папку, чтения результата и т.п.
+        logger.exception("Не удалось сконвертировать %s в PDF", file_id)
+        pdf = None
+
+    if pdf:
+        pdf_filename, pdf_content = pdf
+        sent = await callback.message.answer_document(
+            document=BufferedInputFile(pdf_content, filename=pdf_filename),
+            caption=pdf_caption,
             parse_mode='HTML'
         )
-
-        # Удаляем PDF и презентацию после отправки
-        os.remove(pdf_path)
-        os.remove(pptx_path)
-        file_mapping.pop(file_id, None)  # Удаляем запись из словаря
+        result_cache.put_pdf(file_id, pdf_content)
+        result_cache.remember_file_id(file_id, 'pdf', sent.document.file_id)
+        await artifact_store.delete(file_id)  # Удаляем запись из хранилища
     else:
         await callback.message.answer(
             "❌ <b>Ошибка при конвертации в PDF</b>\n"
@@ -223,3 +575,101 @@ async def make_pdf_handler(callback: types.CallbackQuery):
         )
 
     await callback.answer()
+
+
+@router.message(BatchKP.file, F.document, flags={'rate_limit': 1})
+async def process_batch_file(message: types.Message, state: FSMContext, bot: Bot):
+    with_pdf = (await state.get_data()).get("with_pdf", False)
+    await state.clear()
+
+    document = message.document
+    if document.file_size and document.file_size > BATCH_MAX_FILE_MB * 1024 * 1024:
+        await message.answer(
+            f"❌ Файл больше {BATCH_MAX_FILE_MB} МБ", parse_mode='HTML')
+        return
+
+    content = (await bot.download(document)).getvalue()
+    try:
+        rows = parse_batch_file(document.file_name or "", content, BATCH_MAX_ROWS)
+    except ValueError as e:
+        await message.answer(
+            f"❌ <b>Не удалось прочитать файл:</b> {e}", parse_mode='HTML')
+        return
+
+    total = sum(1 for row in rows if row.data)
+    if not total:
+        await message.answer(
+            "❌ <b>В файле нет ни одной корректной строки</b>", parse_mode='HTML')
+        return
+
+    # Стоимость считается сразу, не дожидаясь сборки презентаций
+    _, total_price = build_quotes(rows)
+    await message.answer(
+        f"💰 <b>Сумма по {total} КП:</b> {format_price(total_price)}\n"
+        "<i>Расчёт по каждой компании будет в quotes.csv в архиве</i>",
+        parse_mode='HTML'
+    )
+    status = await message.answer(
+        f"⏳ <b>Создаю КП:</b> 0 из {total}", parse_mode='HTML')
+    last_edit = 0
+
+    async def on_progress(done, total):
+        nonlocal last_edit
+        # Telegram ограничивает частоту правок, обновляемся не чаще раза в 2 с
+        if done != total and time.monotonic() - last_edit < 2:
+            return
+        last_edit = time.monotonic()
+        text = f"⏳ <b>Создаю КП:</b> {done} из {total}"
+        if done == total and with_pdf:
+            text = f"⏳ <b>КП готовы ({total}), конвертирую в PDF...</b>"
+        try:
+            await status.edit_text(text, parse_mode='HTML')
+        except TelegramBadRequest:
+            pass
+
+    try:
+        archives, created, errors = await generate_batch(
+            rows, with_pdf, on_progress, user_id=message.from_user.id)
+    except Exception:
+        # Ошибки строк пакет собирает сам, сюда попадает только сбой сборки архива
+        logger.exception("Не удалось создать пакет КП")
+        await message.answer("❌ <b>Ошибка при создании пакета КП</b>", parse_mode='HTML')
+        return
+
+    try:
+        await status.edit_text(
+            f"✅ <b>Готово:</b> {created} из {len(rows)} КП", parse_mode='HTML')
+    except TelegramBadRequest:
+        pass
+
+    caption = f"📦 <b>КП в {'архиве' if len(archives) == 1 else 'архивах'}:</b> {created}"
+    if errors:
+        caption += f"\n⚠️ <b>Ошибок:</b> {len(errors)} (см. errors.txt)"
+    for number, archive in enumerate(archives, start=1):
+        # Большой пакет приходит частями: Telegram не примет от бота файл больше 50 МБ
+        filename = "kp_batch.zip" if len(archives) == 1 else f"kp_batch_{number}.zip"
+        part = caption if len(archives) == 1 else \
+            f"{caption}\n🗂 <b>Часть {number} из {len(archives)}</b>"
+        try:
+            await message.answer_document(
+                document=BufferedInputFile(archive, filename=filename),
+                caption=part,
+                parse_mode='HTML'
+            )
+        except TelegramAPIError as e:
+            logger.error("Не удалось отправить архив пакета %s (%s байт): %s",
+                         filename, len(archive), e)
+            await message.answer(
+                f"❌ <b>Не удалось отправить архив {filename}</b>\n"
+                "Попробуйте разбить файл на несколько поменьше.",
+                parse_mode='HTML'
+            )
+            return
+
+
+@router.message(BatchKP.file)
+async def process_batch_not_file(message: types.Message):
+    await message.answer(
+        "📎 Пришлите заполненный шаблон файлом .xlsx или .csv",
+        parse_mode='HTML'
+    )
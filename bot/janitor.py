@@ -0,0 +1,218 @@
+import asyncio
+import heapq
+import itertools
+import logging
+import os
+import shutil
+import tempfile
+import time
+from contextlib import asynccontextmanager
+
+import aiofiles.os
+
+from bot.files import new_job_id
+from bot.metrics import registry, Counter, Gauge
+from config.config import (
+    OUTPUT_SPOOL_DIR,
+    OUTPUT_SPOOL_TTL_MINUTES,
+    OUTPUT_SPOOL_MAX_MB,
+    JANITOR_INTERVAL,
+)
+
+JANITOR_REMOVED = registry.register(Counter(
+    'kp_janitor_removed_total',
+    'Удалённые временные файлы и папки по причине',
+    labels=('reason',),
+))
+
+# Папки задач, созданные spool(); всё остальное в OUTPUT_SPOOL_DIR не трогается
+SPOOL_PREFIX = 'job_'
+
+_mkdtemp = aiofiles.os.wrap(tempfile.mkdtemp)
+_rmtree = aiofiles.os.wrap(shutil.rmtree)
+
+
+def _entry_size(path: str) -> int:
+    if not os.path.isdir(path):
+        return os.path.getsize(path)
+    total = 0
+    for directory, _, files in os.walk(path):
+        for name in files:
+            try:
+                total += os.path.getsize(os.path.join(directory, name))
+            except OSError:
+                pass
+    return total
+
+
+def _scan(root: str):
+    """Папки задач в root: [(путь, mtime, размер)]"""
+    entries = []
+    try:
+        with os.scandir(root) as it:
+            for entry in it:
+                if not entry.name.startswith(SPOOL_PREFIX):
+                    continue
+                try:
+                    entries.append((entry.path, entry.stat().st_mtime,
+                                    _entry_size(entry.path)))
+                except OSError:
+                    pass
+    except FileNotFoundError:
+        pass
+    return entries
+
+
+class Janitor:
+    """Временные файлы в OUTPUT_SPOOL_DIR: срок жизни и квота на объём.
+
+    Сроки хранятся в куче, их разбирает один фоновый цикл, поэтому число
+    задач не растёт вместе с нагрузкой. Папку, с которой ещё работают
+    (spool), квота не трогает; срок для неё — страховка на случай, если
+    обработчик упал, не прибрав за собой. При запуске папки задач, оставшиеся
+    от прошлых процессов, ставятся в ту же кучу по mtime; чужие файлы
+    в той же папке не удаляются ни по сроку, ни по квоте.
+    """
+
+    def __init__(self, root: str, ttl: float, max_bytes: int, interval: float = 60):
+        self.root = root
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self.interval = interval
+        self.logger = logging.getLogger('Janitor')
+        # (момент удаления по time.time(), порядковый номер, путь)
+        self._heap = []
+        self._expires = {}
+        self._in_use = set()
+        self._counter = itertools.count()
+        self._wakeup = None
+        self._task = None
+        self._last_quota_check = 0.0
+
+    def schedule(self, path: str, expires_at: float = None):
+        """Удалить path в момент expires_at (по умолчанию через ttl)"""
+        if expires_at is None:
+            expires_at = time.time() + self.ttl
+        self._expires[path] = expires_at
+        heapq.heappush(self._heap, (expires_at, next(self._counter), path))
+        # Цикл спит до ближайшего срока, более ранний срок его будит
+        if self._wakeup is not None and self._heap[0][2] == path:
+            self._wakeup.set()
+
+    @asynccontextmanager
+    async def spool(self, job_id: str = None):
+        """Временная папка задачи на время работы с файлами, удаляется на выходе"""
+        await aiofiles.os.makedirs(self.root, exist_ok=True)
+        # Идентификатор в имени папки связывает её с задачей в логах
+        path = await _mkdtemp(prefix=f"{SPOOL_PREFIX}{job_id or new_job_id()}_", dir=self.root)
+        self._in_use.add(path)
+        self.schedule(path)
+        try:
+            yield path
+        finally:
+            self._in_use.discard(path)
+            await self.remove(path, 'released')
+
+    async def remove(self, path: str, reason: str):
+        self._expires.pop(path, None)
+        # Сроки удалённых раньше времени папок остаются в куче, изредка чистим
+        if len(self._heap) > 2 * len(self._expires) + 64:
+            self._heap = [item for item in self._heap
+                          if self._expires.get(item[2]) == item[0]]
+            heapq.heapify(self._heap)
+        try:
+            if await aiofiles.os.path.isdir(path):
+                await _rmtree(path, ignore_errors=True)
+            else:
+                await aiofiles.os.remove(path)
+        except FileNotFoundError:
+            return
+        except OSError as e:
+            self.logger.warning("Не удалось удалить %s: %s", path, e)
+            return
+        JANITOR_REMOVED.inc(reason=reason)
+
+    async def start(self):
+        """Подхватывает файлы прошлых запусков и запускает фоновый цикл"""
+        if self._task is not None:
+            return
+        entries = await asyncio.to_thread(_scan, self.root)
+        for path, mtime, _ in entries:
+            if path not in self._expires:
+                self.schedule(path, mtime + self.ttl)
+        if entries:
+            self.logger.info("Найдено %s временных файлов от прошлых запусков",
+                             len(entries))
+        self._wakeup = asyncio.Event()
+        self._task = asyncio.create_task(self._run())
+
+    async def _run(self):
+        while True:
+            now = time.time()
+            while self._heap and self._heap[0][0] <= now:
+                expires_at, _, path = heapq.heappop(self._heap)
+                # Запись устарела: файл уже удалён или срок перенесён
+                if self._expires.get(path) != expires_at:
+                    continue
+                if path in self._in_use:
+                    self.logger.warning("Папка %s занята дольше срока хранения", path)
+                await self.remove(path, 'expired')
+
+            if now - self._last_quota_check >= self.interval:
+                self._last_quota_check = now
+                await self.enforce_quota()
+
+            delay = self.interval - (time.time() - self._last_quota_check)
+            if self._heap:
+                delay = min(delay, self._heap[0][0] - time.time())
+            self._wakeup.clear()
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), max(delay, 0))
+            except asyncio.TimeoutError:
+                pass
+
+    async def enforce_quota(self):
+        """Удаляет самые старые свободные файлы, пока папка больше квоты"""
+        if not self.max_bytes:
+            return
+        entries = await asyncio.to_thread(_scan, self.root)
+        used = sum(size for _, _, size in entries)
+        if used <= self.max_bytes:
+            return
+        for path, _, size in sorted(entries, key=lambda entry: entry[1]):
+            if used <= self.max_bytes:
+                break
+            if path in self._in_use:
+                continue
+            await self.remove(path, 'quota')
+            used -= size
+        if used > self.max_bytes:
+            self.logger.warning("Временные файлы занимают %.1f МБ при квоте %.1f МБ",
+                                used / 1024 / 1024, self.max_bytes / 1024 / 1024)
+
+    def stats(self) -> dict:
+        return {'scheduled': len(self._expires), 'in_use': len(self._in_use)}
+
+    async def close(self):
+        task, self._task = self._task, None
+        if task is not None:
+            task.cancel()
+            try:
+                await task
+            except asyncio.CancelledError:
+                pass
+
+
+janitor = Janitor(
+    OUTPUT_SPOOL_DIR,
+    ttl=OUTPUT_SPOOL_TTL_MINUTES * 60,
+    max_bytes=OUTPUT_SPOOL_MAX_MB * 1024 * 1024,
+    interval=JANITOR_INTERVAL,
+)
+
+registry.register(Gauge(
+    'kp_janitor_files',
+    'Временные файлы под присмотром: все и занятые сейчас',
+    labels=('state',),
+    callback=lambda: {(state,): value for state, value in janitor.stats().items()},
+))
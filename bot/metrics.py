@@ -0,0 +1,211 @@
+"""Метрики в формате Prometheus без сторонних зависимостей.
+
+Значения живут в памяти процесса. В GENERATION_MODE=process и workers этапы
+генерации выполняются в дочерних процессах, и их гистограммы туда и
+попадают; время всей генерации всё равно видно по kp_handler_seconds.
+"""
+import threading
+import time
+from contextlib import contextmanager
+
+from aiohttp import web
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+
+def _format_labels(names, values, extra=None):
+    pairs = list(zip(names, values))
+    if extra:
+        pairs.append(extra)
+    if not pairs:
+        return ''
+    escaped = (
+        '{}="{}"'.format(name, str(value).replace('\\', '\\\\').replace('"', '\\"'))
+        for name, value in pairs
+    )
+    return '{' + ','.join(escaped) + '}'
+
+
+class _Metric:
+    kind = ''
+
+    def __init__(self, name: str, documentation: str, labels=()):
+        self.name = name
+        self.documentation = documentation
+        self.label_names = tuple(labels)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def _key(self, labels: dict):
+        return tuple(str(labels.get(name, '')) for name in self.label_names)
+
+    def header(self):
+        return [f"# HELP {self.name} {self.documentation}",
+                f"# TYPE {self.name} {self.kind}"]
+
+
+class _Value(_Metric):
+    """Одно число на набор меток: своё или из callback"""
+
+    def __init__(self, name: str, documentation: str, labels=(), callback=None):
+        super().__init__(name, documentation, labels)
+        # callback() -> {tuple(значения меток): значение} или число без меток
+        self.callback = callback
+
+    def inc(self, amount: float = 1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def collect(self):
+        lines = self.header()
+        if self.callback is not None:
+            values = self.callback()
+            if not isinstance(values, dict):
+                values = {(): values}
+        else:
+            with self._lock:
+                values = dict(self._values)
+        for key, value in values.items():
+            lines.append(f"{self.name}{_format_labels(self.label_names, key)} {value}")
+        return lines
+
+
+class Counter(_Value):
+    """Только растёт; callback — для счётчиков, которые ведёт сам компонент"""
+    kind = 'counter'
+
+
+class Gauge(_Value):
+    kind = 'gauge'
+
+    def set(self, value: float, **labels):
+        with self._lock:
+            self._values[self._key(labels)] = value
+
+    def dec(self, amount: float = 1, **labels):
+        self.inc(-amount, **labels)
+
+
+class Histogram(_Metric):
+    kind = 'histogram'
+
+    def __init__(self, name: str, documentation: str, labels=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labels)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                # [счётчики по корзинам, сумма, число наблюдений]
+                state = self._values[key] = [[0] * len(self.buckets), 0.0, 0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    state[0][i] += 1
+            state[1] += value
+            state[2] += 1
+
+    @contextmanager
+    def time(self, **labels):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started, **labels)
+
+    def collect(self):
+        lines = self.header()
+        with self._lock:
+            for key, (counts, total, count) in self._values.items():
+                for bound, bucket_count in zip(self.buckets, counts):
+                    labels = _format_labels(self.label_names, key, ('le', bound))
+                    lines.append(f"{self.name}_bucket{labels} {bucket_count}")
+                labels = _format_labels(self.label_names, key, ('le', '+Inf'))
+                lines.append(f"{self.name}_bucket{labels} {count}")
+                labels = _format_labels(self.label_names, key)
+                lines.append(f"{self.name}_sum{labels} {total}")
+                lines.append(f"{self.name}_count{labels} {count}")
+        return lines
+
+
+class Registry:
+    def __init__(self):
+        self._metrics = []
+
+    def register(self, metric):
+        self._metrics.append(metric)
+        return metric
+
+    def render(self) -> str:
+        lines = []
+        for metric in self._metrics:
+            lines.extend(metric.collect())
+        return '\n'.join(lines) + '\n'
+
+
+registry = Registry()
+
+STAGE_SECONDS = registry.register(Histogram(
+    'kp_stage_seconds',
+    'Длительность этапов генерации КП',
+    labels=('stage',),
+))
+GENERATION_REJECTED = registry.register(Counter(
+    'kp_generation_rejected_total',
+    'Генерации, отклонённые из-за переполненной очереди',
+))
+GENERATION_TIMEOUTS = registry.register(Counter(
+    'kp_generation_timeouts_total',
+    'Генерации, не уложившиеся в таймаут',
+))
+PDF_CONVERSIONS = registry.register(Counter(
+    'kp_pdf_conversions_total',
+    'Конвертации в PDF по способу и результату',
+    labels=('mode', 'result'),
+))
+PDF_SECONDS = registry.register(Histogram(
+    'kp_pdf_conversion_seconds',
+    'Длительность конвертации в PDF',
+    labels=('mode',),
+))
+HANDLER_SECONDS = registry.register(Histogram(
+    'kp_handler_seconds',
+    'Время обработки апдейта хендлером',
+    labels=('handler',),
+))
+HANDLER_ERRORS = registry.register(Counter(
+    'kp_handler_errors_total',
+    'Исключения в хендлерах',
+    labels=('handler',),
+))
+
+RATE_LIMITED = registry.register(Counter(
+    'kp_rate_limited_total',
+    'Действия, отклонённые лимитом частоты',
+    labels=('handler',),
+))
+
+
+async def metrics_view(request: web.Request) -> web.Response:
+    return web.Response(
+        text=registry.render(),
+        content_type='text/plain',
+        charset='utf-8',
+        headers={'X-Content-Type-Options': 'nosniff'},
+    )
+
+
+def setup_metrics_routes(app: web.Application):
+    app.router.add_get('/metrics', metrics_view)
+
+
+async def start_metrics_server(host: str, port: int) -> web.AppRunner:
+    """Отдельный сервер /metrics для режима polling"""
+    app = web.Application()
+    setup_metrics_routes(app)
+    runner = web.AppRunner(app, access_log=None)
+    await runner.setup()
+    await web.TCPSite(runner, host, port).start()
+    return runner
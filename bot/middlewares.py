@@ -0,0 +1,53 @@
+import math
+import time
+
+from aiogram import BaseMiddleware, types
+from aiogram.dispatcher.flags import get_flag
+
+from bot.metrics import HANDLER_SECONDS, HANDLER_ERRORS, RATE_LIMITED
+
+
+def _handler_name(data) -> str:
+    handler_object = data.get('handler')
+    return getattr(getattr(handler_object, 'callback', None), '__name__', 'unknown')
+
+
+class MetricsMiddleware(BaseMiddleware):
+    """Замеряет время работы хендлеров и считает исключения в них"""
+
+    async def __call__(self, handler, event, data):
+        name = _handler_name(data)
+        started = time.perf_counter()
+        try:
+            return await handler(event, data)
+        except Exception:
+            HANDLER_ERRORS.inc(handler=name)
+            raise
+        finally:
+            HANDLER_SECONDS.observe(time.perf_counter() - started, handler=name)
+
+
+class ThrottlingMiddleware(BaseMiddleware):
+    """Лимит частоты для хендлеров с флагом rate_limit (значение — стоимость).
+    Отказ приходит сразу, хендлер при этом не вызывается"""
+
+    def __init__(self, limiter):
+        self.limiter = limiter
+
+    async def __call__(self, handler, event, data):
+        cost = get_flag(data, 'rate_limit')
+        user = data.get('event_from_user')
+        if not cost or user is None:
+            return await handler(event, data)
+
+        wait = self.limiter.consume(user.id, cost)
+        if not wait:
+            return await handler(event, data)
+
+        RATE_LIMITED.inc(handler=_handler_name(data))
+        text = f"⏳ Слишком много запросов. Попробуйте через {math.ceil(wait)} с"
+        if isinstance(event, types.CallbackQuery):
+            await event.answer(text, show_alert=True)
+        elif isinstance(event, types.Message):
+            await event.answer(text)
+        return None
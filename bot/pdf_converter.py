@@ -0,0 +1,349 @@
+import asyncio
+import logging
+import os
+import shutil
+import subprocess
+import tempfile
+import time
+
+from bot.metrics import registry, Gauge, PDF_CONVERSIONS, PDF_SECONDS
+from config.config import (
+    PDF_POOL_SIZE,
+    LIBREOFFICE_BIN,
+    PDF_BASE_PORT,
+    PDF_TIMEOUT,
+    PDF_PROFILES_DIR,
+)
+
+try:
+    # Модуль uno поставляется вместе с LibreOffice (python3-uno),
+    # без него пул не поднимается и работает только разовый запуск
+    import uno
+    from com.sun.star.beans import PropertyValue
+except ImportError:
+    uno = None
+
+
+def _pdf_path_for(pptx_path: str) -> str:
+    # Как LibreOffice: меняется только последнее расширение
+    return os.path.splitext(pptx_path)[0] + '.pdf'
+
+
+def _profile_url(profile_dir: str) -> str:
+    return 'file://' + os.path.abspath(profile_dir)
+
+
+def _prop(name, value):
+    prop = PropertyValue()
+    prop.Name = name
+    prop.Value = value
+    return prop
+
+
+class OfficeInstance:
+    """Один «тёплый» процесс soffice со своим профилем, управляемый по UNO"""
+
+    def __init__(self, index: int, binary: str, port: int, profile_dir: str):
+        self.index = index
+        self.binary = binary
+        self.port = port
+        self.profile_dir = profile_dir
+        self.process = None
+        self.desktop = None
+        self.logger = logging.getLogger('OfficeInstance')
+
+    def start(self, connect_timeout: float = 30):
+        """Запускает soffice и подключается к нему (блокирующий вызов)"""
+        self.stop()
+        os.makedirs(self.profile_dir, exist_ok=True)
+        command = [
+            self.binary,
+            '--headless',
+            '--invisible',
+            '--nologo',
+            '--norestore',
+            '--nodefault',
+            '--nolockcheck',
+            f'-env:UserInstallation={_profile_url(self.profile_dir)}',
+            f'--accept=socket,host=127.0.0.1,port={self.port};urp;'
+            'StarOffice.ComponentContext',
+        ]
+        self.process = subprocess.Popen(
+            command,
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.DEVNULL,
+        )
+
+        local_context = uno.getComponentContext()
+        resolver = local_context.ServiceManager.createInstanceWithContext(
+            'com.sun.star.bridge.UnoUrlResolver', local_context
+        )
+        url = (f'uno:socket,host=127.0.0.1,port={self.port};urp;'
+               'StarOffice.ComponentContext')
+
+        deadline = time.monotonic() + connect_timeout
+        while True:
+            if self.process.poll() is not None:
+                raise RuntimeError(
+                    f"soffice #{self.index} завершился при старте "
+                    f"(код {self.process.returncode})"
+                )
+            try:
+                context = resolver.resolve(url)
+                break
+            except Exception:
+                if time.monotonic() > deadline:
+                    self.stop()
+                    raise TimeoutError(
+                        f"soffice #{self.index} не поднялся за {connect_timeout} с"
+                    )
+                time.sleep(0.2)
+
+        self.desktop = context.ServiceManager.createInstanceWithContext(
+            'com.sun.star.frame.Desktop', context
+        )
+        self.logger.info("soffice #%s готов на порту %s", self.index, self.port)
+
+    def is_alive(self) -> bool:
+        """Проверка здоровья: процесс жив и отвечает по UNO"""
+        if self.process is None or self.process.poll() is not None:
+            return False
+        try:
+            self.desktop.getComponents()
+            return True
+        except Exception:
+            return False
+
+    def convert(self, pptx_path: str, pdf_path: str):
+        """Конвертирует документ через уже запущенный soffice"""
+        document = self.desktop.loadComponentFromURL(
+            uno.systemPathToFileUrl(os.path.abspath(pptx_path)),
+            '_blank', 0,
+            (_prop('Hidden', True),)
+        )
+        try:
+            document.storeToURL(
+                uno.systemPathToFileUrl(os.path.abspath(pdf_path)),
+                (_prop('FilterName', 'impress_pdf_Export'),)
+            )
+        finally:
+            document.close(True)
+
+    def stop(self):
+        self.desktop = None
+        if self.process is None:
+            return
+        if self.process.poll() is None:
+            self.process.kill()
+            try:
+                self.process.wait(timeout=10)
+            except subprocess.TimeoutExpired:
+                pass
+        self.process = None
+
+
+class PDFConverter:
+    """Пул «тёплых» LibreOffice с асинхронной отправкой задач
+    и откатом на разовый запуск libreoffice --headless"""
+
+    def __init__(self, pool_size: int, binary: str, base_port: int,
+                 timeout: float, profiles_dir: str = "",
+                 health_interval: float = 30):
+        self.pool_size = pool_size if uno is not None else 0
+        self.binary = binary
+        self.base_port = base_port
+        self.timeout = timeout
+        self.profiles_dir = profiles_dir or os.path.join(
+            tempfile.gettempdir(), 'kp_bot_soffice'
+        )
+        self.health_interval = health_interval
+        self.logger = logging.getLogger('PDFConverter')
+        self._instances = []
+        self._idle = None
+        self._health_task = None
+
+    @property
+    def ready(self) -> bool:
+        return self._idle is not None and bool(self._instances)
+
+    async def start(self):
+        """Поднимает пул; процессы, которые не стартовали, пропускаются"""
+        if self.pool_size <= 0:
+            self.logger.info("Пул LibreOffice отключён, используется разовый запуск")
+            return
+
+        idle = asyncio.Queue()
+        for index in range(self.pool_size):
+            instance = OfficeInstance(
+                index,
+                self.binary,
+                self.base_port + index,
+                os.path.join(self.profiles_dir, f'profile_{index}'),
+            )
+            try:
+                await asyncio.to_thread(instance.start)
+            except Exception as e:
+                self.logger.warning("Не удалось запустить soffice #%s: %s", index, e)
+                continue
+            self._instances.append(instance)
+            idle.put_nowait(instance)
+
+        if self._instances:
+            self._idle = idle
+            self._health_task = asyncio.create_task(self._health_loop())
+
+    async def _restart(self, instance: OfficeInstance):
+        try:
+            await asyncio.to_thread(instance.start)
+            return True
+        except Exception as e:
+            self.logger.error("Не удалось перезапустить soffice #%s: %s",
+                              instance.index, e)
+            return False
+
+    async def _health_loop(self):
+        while True:
+            await asyncio.sleep(self.health_interval)
+            # Проверяем только свободные процессы, занятые не трогаем
+            for _ in range(self._idle.qsize()):
+                # Пока шла проверка, свободные процессы могла разобрать конвертация
+                try:
+                    instance = self._idle.get_nowait()
+                except asyncio.QueueEmpty:
+                    break
+                try:
+                    if not await asyncio.to_thread(instance.is_alive):
+                        self.logger.warning("soffice #%s не отвечает, перезапуск",
+                                            instance.index)
+                        await self._restart(instance)
+                finally:
+                    self._idle.put_nowait(instance)
+
+    async def convert(self, pptx_path: str):
+        """Конвертирует PPTX в PDF рядом с исходным файлом, возвращает путь или None"""
+        pdf_path = _pdf_path_for(pptx_path)
+
+        if self.ready:
+            try:
+                instance = await asyncio.wait_for(self._idle.get(), self.timeout)
+            except asyncio.TimeoutError:
+                instance = None
+                self.logger.warning("Нет свободного soffice, разовый запуск")
+
+            if instance is not None:
+                started = time.perf_counter()
+                result = 'failed'
+                try:
+                    await asyncio.wait_for(
+                        asyncio.to_thread(instance.convert, pptx_path, pdf_path),
+                        self.timeout
+                    )
+                    if os.path.exists(pdf_path):
+                        result = 'ok'
+                        return pdf_path
+                except asyncio.TimeoutError:
+                    result = 'timeout'
+                    self.logger.warning("Таймаут конвертации в soffice #%s",
+                                        instance.index)
+                    await asyncio.to_thread(instance.stop)
+                    await self._restart(instance)
+                except Exception as e:
+                    self.logger.warning("Ошибка конвертации в soffice #%s: %s",
+                                        instance.index, e)
+                    # Зависший или упавший процесс перезапускаем
+                    await asyncio.to_thread(instance.stop)
+                    await self._restart(instance)
+                finally:
+                    PDF_CONVERSIONS.inc(mode='pool', result=result)
+                    PDF_SECONDS.observe(time.perf_counter() - started, mode='pool')
+                    self._idle.put_nowait(instance)
+
+        return await self._convert_oneshot(pptx_path, pdf_path)
+
+    async def _convert_oneshot(self, pptx_path: str, pdf_path: str):
+        """Разовый запуск libreoffice --headless с отдельным профилем"""
+        if not await self._run_oneshot([pptx_path], self.timeout):
+            return None
+        if os.path.exists(pdf_path):
+            return pdf_path
+        self.logger.error("PDF файл не найден по пути: %s", pdf_path)
+        return None
+
+    async def convert_batch(self, pptx_paths):
+        """Конвертирует пачку файлов одним запуском LibreOffice.
+        Возвращает список путей к PDF (None там, где не получилось)"""
+        if not pptx_paths:
+            return []
+        # Таймаут растёт с размером пачки: офис стартует один раз
+        timeout = self.timeout + 5 * len(pptx_paths)
+        await self._run_oneshot(pptx_paths, timeout, mode='batch')
+        pdf_paths = [_pdf_path_for(path) for path in pptx_paths]
+        return [path if os.path.exists(path) else None for path in pdf_paths]
+
+    async def _run_oneshot(self, pptx_paths, timeout: float,
+                           mode: str = 'oneshot') -> bool:
+        """Запускает libreoffice --convert-to pdf для файлов из одной папки"""
+        started = time.perf_counter()
+        result = 'failed'
+        # Профиль LibreOffice — сотни файлов: создаётся и удаляется вне event loop
+        profile_dir = await asyncio.to_thread(tempfile.mkdtemp, prefix='kp_bot_oneshot_')
+        command = [
+            self.binary,
+            '--headless',
+            f'-env:UserInstallation={_profile_url(profile_dir)}',
+            '--convert-to', 'pdf',
+            '--outdir', os.path.dirname(pptx_paths[0]) or '.',
+            *pptx_paths
+        ]
+        try:
+            process = await asyncio.create_subprocess_exec(
+                *command,
+                stdout=asyncio.subprocess.PIPE,
+                stderr=asyncio.subprocess.PIPE,
+            )
+            try:
+                _, stderr = await asyncio.wait_for(process.communicate(), timeout)
+            except asyncio.TimeoutError:
+                process.kill()
+                await process.wait()
+                self.logger.error("Таймаут конвертации в PDF: %s", pptx_paths)
+                result = 'timeout'
+                return False
+
+            if process.returncode != 0:
+                self.logger.error("libreoffice завершился с кодом %s: %s",
+                                  process.returncode, stderr.decode(errors='replace'))
+                return False
+            result = 'ok'
+            return True
+        except Exception as e:
+            self.logger.error("Неожиданная ошибка при конвертации в PDF: %s", e)
+            return False
+        finally:
+            PDF_CONVERSIONS.inc(mode=mode, result=result)
+            PDF_SECONDS.observe(time.perf_counter() - started, mode=mode)
+            await asyncio.to_thread(shutil.rmtree, profile_dir, ignore_errors=True)
+
+    async def close(self):
+        if self._health_task is not None:
+            self._health_task.cancel()
+            self._health_task = None
+        for instance in self._instances:
+            await asyncio.to_thread(instance.stop)
+        self._instances = []
+        self._idle = None
+
+
+pdf_converter = PDFConverter(
+    pool_size=PDF_POOL_SIZE,
+    binary=LIBREOFFICE_BIN,
+    base_port=PDF_BASE_PORT,
+    timeout=PDF_TIMEOUT,
+    profiles_dir=PDF_PROFILES_DIR,
+)
+
+registry.register(Gauge(
+    'kp_pdf_pool_ready',
+    'Поднят ли пул LibreOffice (1/0)',
+    callback=lambda: int(pdf_converter.ready),
+))
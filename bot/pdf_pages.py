@@ -0,0 +1,240 @@
+"""PDF из готовых страниц: LibreOffice рендерит только изменённые слайды.
+
+Слайды шаблона, в которые ничего не подставляется, одинаковы во всех КП,
+поэтому шаблон целиком конвертируется в PDF один раз на версию. Для КП
+заново рендерятся только слайды, отличающиеся от шаблона (титул с
+названием компании и расчёт), — отдельной маленькой презентацией. Их
+страницы кэшируются по содержимому слайда, так что повторные данные
+обходятся вовсе без LibreOffice. Страницы собираются в PDF через pypdf
+(импортируется при первом PDF); если его нет или что-то не сошлось,
+вызывающий код делает обычную конвертацию всего файла.
+"""
+import asyncio
+import hashlib
+import importlib.util
+import io
+import logging
+import os
+import time
+from collections import OrderedDict
+
+import aiofiles
+
+from bot.janitor import janitor
+from bot.metrics import PDF_CONVERSIONS, PDF_SECONDS
+from bot.pdf_converter import pdf_converter
+from bot.ppt_service import ppt_service
+from bot.zip_renderer import ZipTemplate
+from config.config import PDF_ENGINE, PDF_PAGE_CACHE_SIZE
+
+_NS_P = 'http://schemas.openxmlformats.org/presentationml/2006/main'
+# Пауза перед повторной конвертацией шаблона после неудачи, удваивается до максимума
+BASE_RETRY_DELAY = 30
+MAX_BASE_RETRY_DELAY = 600
+
+
+def _slide_subset(deck: ZipTemplate, keep) -> bytes:
+    """Та же презентация, в списке показа которой только слайды keep"""
+    from lxml import etree
+
+    presentation = etree.fromstring(deck.read('ppt/presentation.xml'))
+    slide_ids = presentation.find(f'{{{_NS_P}}}sldIdLst')
+    for position, slide_id in enumerate(list(slide_ids)):
+        if position not in keep:
+            slide_ids.remove(slide_id)
+    return deck.write({'ppt/presentation.xml': etree.tostring(
+        presentation, encoding='UTF-8', standalone=True)})
+
+
+def _split_pages(pdf: bytes):
+    """Отдельный одностраничный PDF на каждую страницу"""
+    # pypdf тянет за собой PIL: импорт при первом PDF, а не при старте бота
+    import pypdf
+
+    pages = []
+    for page in pypdf.PdfReader(io.BytesIO(pdf)).pages:
+        writer = pypdf.PdfWriter()
+        writer.add_page(page)
+        buffer = io.BytesIO()
+        writer.write(buffer)
+        pages.append(buffer.getvalue())
+    return pages
+
+
+def _page_count(pdf: bytes) -> int:
+    import pypdf
+
+    return len(pypdf.PdfReader(io.BytesIO(pdf)).pages)
+
+
+def _merge(base: bytes, count: int, pages: dict) -> bytes:
+    """Страницы шаблона, где номера из pages заменены отрендеренными"""
+    import pypdf
+
+    base_pages = pypdf.PdfReader(io.BytesIO(base)).pages
+    writer = pypdf.PdfWriter()
+    for index in range(count):
+        if index in pages:
+            writer.add_page(pypdf.PdfReader(io.BytesIO(pages[index])).pages[0])
+        else:
+            writer.add_page(base_pages[index])
+    buffer = io.BytesIO()
+    writer.write(buffer)
+    return buffer.getvalue()
+
+
+class PagedPdfRenderer:
+    """Сборка PDF из закэшированных страниц шаблона и изменённых слайдов"""
+
+    def __init__(self, enabled: bool, max_pages: int):
+        # Наличие pypdf проверяется без импорта
+        has_pypdf = importlib.util.find_spec('pypdf') is not None
+        self.enabled = enabled and has_pypdf
+        self.max_pages = max_pages
+        self.logger = logging.getLogger('PagedPdfRenderer')
+        # digest шаблона -> PDF всего шаблона (None — шаблон не подходит)
+        self._bases = {}
+        self._base_locks = {}
+        # digest шаблона -> (time.monotonic() следующей попытки, текущая пауза)
+        self._base_failures = {}
+        # (digest шаблона, номер слайда, хэш XML слайда) -> одностраничный PDF
+        self._pages = OrderedDict()
+        if enabled and not has_pypdf:
+            self.logger.warning("PDF_ENGINE=pages требует pypdf, PDF делается целиком")
+
+    def _match(self, deck: ZipTemplate):
+        """Шаблон, из которого собрано КП, и номера изменённых слайдов"""
+        crcs = {member.name: member.info.CRC for member in deck.members}
+        for cached, template in ppt_service.template_versions():
+            if template.slide_names != deck.slide_names \
+                    or len(template.members) != len(deck.members):
+                continue
+            slides = set(template.slide_names)
+            changed = {member.name for member in template.members
+                       if crcs.get(member.name) != member.info.CRC}
+            if changed <= slides:
+                return cached, [index for index, name in enumerate(template.slide_names)
+                                if name in changed]
+        return None, None
+
+    async def _convert(self, content: bytes, name: str):
+        """PDF презентации обычным конвертером, None при ошибке"""
+        async with janitor.spool() as spool_dir:
+            path = os.path.join(spool_dir, name)
+            async with aiofiles.open(path, 'wb') as f:
+                await f.write(content)
+            pdf_path = await pdf_converter.convert(path)
+            if not pdf_path:
+                return None
+            async with aiofiles.open(pdf_path, 'rb') as f:
+                return await f.read()
+
+    async def _base(self, cached, slide_count: int):
+        """PDF всего шаблона, один раз на версию"""
+        if cached.digest in self._bases:
+            return self._bases[cached.digest]
+        lock = self._base_locks.setdefault(cached.digest, asyncio.Lock())
+        async with lock:
+            if cached.digest not in self._bases:
+                # После неудачи PDF какое-то время делается целиком, без
+                # повторной конвертации шаблона на каждый запрос
+                retry_at, delay = self._base_failures.get(cached.digest, (0, 0))
+                if time.monotonic() < retry_at:
+                    return None
+                count = None
+                try:
+                    pdf = await self._convert(cached.blob, 'template.pptx')
+                    if pdf is not None:
+                        count = await asyncio.to_thread(_page_count, pdf)
+                except Exception as e:
+                    self.logger.warning("Не удалось сконвертировать шаблон %s: %s",
+                                        cached.path, e)
+                if count is None:
+                    # Не запоминаем навсегда: конвертер мог быть временно недоступен
+                    delay = min(delay * 2 or BASE_RETRY_DELAY, MAX_BASE_RETRY_DELAY)
+                    self._base_failures[cached.digest] = (time.monotonic() + delay, delay)
+                    return None
+                self._base_failures.pop(cached.digest, None)
+                if count != slide_count:
+                    # Скрытые слайды и т.п.: номера страниц не совпадают со слайдами
+                    self.logger.warning("В PDF шаблона %s %s страниц вместо %s, "
+                                        "для него PDF делается целиком",
+                                        cached.path, count, slide_count)
+                    pdf = None
+                else:
+                    self.logger.info("Страницы шаблона %s готовы", cached.path)
+                self._bases[cached.digest] = pdf
+        return self._bases[cached.digest]
+
+    async def warm(self):
+        """Заранее конвертирует шаблоны, чтобы первый PDF их не ждал"""
+        if not self.enabled:
+            return
+        for cached, template in await asyncio.to_thread(ppt_service.template_versions):
+            await self._base(cached, len(template.slide_names))
+
+    def _remember(self, key, page: bytes):
+        self._pages[key] = page
+        self._pages.move_to_end(key)
+        while len(self._pages) > self.max_pages:
+            self._pages.popitem(last=False)
+
+    async def convert(self, content: bytes):
+        """PDF готового КП или None, если нужна обычная конвертация"""
+        if not self.enabled:
+            return None
+        started = time.perf_counter()
+        result = 'fallback'
+        try:
+            deck = ZipTemplate(content)
+            cached, dynamic = await asyncio.to_thread(self._match, deck)
+            if cached is None:
+                return None
+            base = await self._base(cached, len(deck.slide_names))
+            if base is None:
+                return None
+
+            keys = {
+                index: (cached.digest, index, hashlib.sha256(
+                    deck.read(deck.slide_names[index])).hexdigest())
+                for index in dynamic
+            }
+            missing = [index for index in dynamic if keys[index] not in self._pages]
+            result = 'cached'
+            if missing:
+                pdf = await self._convert(_slide_subset(deck, set(missing)), 'slides.pptx')
+                if pdf is None:
+                    result = 'fallback'
+                    return None
+                rendered = await asyncio.to_thread(_split_pages, pdf)
+                if len(rendered) != len(missing):
+                    result = 'fallback'
+                    self.logger.warning("Ожидалось %s страниц, получено %s",
+                                        len(missing), len(rendered))
+                    return None
+                for index, page in zip(missing, rendered):
+                    self._remember(keys[index], page)
+                result = 'ok'
+
+            pages = {}
+            for index in dynamic:
+                # Страница могла вытесниться из кэша, пока рендерились соседние
+                page = self._pages.get(keys[index])
+                if page is None:
+                    result = 'fallback'
+                    return None
+                pages[index] = page
+            return await asyncio.to_thread(_merge, base, len(deck.slide_names), pages)
+        except Exception as e:
+            result = 'fallback'
+            self.logger.warning("Сборка PDF из страниц не удалась: %s", e)
+            return None
+        finally:
+            PDF_CONVERSIONS.inc(mode='pages', result=result)
+            PDF_SECONDS.observe(time.perf_counter() - started, mode='pages')
+
+
+pdf_pages = PagedPdfRenderer(
+    enabled=PDF_ENGINE == 'pages',
+    max_pages=PDF_PAGE_CACHE_SIZE,
+)
@@ -0,0 +1,170 @@
+import logging
+import re
+
+# Явные метки полей в шаблонах: {{company_name}}, {{total_price}} и т.п.
+MARKER_RE = re.compile(r'\{\{\s*(\w+)\s*\}\}')
+PRICE_RE = re.compile(r'\d[\d\s]*₽')
+
+COMPANY_NAME_MARK = "Название"
+PRICE_TEXT_MARK = "Стоимость HRlink на 12 месяцев"
+# Таблица с расчётами — третья по счёту в презентации
+CALC_TABLE_NUMBER = 3
+
+logger = logging.getLogger('PlaceholderIndex')
+
+
+class RunLocation:
+    """Путь до конкретного run: слайд / фигура / абзац / run"""
+
+    def __init__(self, slide_index: int, shape_index: int, shape_id: int,
+                 paragraph_index: int, run_index: int):
+        self.slide_index = slide_index
+        self.shape_index = shape_index
+        self.shape_id = shape_id
+        self.paragraph_index = paragraph_index
+        self.run_index = run_index
+
+    def __repr__(self):
+        return (f"RunLocation(slide={self.slide_index}, shape={self.shape_id}, "
+                f"p={self.paragraph_index}, r={self.run_index})")
+
+
+class TableLocation:
+    """Путь до таблицы с расчётами и номера её строк по типу лицензии"""
+
+    def __init__(self, slide_index: int, shape_index: int, shape_id: int,
+                 rows: dict):
+        self.slide_index = slide_index
+        self.shape_index = shape_index
+        self.shape_id = shape_id
+        # base / hr / employee / on_premise / total -> номера строк
+        self.rows = rows
+
+    def __repr__(self):
+        return f"TableLocation(slide={self.slide_index}, shape={self.shape_id}, rows={self.rows})"
+
+
+def classify_row(row_text: str):
+    """Определяет тип строки таблицы с расчётами по её тексту"""
+    row_text = row_text.lower()
+    if 'базовая' in row_text:
+        return 'base'
+    if any(word in row_text for word in ['кадровик', 'кадровика']):
+        return 'hr'
+    if any(word in row_text for word in ['сотрудник', 'сотрудника']):
+        return 'employee'
+    if 'on-premise' in row_text:
+        return 'on_premise'
+    if any(word in row_text for word in ['итог', 'итого', 'итоговая']):
+        return 'total'
+    return None
+
+
+def _shape_at(slide, location):
+    shape = slide.shapes[location.shape_index]
+    if shape.shape_id != location.shape_id:
+        raise LookupError(f"Фигура {location.shape_id} сместилась")
+    return shape
+
+
+class PlaceholderIndex:
+    """Заранее найденные места подстановки в шаблоне"""
+
+    def __init__(self):
+        # Логическое поле (company_name, price_text) -> список RunLocation
+        self.fields = {}
+        # Явные метки {{field}} -> список RunLocation
+        self.markers = {}
+        self.calc_table = None
+
+    @classmethod
+    def build(cls, prs):
+        """Один проход по всей презентации при загрузке шаблона"""
+        index = cls()
+        table_count = 0
+        for slide_index, slide in enumerate(prs.slides):
+            for shape_index, shape in enumerate(slide.shapes):
+                if shape.has_table:
+                    table_count += 1
+                    if table_count == CALC_TABLE_NUMBER:
+                        index.calc_table = cls._index_table(
+                            slide_index, shape_index, shape)
+                    continue
+                if not shape.has_text_frame:
+                    continue
+
+                shape_text = shape.text_frame.text
+                # Как и раньше, поле заполняется в первой подходящей фигуре
+                company_shape = (slide_index == 0
+                                 and 'company_name' not in index.fields
+                                 and COMPANY_NAME_MARK in shape_text)
+                price_shape = ('price_text' not in index.fields
+                               and PRICE_TEXT_MARK in shape_text)
+                company_runs, price_runs = [], []
+
+                for p_index, paragraph in enumerate(shape.text_frame.paragraphs):
+                    for r_index, run in enumerate(paragraph.runs):
+                        location = RunLocation(slide_index, shape_index,
+                                               shape.shape_id, p_index, r_index)
+                        for name in MARKER_RE.findall(run.text):
+                            index.markers.setdefault(name, []).append(location)
+                        if company_shape and COMPANY_NAME_MARK in run.text:
+                            company_runs.append(location)
+                        if price_shape and PRICE_RE.search(run.text):
+                            price_runs.append(location)
+
+                if company_shape:
+                    index.fields['company_name'] = company_runs
+                if price_shape:
+                    index.fields['price_text'] = price_runs
+
+        index.validate(prs)
+        return index
+
+    @staticmethod
+    def _index_table(slide_index, shape_index, shape):
+        rows = {}
+        for row_index, row in enumerate(shape.table.rows):
+            kind = classify_row(' '.join(cell.text.strip() for cell in row.cells))
+            if kind is not None:
+                rows.setdefault(kind, []).append(row_index)
+        return TableLocation(slide_index, shape_index, shape.shape_id, rows)
+
+    def runs(self, prs, locations):
+        """Run'ы по списку путей в копии шаблона"""
+        return [self.run(prs, location) for location in locations]
+
+    def run(self, prs, location: RunLocation):
+        slide = prs.slides[location.slide_index]
+        shape = _shape_at(slide, location)
+        paragraph = shape.text_frame.paragraphs[location.paragraph_index]
+        return paragraph.runs[location.run_index]
+
+    def table(self, prs):
+        if self.calc_table is None:
+            return None
+        slide = prs.slides[self.calc_table.slide_index]
+        return _shape_at(slide, self.calc_table).table
+
+    def validate(self, prs):
+        """Проверяет, что все пути разрешаются; битые поля выбрасываются"""
+        for group in (self.fields, self.markers):
+            for name, locations in list(group.items()):
+                try:
+                    for location in locations:
+                        self.run(prs, location)
+                except (IndexError, LookupError) as e:
+                    logger.error("Поле %s не найдено: %s", name, e)
+                    del group[name]
+        if self.calc_table is not None:
+            try:
+                self.table(prs)
+            except (IndexError, LookupError) as e:
+                logger.error("Таблица с расчётами не найдена: %s", e)
+                self.calc_table = None
+
+        for name in ('company_name', 'price_text'):
+            if not self.fields.get(name):
+                logger.warning("В шаблоне нет места для поля %s", name)
+        if self.calc_table is None:
+            logger.warning("В шаблоне нет таблицы с расчётами")
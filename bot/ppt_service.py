@@ -1,11 +1,21 @@
-from pptx import Presentation
-from pptx.util import Pt
-from pptx.enum.text import MSO_AUTO_SIZE
+import hashlib
+import io
+import json
 import os
 from datetime import datetime
 import re
 import logging
 
+from bot.files import safe_filename
+from bot.metrics import STAGE_SECONDS
+from bot.pricing import pricing, format_price
+from bot.template_cache import TemplateCache
+from bot.zip_renderer import ZipTemplateCache
+from bot.placeholder_index import (
+    PlaceholderIndex, MARKER_RE, PRICE_RE, COMPANY_NAME_MARK
+)
+from config.config import RENDER_ENGINE
+
 class PPTService:
     def __init__(self):
         self.templates_path = "templates/"
@@ -14,264 +24,300 @@ class PPTService:
         # Запасные шрифты на случай отсутствия Montserrat
         self.fallback_fonts = ['Arial', 'Helvetica', 'Times New Roman', 'Calibri']
         self.logger = logging.getLogger('PPTService')
+        # Шрифты и индекс полей готовятся один раз при загрузке шаблона в кэш
+        self.template_cache = TemplateCache(prepare=self._prepare_template)
+        # pptx — полная модель python-pptx; zip — правка только нужных слайдов
+        self.render_engine = RENDER_ENGINE
+        self.zip_templates = ZipTemplateCache()
+        # Цены для таблицы с расчётами (config/pricing.json, перечитывается при изменении)
+        self.pricing = pricing
+        self.template_files = {
+            "long": "kedo_long.pptx",
+            "short": "kedo_short.pptx",
+        }
+        # путь -> ((mtime_ns, размер), sha256 файла) для ключа готового КП
+        self._template_digests = {}
+
+    def _template_path(self, template_type: str) -> str:
+        template_file = self.template_files.get(template_type, "kedo_short.pptx")
+        return os.path.join(self.templates_path, template_file)
+
+    def _template_digest(self, path: str) -> str:
+        """Хэш исходного файла шаблона, пересчитывается при смене mtime или размера.
+        Без разбора python-pptx: ключ считается прямо в event loop"""
+        stat = os.stat(path)
+        stamp = (stat.st_mtime_ns, stat.st_size)
+        cached = self._template_digests.get(path)
+        if cached is not None and cached[0] == stamp:
+            return cached[1]
+        with open(path, 'rb') as f:
+            digest = hashlib.sha256(f.read()).hexdigest()
+        self._template_digests[path] = (stamp, digest)
+        return digest
+
+    def cache_key(self, template_type: str, data: dict) -> str:
+        """Ключ готового КП: хэш шаблона, введённых данных и цен"""
+        try:
+            template_digest = self._template_digest(self._template_path(template_type))
+        except FileNotFoundError:
+            # Генерация всё равно сообщит об отсутствующем шаблоне
+            template_digest = None
+        payload = {
+            'template': template_digest,
+            'data': {
+                'company_name': data['company_name'],
+                'hr_licenses': int(data['hr_licenses']),
+                'employee_licenses': int(data['employee_licenses']),
+                'on_premises': data['on_premises'],
+            },
+            'prices': self.pricing.current().digest,
+        }
+        raw = json.dumps(payload, sort_keys=True, ensure_ascii=False)
+        return hashlib.sha256(raw.encode()).hexdigest()[:32]
+
+    def warm_templates(self):
+        """Загружает и нормализует все шаблоны заранее"""
+        paths = [self._template_path(template_type)
+                 for template_type in self.template_files]
+        self.template_cache.warm(paths)
+        if self.render_engine == 'zip':
+            for path in paths:
+                if os.path.exists(path):
+                    self.zip_templates.get(self.template_cache.entry(path))
     
+    def _prepare_template(self, prs):
+        """Готовит шаблон к кэшированию и возвращает индекс мест подстановки"""
+        # Устанавливаем единый шрифт Montserrat для всей презентации
+        self._ensure_consistent_fonts(prs)
+        index = PlaceholderIndex.build(prs)
+        table = index.table(prs)
+        if table is not None:
+            # Устанавливаем шрифт для таблицы с расчётами
+            self._set_table_font(table)
+        return index
+
     def _ensure_consistent_fonts(self, prs):
         """Устанавливает единый шрифт Montserrat для всего текста в презентации"""
+        changed = 0
         for slide in prs.slides:
             for shape in slide.shapes:
-                self._set_shape_font(shape)
-    
+                changed += self._set_shape_font(shape)
+        return changed
+
+    def _apply_primary_font(self, run):
+        """Ставит Montserrat, не трогая run, где он уже задан"""
+        # Сеттер font.name меняет только a:latin, размер, начертание
+        # и цвет остаются как были, сохранять их не нужно
+        if run.font.name == self.primary_font:
+            return 0
+        run.font.name = self.primary_font
+        return 1
+
     def _set_shape_font(self, shape):
         """Устанавливает шрифт Montserrat для фигуры и всего её содержимого"""
         if not shape.has_text_frame:
-            return
-            
-        text_frame = shape.text_frame
-        for paragraph in text_frame.paragraphs:
+            return 0
+
+        changed = 0
+        for paragraph in shape.text_frame.paragraphs:
             for run in paragraph.runs:
-                # Сохраняем оригинальные свойства форматирования
-                original_size = run.font.size
-                original_bold = run.font.bold
-                original_italic = run.font.italic
-                original_color = run.font.color.rgb if run.font.color and run.font.color.rgb else None
-                original_underline = run.font.underline
-                
-                # Устанавливаем шрифт Montserrat
-                run.font.name = self.primary_font
-                
-                # Восстанавливаем форматирование
-                if original_size:
-                    run.font.size = original_size
-                run.font.bold = original_bold
-                run.font.italic = original_italic
-                run.font.underline = original_underline
-                if original_color:
-                    run.font.color.rgb = original_color
-    
+                changed += self._apply_primary_font(run)
+        return changed
+
     def _set_table_font(self, table):
         """Устанавливает шрифт Montserrat для всей таблицы"""
+        changed = 0
         for row in table.rows:
             for cell in row.cells:
                 if cell.text_frame:
-                    text_frame = cell.text_frame
-                    for paragraph in text_frame.paragraphs:
+                    for paragraph in cell.text_frame.paragraphs:
                         for run in paragraph.runs:
-                            # Сохраняем оригинальные свойства
-                            original_size = run.font.size
-                            original_bold = run.font.bold
-                            original_italic = run.font.italic
-                            original_color = run.font.color.rgb if run.font.color and run.font.color.rgb else None
-                            
-                            # Устанавливаем шрифт Montserrat
-                            run.font.name = self.primary_font
-                            
-                            # Восстанавливаем форматирование
-                            if original_size:
-                                run.font.size = original_size
-                            run.font.bold = original_bold
-                            run.font.italic = original_italic
-                            if original_color:
-                                run.font.color.rgb = original_color
-    
-    def create_kp_presentation(self, template_type: str, data: dict):
-        """Создает КП на основе шаблона с единым шрифтом Montserrat"""
+                            changed += self._apply_primary_font(run)
+        return changed
+
+    def _cached_template(self, template_type: str):
+        template_path = self._template_path(template_type)
+
+        if not os.path.exists(template_path):
+            raise FileNotFoundError(
+                f"Шаблон {os.path.basename(template_path)} не найден")
+
+        # Шаблон из кэша, шрифт Montserrat уже применён
+        return self.template_cache.entry(template_path)
+
+    def template_versions(self):
+        """Текущие версии всех шаблонов: [(CachedTemplate, ZipTemplate)]"""
+        versions = []
+        for template_type in self.template_files:
+            try:
+                cached = self._cached_template(template_type)
+            except FileNotFoundError:
+                continue
+            versions.append((cached, self.zip_templates.get(cached)))
+        return versions
+
+    def _build_presentation(self, template_type: str, data: dict):
+        """Собирает заполненную презентацию в памяти"""
+        cached = self._cached_template(template_type)
+        with STAGE_SECONDS.time(stage='clone'):
+            prs = self.template_cache.clone(cached)
+
+        with STAGE_SECONDS.time(stage='fill'):
+            self._fill_presentation(prs, cached.index, data)
+        return prs
+
+    def _fill_presentation(self, prs, index, data: dict):
+        """Заполняет копию шаблона: prs — Presentation или XmlDeck"""
+        # Заменяем название компании
+        self._replace_company_name(prs, index, data['company_name'])
+
+        # Сначала обновляем таблицу, чтобы рассчитать правильную сумму
+        total_price = self._update_third_table(prs, index, data)
+
+        # Затем обновляем текст с стоимостью над таблицей
+        self._update_price_text(prs, index, total_price)
+
+        # Заполняем явные метки {{field}}
+        self._fill_markers(prs, index, {
+            'company_name': data['company_name'],
+            'hr_licenses': data['hr_licenses'],
+            'employee_licenses': data['employee_licenses'],
+            'on_premises': data['on_premises'],
+            'total_price': self._format_price(total_price),
+        })
+
+    def _render_bytes(self, template_type: str, data: dict) -> bytes:
+        """Содержимое заполненного .pptx выбранным движком"""
+        if self.render_engine != 'zip':
+            prs = self._build_presentation(template_type, data)
+            with STAGE_SECONDS.time(stage='save'):
+                buffer = io.BytesIO()
+                prs.save(buffer)
+            return buffer.getvalue()
+
+        cached = self._cached_template(template_type)
+        template = self.zip_templates.get(cached)
+        with STAGE_SECONDS.time(stage='fill'):
+            deck = template.open()
+            self._fill_presentation(deck, cached.index, data)
+        with STAGE_SECONDS.time(stage='save'):
+            return template.save(deck)
+
+    def output_filename(self, data: dict) -> str:
+        company = safe_filename(data['company_name'])
+        return f"КП_{company}_{datetime.now().strftime('%d%m%Y_%H%M')}.pptx"
+
+    def render_kp_presentation(self, template_type: str, data: dict):
+        """Создает КП в памяти, возвращает (имя файла, содержимое .pptx)"""
         try:
-            # Выбираем шаблон
-            if template_type == "long":
-                template_file = "kedo_long.pptx"
-            else:
-                template_file = "kedo_short.pptx"
-
-            template_path = os.path.join(self.templates_path, template_file)
-
-            if not os.path.exists(template_path):
-                raise FileNotFoundError(f"Шаблон {template_file} не найден")
-
-            # Загружаем шаблон
-            prs = Presentation(template_path)
-            
-            # Устанавливаем единый шрифт Montserrat для всей презентации
-            self._ensure_consistent_fonts(prs)
-
-            # Заменяем название компании
-            self._replace_company_name(prs, data['company_name'])
-
-            # Сначала обновляем таблицу, чтобы рассчитать правильную сумму
-            total_price = self._update_third_table(prs, data)
-
-            # Затем обновляем текст с стоимостью над таблицей
-            self._update_price_text(prs, total_price)
-
-            # Сохраняем результат
-            output_filename = f"КП_{data['company_name']}_{datetime.now().strftime('%d%m%Y_%H%M')}.pptx"
-            output_path = os.path.join(
-                self.templates_path, "output", output_filename)
+            content = self._render_bytes(template_type, data)
+            return self.output_filename(data), content
 
-            # Создаем папку output если ее нет
-            os.makedirs(os.path.dirname(output_path), exist_ok=True)
-
-            prs.save(output_path)
-            return output_path
-
-        except Exception as e:
-            print(f"Ошибка при создании презентации: {e}")
+        except Exception:
+            self.logger.exception("Ошибка при создании презентации")
             return None
 
-    def _replace_company_name(self, prs, company_name):
+    @staticmethod
+    def _format_price(value):
+        return format_price(value)
+
+    def _replace_company_name(self, prs, index, company_name):
         """Заменяет название компании на первом слайде с сохранением форматирования"""
         try:
-            first_slide = prs.slides[0]
-            for shape in first_slide.shapes:
-                if hasattr(shape, "text") and "Название" in shape.text:
-                    self._safe_text_replace(shape, "Название", company_name)
-                    return
-        except Exception as e:
-            print(f"Ошибка при замене названия компании: {e}")
-
-    def _safe_text_replace(self, shape, old_text, new_text):
-        """Безопасная замена текста с сохранением форматирования и установкой Montserrat"""
-        if not shape.has_text_frame:
-            return
-
-        text_frame = shape.text_frame
-        for paragraph in text_frame.paragraphs:
-            for run in paragraph.runs:
-                if old_text in run.text:
-                    # Сохраняем свойства шрифта
-                    original_font = run.font
-                    original_size = original_font.size
-                    original_bold = original_font.bold
-                    original_italic = original_font.italic
-                    original_color = original_font.color.rgb if original_font.color and original_font.color.rgb else None
-                    original_underline = original_font.underline
-
-                    # Заменяем текст
-                    run.text = run.text.replace(old_text, new_text)
-
-                    # Устанавливаем шрифт Montserrat
-                    run.font.name = self.primary_font
-                    
-                    # Восстанавливаем форматирование
-                    if original_size:
-                        run.font.size = original_size
-                    run.font.bold = original_bold
-                    run.font.italic = original_italic
-                    run.font.underline = original_underline
-                    if original_color:
-                        run.font.color.rgb = original_color
-
-    def _update_price_text(self, prs, total_price):
+            for run in index.runs(prs, index.fields.get('company_name', [])):
+                self._set_run_text(
+                    run, run.text.replace(COMPANY_NAME_MARK, company_name))
+        except Exception:
+            self.logger.exception("Ошибка при замене названия компании")
+
+    def _set_run_text(self, run, new_text):
+        """Замена текста run: форматирование остаётся в rPr, шрифт уже задан шаблоном"""
+        run.text = new_text
+        self._apply_primary_font(run)
+
+    def _update_price_text(self, prs, index, total_price):
         """Обновляет текст с стоимостью над таблицей с сохранением форматирования"""
         try:
-            formatted_price = f"{total_price:,} ₽".replace(',', ' ')
-            for slide in prs.slides:
-                for shape in slide.shapes:
-                    if hasattr(shape, "text") and "Стоимость HRlink на 12 месяцев" in shape.text:
-                        if shape.has_text_frame:
-                            text_frame = shape.text_frame
-                            for paragraph in text_frame.paragraphs:
-                                for run in paragraph.runs:
-                                    # Ищем и заменяем только цифры с ₽
-                                    if re.search(r'\d[\d\s]*₽', run.text):
-                                        original_font = run.font
-                                        original_size = original_font.size
-                                        original_bold = original_font.bold
-                                        original_italic = original_font.italic
-                                        original_color = original_font.color.rgb if original_font.color and original_font.color.rgb else None
-                                        original_underline = original_font.underline
-
-                                        # Заменяем всё число с ₽
-                                        run.text = re.sub(
-                                            r'\d[\d\s]*₽',
-                                            formatted_price,
-                                            run.text
-                                        )
-
-                                        # Устанавливаем шрифт Montserrat
-                                        run.font.name = self.primary_font
-                                        
-                                        # Восстанавливаем форматирование
-                                        if original_size:
-                                            run.font.size = original_size
-                                        run.font.bold = original_bold
-                                        run.font.italic = original_italic
-                                        run.font.underline = original_underline
-                                        if original_color:
-                                            run.font.color.rgb = original_color
-                            return
-        except Exception as e:
-            print(f"Ошибка при обновлении цены: {e}")
-
-    def _update_third_table(self, prs, data):
-        """Обновляет третью таблицу в презентации и возвращает итоговую сумму"""
+            formatted_price = self._format_price(total_price)
+            for run in index.runs(prs, index.fields.get('price_text', [])):
+                # Заменяем всё число с ₽
+                self._set_run_text(
+                    run, PRICE_RE.sub(formatted_price, run.text))
+        except Exception:
+            self.logger.exception("Ошибка при обновлении цены")
+
+    def _fill_markers(self, prs, index, values: dict):
+        """Подставляет значения в явные метки {{field}} шаблона"""
         try:
-            table_count = 0
-            for slide in prs.slides:
-                for shape in slide.shapes:
-                    if shape.has_table:
-                        table_count += 1
-                        # Третья таблица (таблица с расчетами)
-                        if table_count == 3:
-                            table = shape.table
-                            # Устанавливаем шрифт для таблицы
-                            self._set_table_font(table)
-                            return self._fill_calculation_table(table, data)
-            return 0
-        except Exception as e:
-            print(f"Ошибка при обновлении таблицы: {e}")
+            for name, locations in index.markers.items():
+                if name not in values:
+                    continue
+                value = str(values[name])
+                for run in index.runs(prs, locations):
+                    self._set_run_text(run, MARKER_RE.sub(
+                        lambda m: value if m.group(1) == name else m.group(0),
+                        run.text
+                    ))
+        except Exception:
+            self.logger.exception("Ошибка при заполнении меток")
+
+    def _update_third_table(self, prs, index, data):
+        """Обновляет таблицу с расчётами и возвращает итоговую сумму"""
+        try:
+            table = index.table(prs)
+            if table is None:
+                return 0
+            return self._fill_calculation_table(table, index.calc_table.rows, data)
+        except Exception:
+            self.logger.exception("Ошибка при обновлении таблицы")
             return 0
 
-    def _fill_calculation_table(self, table, data):
-        prices = {
-            'base': 15000,
-            'hr': 15000,
-            'employee': 1000,
-            'on_premise': 600000
+    def _fill_calculation_table(self, table, rows, data):
+        prices = self.pricing.current()
+        quote = prices.quote(data['hr_licenses'], data['employee_licenses'],
+                             data['on_premises'] == 'Да')
+
+        quantity = 1 if quote.on_premises else 0
+        # Тип строки -> (цена за лицензию, количество, сумма); None — ячейку не трогаем
+        values = {
+            'base': (prices.base, "1 шт", quote.base),
+            'hr': (self._unit_price(prices.hr, quote.hr_licenses, quote.hr),
+                   f"{data['hr_licenses']} шт", quote.hr),
+            'employee': (self._unit_price(prices.employee, quote.employee_licenses,
+                                          quote.employee),
+                         f"{data['employee_licenses']} шт", quote.employee),
+            'on_premise': (prices.on_premise, f"{quantity} шт", quote.on_premise),
+            'total': (None, None, quote.total),
         }
 
-        # Рассчитываем суммы
-        base_total = prices['base']
-        hr_total = prices['hr'] * data['hr_licenses']
-        employee_total = prices['employee'] * data['employee_licenses']
-        on_premise_total = prices['on_premise'] if data['on_premises'] == 'Да' else 0
-
-        # Итоговая сумма
-        total_price = base_total + hr_total + employee_total + on_premise_total
-
-        # Обновляем таблицу
-        for i, row in enumerate(table.rows):
-            row_text = ' '.join([cell.text.strip() for cell in row.cells]).lower()
-
-            if 'базовая' in row_text:
-                if len(row.cells) >= 3:
-                    self._safe_cell_replace(row.cells[2], row.cells[2].text, "1 шт")
-                if len(row.cells) >= 5:
-                    self._safe_cell_replace(row.cells[4], row.cells[4].text, f"{base_total:,} ₽".replace(',', ' '))
-
-            elif any(word in row_text for word in ['кадровик', 'кадровика']):
-                if len(row.cells) >= 3:
-                    self._safe_cell_replace(row.cells[2], row.cells[2].text, f"{data['hr_licenses']} шт")
-                if len(row.cells) >= 5:
-                    self._safe_cell_replace(row.cells[4], row.cells[4].text, f"{hr_total:,} ₽".replace(',', ' '))
-
-            elif any(word in row_text for word in ['сотрудник', 'сотрудника']):
-                if len(row.cells) >= 3:
-                    self._safe_cell_replace(row.cells[2], row.cells[2].text, f"{data['employee_licenses']} шт")
-                if len(row.cells) >= 5:
-                    self._safe_cell_replace(row.cells[4], row.cells[4].text, f"{employee_total:,} ₽".replace(',', ' '))
-
-            elif 'on-premise' in row_text:
-                quantity = 1 if data['on_premises'] == 'Да' else 0
-                if len(row.cells) >= 3:
-                    self._safe_cell_replace(row.cells[2], row.cells[2].text, f"{quantity} шт")
-                if len(row.cells) >= 5:
-                    self._safe_cell_replace(row.cells[4], row.cells[4].text, f"{on_premise_total:,} ₽".replace(',', ' '))
-
-            elif any(word in row_text for word in ['итог', 'итого', 'итоговая']):
-                if len(row.cells) >= 5:
-                    self._safe_cell_replace(row.cells[4], row.cells[4].text, f"{total_price:,} ₽".replace(',', ' '))
-
-        return total_price
+        # Обновляем только заранее найденные строки таблицы
+        for kind, row_indexes in rows.items():
+            unit_price, count_text, amount = values[kind]
+            for row_index in row_indexes:
+                cells = table.rows[row_index].cells
+                if unit_price is not None and len(cells) >= 2:
+                    self._update_unit_price(cells[1], unit_price)
+                if count_text is not None and len(cells) >= 3:
+                    self._safe_cell_replace(cells[2], cells[2].text, count_text)
+                if len(cells) >= 5:
+                    self._safe_cell_replace(cells[4], cells[4].text, self._format_price(amount))
+
+        return quote.total
+
+    @staticmethod
+    def _unit_price(license_price, count, amount):
+        """Цена за лицензию для таблицы: при ступенчатых скидках — средняя"""
+        if count > 0:
+            return amount // count
+        return license_price.unit_price(1)
+
+    def _update_unit_price(self, cell, unit_price):
+        """Меняет цену за лицензию, только если она отличается от шаблона,
+        чтобы не трогать оформление числа («1000 ₽»)"""
+        digits = re.sub(r'\D', '', cell.text)
+        if digits and int(digits) == unit_price:
+            return
+        self._safe_cell_replace(cell, cell.text, self._format_price(unit_price))
 
     def _safe_cell_replace(self, cell, old_text, new_text):
         """Безопасная замена текста в ячейке с сохранением форматирования"""
@@ -282,88 +328,20 @@ class PPTService:
         for paragraph in text_frame.paragraphs:
             for run in paragraph.runs:
                 if old_text in run.text or run.text.strip():
-                    # Сохраняем свойства шрифта
-                    original_font = run.font
-                    original_size = original_font.size
-                    original_bold = original_font.bold
-                    original_italic = original_font.italic
-                    original_color = original_font.color.rgb if original_font.color and original_font.color.rgb else None
-                    original_underline = original_font.underline
-
-                    # Заменяем текст
-                    run.text = new_text
-
-                    # Устанавливаем шрифт Montserrat
-                    run.font.name = self.primary_font
-                    
-                    # Восстанавливаем форматирование
-                    if original_size:
-                        run.font.size = original_size
-                    run.font.bold = original_bold
-                    run.font.italic = original_italic
-                    run.font.underline = original_underline
-                    if original_color:
-                        run.font.color.rgb = original_color
+                    self._set_run_text(run, new_text)
                     return
 
-    def convert_to_pdf(self, pptx_path: str):
-        """Конвертирует PPTX в PDF с упрощенными параметрами"""
-        try:
-            import subprocess
-
-            # Получаем директорию исходного файла презентации
-            output_dir = os.path.dirname(pptx_path)
-
-            # Формируем путь для PDF-файла
-            pdf_filename = os.path.basename(pptx_path).replace('.pptx', '.pdf')
-            pdf_path = os.path.join(output_dir, pdf_filename)
-
-            print(f"🔄 Начинаю конвертацию: {pptx_path} -> {pdf_path}")
-
-            # Простая команда без сложных параметров
-            command = [
-                'libreoffice',
-                '--headless',
-                '--convert-to', 'pdf',
-                '--outdir', output_dir,
-                pptx_path
-            ]
-            
-            print(f"🔧 Выполняю команду: {' '.join(command)}")
-            
-            result = subprocess.run(
-                command,
-                check=True,
-                capture_output=True,
-                text=True,
-                timeout=60
-            )
-            
-            print(f"✅ Конвертация завершена успешно")
-            print(f"📋 STDOUT: {result.stdout}")
-            
-            if result.stderr:
-                print(f"⚠️  STDERR: {result.stderr}")
-
-            # Проверяем, что файл создался
-            if os.path.exists(pdf_path):
-                print(f"📄 PDF создан: {pdf_path}")
-                return pdf_path
-            else:
-                print(f"❌ PDF файл не найден по пути: {pdf_path}")
-                return None
-
-        except subprocess.CalledProcessError as e:
-            print(f"❌ Ошибка выполнения команды: {e}")
-            print(f"🔧 STDOUT: {e.stdout}")
-            print(f"🔧 STDERR: {e.stderr}")
-            return None
-        except subprocess.TimeoutExpired:
-            print("⏰ Таймаут конвертации в PDF")
-            return None
-        except Exception as e:
-            print(f"❌ Неожиданная ошибка при конвертации в PDF: {e}")
-            return None
 
 
-ppt_service = PPTService()
\ No newline at end of file
+ppt_service = PPTService()
+
+
+def warm_templates():
+    """Прогрев кэша шаблонов (в т.ч. как initializer процессов пула)"""
+    ppt_service.warm_templates()
+
+
+def generate_kp(template_type: str, data: dict):
+    """Точка входа для пула генерации (в т.ч. процессного): использует синглтон процесса.
+    Возвращает (имя файла, содержимое .pptx) или None"""
+    return ppt_service.render_kp_presentation(template_type, data)
\ No newline at end of file
@@ -0,0 +1,182 @@
+"""Картинка слайда с расчётом стоимости без конвертации в PDF.
+
+Слайд рисуется через Pillow по разметке готового .pptx: рамки и текст
+фигур и ячеек таблицы в их координатах. Картинки, градиенты и эффекты
+не рисуются — это превью для быстрой проверки цифр, а не копия слайда.
+Разбирается только нужный слайд, как в zip-движке сборки.
+"""
+import functools
+import io
+import logging
+import threading
+from collections import OrderedDict
+
+from bot.metrics import STAGE_SECONDS
+from bot.placeholder_index import CALC_TABLE_NUMBER
+from bot.zip_renderer import ZipTemplate
+from config.config import PREVIEW_WIDTH, PREVIEW_FONT, PREVIEW_CACHE_SIZE
+
+logger = logging.getLogger('Preview')
+
+_NS_P = 'http://schemas.openxmlformats.org/presentationml/2006/main'
+
+# Шрифты с кириллицей, которые ищутся, если PREVIEW_FONT не задан
+FONT_CANDIDATES = ('Montserrat-Regular.ttf', 'DejaVuSans.ttf', 'Arial.ttf',
+                   'LiberationSans-Regular.ttf')
+DEFAULT_FONT_PT = 12
+EMU_PER_PT = 12700
+# Оттенки серого: картинка в одном канале кодируется в PNG втрое быстрее
+BORDER = 190
+HEADER_FILL = 238
+TEXT = 30
+
+
+@functools.lru_cache(maxsize=64)
+def _font(size: int):
+    from PIL import ImageFont
+
+    for name in filter(None, (PREVIEW_FONT,) + FONT_CANDIDATES):
+        try:
+            return ImageFont.truetype(name, size)
+        except OSError:
+            continue
+    logger.warning("Не найден шрифт с кириллицей, задайте PREVIEW_FONT")
+    return ImageFont.load_default(size)
+
+
+def _slide_size(template: ZipTemplate):
+    from lxml import etree
+
+    presentation = etree.fromstring(template.read('ppt/presentation.xml'))
+    size = presentation.find(f'{{{_NS_P}}}sldSz')
+    return int(size.get('cx')), int(size.get('cy'))
+
+
+def _calc_slide_index(template: ZipTemplate):
+    """Слайд с таблицей расчёта: третья таблица презентации, как в индексе"""
+    seen = 0
+    for slide_index, name in enumerate(template.slide_names):
+        content = template.read(name)
+        seen += content.count(b'<a:tbl>') + content.count(b'<a:tbl ')
+        if seen >= CALC_TABLE_NUMBER:
+            return slide_index
+    return None
+
+
+def _font_size(text_frame, scale: float) -> int:
+    for paragraph in text_frame.paragraphs:
+        for run in paragraph.runs:
+            if run.font.size is not None:
+                return max(8, round(run.font.size * scale))
+    return max(8, round(DEFAULT_FONT_PT * EMU_PER_PT * scale))
+
+
+def _wrap(draw, text: str, font, width: float):
+    lines = []
+    for paragraph in text.replace('\x0b', '\n').split('\n'):
+        line = ''
+        for word in paragraph.split(' '):
+            candidate = f"{line} {word}" if line else word
+            if line and draw.textlength(candidate, font=font) > width:
+                lines.append(line)
+                line = word
+            else:
+                line = candidate
+        lines.append(line)
+    return lines
+
+
+def _draw_text(draw, box, text: str, size: int, center=False):
+    left, top, right, bottom = box
+    font = _font(size)
+    padding = size * 0.3
+    line_height = size * 1.2
+    lines = _wrap(draw, text, font, right - left - 2 * padding)
+    y = top + max(padding, (bottom - top - line_height * len(lines)) / 2) if center \
+        else top + padding
+    for line in lines:
+        if y + line_height > bottom + line_height / 2:
+            break
+        draw.text((left + padding, y), line, font=font, fill=TEXT)
+        y += line_height
+
+
+def _draw_table(draw, shape, scale: float):
+    table = shape.table
+    x0, y0 = shape.left * scale, shape.top * scale
+    columns = [column.width * scale for column in table.columns]
+    y = y0
+    for row_index, row in enumerate(table.rows):
+        height = row.height * scale
+        x = x0
+        for cell, width in zip(row.cells, columns):
+            box = (x, y, x + width, y + height)
+            draw.rectangle(box, outline=BORDER,
+                           fill=HEADER_FILL if row_index == 0 and table.first_row else None)
+            if not cell.is_spanned and cell.text.strip():
+                _draw_text(draw, box, cell.text,
+                           _font_size(cell.text_frame, scale), center=True)
+            x += width
+        y += height
+
+
+def render_calc_slide(pptx: bytes, width: int = PREVIEW_WIDTH) -> bytes:
+    """PNG слайда с таблицей расчёта из готового .pptx"""
+    from PIL import Image, ImageDraw
+
+    with STAGE_SECONDS.time(stage='preview'):
+        template = ZipTemplate(pptx)
+        slide_index = _calc_slide_index(template)
+        if slide_index is None:
+            raise LookupError("В презентации нет таблицы с расчётами")
+        slide = template.open().slide(slide_index)
+
+        slide_width, slide_height = _slide_size(template)
+        scale = width / slide_width
+        image = Image.new('L', (width, round(slide_height * scale)), 255)
+        draw = ImageDraw.Draw(image)
+        for shape in slide.shapes:
+            if shape.left is None or shape.top is None:
+                continue
+            if shape.has_table:
+                _draw_table(draw, shape, scale)
+            elif shape.has_text_frame and shape.text_frame.text.strip():
+                box = (shape.left * scale, shape.top * scale,
+                       (shape.left + shape.width) * scale,
+                       (shape.top + shape.height) * scale)
+                _draw_text(draw, box, shape.text_frame.text,
+                           _font_size(shape.text_frame, scale))
+
+        buffer = io.BytesIO()
+        # Картинка почти вся белая, сильное сжатие почти не уменьшает файл
+        image.save(buffer, 'PNG', compress_level=1)
+        return buffer.getvalue()
+
+
+class PreviewCache:
+    """Превью по ключу готового КП (хэш шаблона, данных и цен)"""
+
+    def __init__(self, max_entries: int):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: str):
+        """(png, file_id фото в Telegram) или None"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+            return entry
+
+    def put(self, key: str, png: bytes, file_id: str = None):
+        if not self.max_entries:
+            return
+        with self._lock:
+            self._entries[key] = (png, file_id)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+
+preview_cache = PreviewCache(PREVIEW_CACHE_SIZE)
@@ -0,0 +1,197 @@
+"""Прайс и расчёт стоимости КП без сборки презентации.
+
+Прайс читается из JSON-файла (PRICING_FILE) и перечитывается, как только
+файл меняется. base и on_premise — суммы за 12 месяцев, hr и employee —
+цена лицензии со скидками от объёма:
+
+    "employee": {"price": 1000, "mode": "volume",
+                 "tiers": [{"from": 500, "price": 900}, {"from": 2000, "price": 800}]}
+
+mode=volume — все лицензии по цене ступени, в которую попало их число;
+mode=graduated — каждая лицензия по цене своей ступени
+(в примере первые 499 по 1000 ₽, следующие 1500 по 900 ₽ и т.д.).
+"""
+import bisect
+import functools
+import hashlib
+import json
+import logging
+import os
+import threading
+
+from config.config import PRICING_FILE
+
+logger = logging.getLogger('Pricing')
+
+
+@functools.lru_cache(maxsize=None)
+def _numpy():
+    """NumPy или None. Ускоряет расчёт пачек сценариев, без неё считается в цикле;
+    импортируется при первой пачке, а не при старте бота"""
+    try:
+        import numpy
+    except ImportError:
+        return None
+    return numpy
+
+# Прайс на случай, если файла нет
+DEFAULT_PRICES = {
+    'base': 15000,
+    'on_premise': 600000,
+    'hr': {'price': 15000},
+    'employee': {'price': 1000},
+}
+
+MODES = ('volume', 'graduated')
+
+
+def format_price(value) -> str:
+    return f"{int(value):,} ₽".replace(',', ' ')
+
+
+class LicensePrice:
+    """Цена лицензии со ступенями скидок"""
+
+    def __init__(self, price: int, mode: str = 'volume', tiers=()):
+        if mode not in MODES:
+            raise ValueError(f"Неизвестный режим скидок {mode!r}")
+        tiers = sorted(tiers, key=lambda tier: tier['from'])
+        # Ступень i действует с лицензии bounds[i]
+        self.bounds = [1] + [int(tier['from']) for tier in tiers]
+        self.prices = [int(price)] + [int(tier['price']) for tier in tiers]
+        if any(value < 0 for value in self.prices) or self.bounds != sorted(set(self.bounds)):
+            raise ValueError("Ступени должны начинаться с разных чисел больше 1, цены — не меньше 0")
+        self.mode = mode
+
+    @classmethod
+    def from_dict(cls, raw: dict):
+        return cls(raw['price'], raw.get('mode', 'volume'), raw.get('tiers', ()))
+
+    def unit_price(self, count: int) -> int:
+        """Цена лицензии для ступени, в которую попадает count"""
+        return self.prices[max(0, bisect.bisect_right(self.bounds, count) - 1)]
+
+    def amount(self, count: int) -> int:
+        if count <= 0:
+            return 0
+        if self.mode == 'volume':
+            return count * self.unit_price(count)
+        total = 0
+        for i, (bound, price) in enumerate(zip(self.bounds, self.prices)):
+            upper = self.bounds[i + 1] - 1 if i + 1 < len(self.bounds) else count
+            total += max(0, min(count, upper) - bound + 1) * price
+        return total
+
+    def amounts(self, counts):
+        """amount() для массива количеств"""
+        np = _numpy()
+        if np is None:
+            return [self.amount(int(count)) for count in counts]
+        counts = np.asarray(counts, dtype=np.int64)
+        bounds = np.array(self.bounds, dtype=np.int64)
+        prices = np.array(self.prices, dtype=np.int64)
+        if self.mode == 'volume':
+            index = np.maximum(np.searchsorted(bounds, counts, side='right') - 1, 0)
+            return np.where(counts > 0, counts * prices[index], 0)
+        # Сколько лицензий попало в каждую ступень: строка на сценарий
+        uppers = np.append(bounds[1:] - 1, np.iinfo(np.int64).max)
+        in_tier = np.minimum(counts[:, None], uppers) - bounds + 1
+        return np.clip(in_tier, 0, None) @ prices
+
+
+class Quote:
+    """Расчёт стоимости одного КП, суммы в рублях за 12 месяцев"""
+
+    def __init__(self, hr_licenses: int, employee_licenses: int, on_premises: bool,
+                 base: int, hr: int, employee: int, on_premise: int):
+        self.hr_licenses = hr_licenses
+        self.employee_licenses = employee_licenses
+        self.on_premises = on_premises
+        self.base = base
+        self.hr = hr
+        self.employee = employee
+        self.on_premise = on_premise
+        self.total = base + hr + employee + on_premise
+
+
+class PriceList:
+    """Прайс одной версии файла"""
+
+    def __init__(self, raw: dict):
+        self.base = int(raw['base'])
+        self.on_premise = int(raw['on_premise'])
+        self.hr = LicensePrice.from_dict(raw['hr'])
+        self.employee = LicensePrice.from_dict(raw['employee'])
+        canonical = json.dumps(raw, sort_keys=True, ensure_ascii=False)
+        self.digest = hashlib.sha256(canonical.encode()).hexdigest()[:16]
+
+    def quote(self, hr_licenses: int, employee_licenses: int,
+              on_premises: bool) -> Quote:
+        return Quote(
+            hr_licenses, employee_licenses, on_premises,
+            base=self.base,
+            hr=self.hr.amount(hr_licenses),
+            employee=self.employee.amount(employee_licenses),
+            on_premise=self.on_premise if on_premises else 0,
+        )
+
+    def quote_batch(self, hr_licenses, employee_licenses, on_premises) -> dict:
+        """Расчёт для пачки сценариев сразу: на входе последовательности
+        одинаковой длины, на выходе — столбцы сумм (массивы NumPy, если она есть)"""
+        hr = self.hr.amounts(hr_licenses)
+        employee = self.employee.amounts(employee_licenses)
+        np = _numpy()
+        if np is not None:
+            on_premise = np.where(np.asarray(on_premises, dtype=bool), self.on_premise, 0)
+            base = np.full(len(on_premise), self.base, dtype=np.int64)
+            total = base + hr + employee + on_premise
+        else:
+            on_premise = [self.on_premise if flag else 0 for flag in on_premises]
+            base = [self.base] * len(on_premise)
+            total = [sum(values) for values in zip(base, hr, employee, on_premise)]
+        return {'base': base, 'hr': hr, 'employee': employee,
+                'on_premise': on_premise, 'total': total}
+
+
+class PricingConfig:
+    """Прайс из файла, перечитываемый при смене mtime"""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._mtime_ns = None
+        self._prices = None
+        self._lock = threading.Lock()
+
+    def current(self) -> PriceList:
+        try:
+            mtime_ns = os.stat(self.path).st_mtime_ns
+        except OSError:
+            mtime_ns = None
+        if self._prices is not None and mtime_ns == self._mtime_ns:
+            return self._prices
+
+        with self._lock:
+            if self._prices is None or mtime_ns != self._mtime_ns:
+                self._prices = self._load(mtime_ns)
+                self._mtime_ns = mtime_ns
+        return self._prices
+
+    def _load(self, mtime_ns):
+        if mtime_ns is None:
+            if self._prices is None:
+                logger.warning("Файл цен %s не найден, используются цены по умолчанию",
+                               self.path)
+                return PriceList(DEFAULT_PRICES)
+            return self._prices
+        try:
+            with open(self.path, encoding='utf-8') as f:
+                prices = PriceList(json.load(f))
+        except (OSError, ValueError, KeyError, TypeError) as e:
+            # Ошибка в файле не должна ронять расчёты: остаются прежние цены
+            logger.error("Не удалось прочитать цены из %s: %s", self.path, e)
+            return self._prices or PriceList(DEFAULT_PRICES)
+        logger.info("Цены загружены из %s (версия %s)", self.path, prices.digest)
+        return prices
+
+
+pricing = PricingConfig(PRICING_FILE)
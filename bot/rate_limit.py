@@ -0,0 +1,55 @@
+import threading
+import time
+
+from config.config import RATE_LIMIT_PER_MINUTE, RATE_LIMIT_BURST
+
+
+class RateLimiter:
+    """Token bucket на пользователя: burst токенов, пополнение rate в секунду"""
+
+    def __init__(self, rate: float, burst: int, max_users: int = 10000):
+        self.rate = rate
+        self.burst = max(1, burst)
+        self.max_users = max_users
+        # user_id -> [токены, время последнего пересчёта]
+        self._buckets = {}
+        self._lock = threading.Lock()
+
+    @property
+    def enabled(self) -> bool:
+        return self.rate > 0
+
+    def consume(self, user_id, cost: float = 1) -> float:
+        """Списывает cost токенов. Возвращает 0, если действие разрешено,
+        иначе — через сколько секунд токенов станет достаточно"""
+        if not self.enabled:
+            return 0
+        now = time.monotonic()
+        with self._lock:
+            bucket = self._buckets.get(user_id)
+            if bucket is None:
+                if len(self._buckets) >= self.max_users:
+                    self._sweep(now)
+                bucket = self._buckets[user_id] = [float(self.burst), now]
+            tokens = min(self.burst, bucket[0] + (now - bucket[1]) * self.rate)
+            bucket[1] = now
+            if tokens >= cost:
+                bucket[0] = tokens - cost
+                return 0
+            bucket[0] = tokens
+            return (cost - tokens) / self.rate
+
+    def _sweep(self, now: float):
+        # Полные вёдра ничем не отличаются от новых, их можно забыть
+        full = [
+            user_id for user_id, (tokens, updated) in self._buckets.items()
+            if tokens + (now - updated) * self.rate >= self.burst
+        ]
+        for user_id in full:
+            del self._buckets[user_id]
+
+
+rate_limiter = RateLimiter(
+    rate=RATE_LIMIT_PER_MINUTE / 60,
+    burst=RATE_LIMIT_BURST,
+)
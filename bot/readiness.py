@@ -0,0 +1,87 @@
+import asyncio
+import logging
+import time
+
+from bot.metrics import registry, Gauge
+
+
+class Readiness:
+    """Замеры запуска и состояние фонового прогрева компонентов"""
+
+    def __init__(self):
+        self.logger = logging.getLogger('Readiness')
+        # Точку отсчёта main.py выставляет до тяжёлых импортов
+        self.started_at = time.monotonic()
+        # Этап запуска -> секунды от started_at
+        self.phases = {}
+        # Компонент -> {'status': pending | ready | failed, 'seconds': ...}
+        self.components = {}
+
+    def begin(self, started_at: float):
+        self.started_at = started_at
+
+    def mark(self, phase: str):
+        """Запоминает, сколько прошло от старта до этапа phase"""
+        self.phases[phase] = round(time.monotonic() - self.started_at, 3)
+        self.logger.info("Запуск: %s через %.3f с", phase, self.phases[phase])
+
+    def expect(self, *names):
+        """Объявляет компоненты заранее, чтобы готовность не наступила,
+        пока прогреты только первые из них"""
+        for name in names:
+            self.components.setdefault(name, {'status': 'pending', 'seconds': None})
+
+    @property
+    def ready(self) -> bool:
+        return bool(self.components) and all(
+            component['status'] != 'pending' for component in self.components.values()
+        )
+
+    async def track(self, name: str, awaitable):
+        """Ждёт прогрева компонента и записывает его длительность.
+        Ошибка прогрева не фатальна: компонент догрузится при первом запросе"""
+        self.components[name] = {'status': 'pending', 'seconds': None}
+        started = time.monotonic()
+        status = 'failed'
+        try:
+            await awaitable
+            status = 'ready'
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            self.logger.warning("Прогрев %s не удался: %s", name, e)
+        finally:
+            self.components[name] = {
+                'status': status,
+                'seconds': round(time.monotonic() - started, 3),
+            }
+        if self.ready:
+            self.mark('ready')
+
+    async def warm(self, **awaitables):
+        """Прогревает компоненты параллельно"""
+        await asyncio.gather(*(
+            self.track(name, awaitable) for name, awaitable in awaitables.items()
+        ))
+
+    def snapshot(self) -> dict:
+        return {
+            'ready': self.ready,
+            'phases': dict(self.phases),
+            'components': {name: dict(value) for name, value in self.components.items()},
+        }
+
+
+readiness = Readiness()
+
+registry.register(Gauge(
+    'kp_ready',
+    'Завершён ли фоновый прогрев (1/0)',
+    callback=lambda: int(readiness.ready),
+))
+registry.register(Gauge(
+    'kp_startup_seconds',
+    'Время от старта процесса до этапа запуска',
+    labels=('phase',),
+    callback=lambda: {(phase,): seconds for phase, seconds in readiness.phases.items()},
+))
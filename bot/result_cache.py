@@ -0,0 +1,145 @@
+import os
+import time
+from collections import OrderedDict
+
+from bot.metrics import registry, Counter, Gauge
+from config.config import RESULT_CACHE_MAX_MB, RESULT_CACHE_TTL_MINUTES
+
+
+class CachedResult:
+    """Готовое КП: .pptx, PDF и file_id, под которыми их уже отправляли"""
+
+    def __init__(self, key: str, filename: str, pptx: bytes):
+        self.key = key
+        self.filename = filename
+        self.pptx = pptx
+        self.pdf = None
+        # 'pptx' / 'pdf' -> file_id документа в Telegram
+        self.file_ids = {}
+        self.created = time.monotonic()
+
+    @property
+    def size(self) -> int:
+        return len(self.pptx) + len(self.pdf or b'')
+
+    @property
+    def pdf_filename(self) -> str:
+        return os.path.splitext(self.filename)[0] + '.pdf'
+
+
+class ResultCache:
+    """LRU-кэш результатов с ограничением по размеру и времени жизни"""
+
+    def __init__(self, max_bytes: int, ttl: float):
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._size = 0
+        self.hits = {'pptx': 0, 'pdf': 0}
+        self.misses = {'pptx': 0, 'pdf': 0}
+        self.evictions = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_bytes > 0
+
+    def _drop(self, key: str):
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self._size -= entry.size
+
+    def _lookup(self, key: str):
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        if time.monotonic() - entry.created > self.ttl:
+            self._drop(key)
+            return None
+        self._entries.move_to_end(key)
+        return entry
+
+    def __contains__(self, key: str) -> bool:
+        """Проверка без учёта в статистике попаданий"""
+        return self._lookup(key) is not None
+
+    def get(self, key: str, kind: str = 'pptx'):
+        """Возвращает запись, если в ней есть результат нужного вида"""
+        entry = self._lookup(key)
+        found = entry is not None and (
+            kind in entry.file_ids
+            or (entry.pdf if kind == 'pdf' else entry.pptx) is not None
+        )
+        if found:
+            self.hits[kind] += 1
+            return entry
+        self.misses[kind] += 1
+        return None
+
+    def _shrink(self):
+        while self._size > self.max_bytes and self._entries:
+            key = next(iter(self._entries))
+            self._drop(key)
+            self.evictions += 1
+
+    def put(self, key: str, filename: str, pptx: bytes):
+        if not self.enabled:
+            return None
+        self._drop(key)
+        entry = CachedResult(key, filename, pptx)
+        self._entries[key] = entry
+        self._size += entry.size
+        self._shrink()
+        return self._entries.get(key)
+
+    def put_pdf(self, key: str, pdf: bytes):
+        entry = self._lookup(key)
+        if entry is None:
+            return None
+        self._size -= entry.size
+        entry.pdf = pdf
+        self._size += entry.size
+        self._shrink()
+        return self._entries.get(key)
+
+    def remember_file_id(self, key: str, kind: str, file_id: str):
+        """Запоминает file_id, чтобы повторно отправлять без загрузки"""
+        entry = self._lookup(key)
+        if entry is not None:
+            entry.file_ids[kind] = file_id
+
+    def stats(self) -> dict:
+        return {
+            'entries': len(self._entries),
+            'bytes': self._size,
+            'hits': dict(self.hits),
+            'misses': dict(self.misses),
+            'evictions': self.evictions,
+        }
+
+
+result_cache = ResultCache(
+    max_bytes=RESULT_CACHE_MAX_MB * 1024 * 1024,
+    ttl=RESULT_CACHE_TTL_MINUTES * 60,
+)
+
+
+def _cache_lookups():
+    values = {}
+    for kind, count in result_cache.hits.items():
+        values[(kind, 'hit')] = count
+    for kind, count in result_cache.misses.items():
+        values[(kind, 'miss')] = count
+    return values
+
+
+registry.register(Counter(
+    'kp_result_cache_lookups_total',
+    'Обращения к кэшу готовых КП по виду и результату',
+    labels=('kind', 'result'),
+    callback=_cache_lookups,
+))
+registry.register(Gauge(
+    'kp_result_cache_bytes',
+    'Объём кэша готовых КП в байтах',
+    callback=lambda: result_cache.stats()['bytes'],
+))
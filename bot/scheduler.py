@@ -0,0 +1,176 @@
+import asyncio
+import logging
+from collections import OrderedDict, deque
+
+from bot.executor import generation_executor, GenerationQueueFull
+from bot.metrics import registry, Gauge
+from config.config import (
+    GENERATION_QUEUE_SIZE,
+    PDF_POOL_SIZE,
+    USER_MAX_PENDING_JOBS,
+)
+
+
+class UserQueueFull(GenerationQueueFull):
+    """У пользователя уже слишком много задач в очереди"""
+
+
+class FairScheduler:
+    """Очередь тяжёлых задач с честным чередованием пользователей.
+
+    Одновременно выполняется не больше slots задач; свободный слот
+    получает следующий по кругу пользователь, а не следующая задача,
+    поэтому пакет одного менеджера не задерживает остальных.
+    """
+
+    def __init__(self, name: str, slots: int, queue_size: int = 0,
+                 per_user: int = 0):
+        self.name = name
+        self.slots = max(1, slots)
+        self.queue_size = max(0, queue_size)
+        # 0 — без ограничения на пользователя
+        self.per_user = per_user
+        self.logger = logging.getLogger('FairScheduler')
+        # user_id -> очередь задач; порядок ключей и есть порядок обхода
+        self._queues = OrderedDict()
+        self._user_pending = {}
+        self._jobs = {}
+        self._queued = 0
+        self._running = 0
+        self._tasks = set()
+
+    @property
+    def queued(self) -> int:
+        return self._queued
+
+    @property
+    def running(self) -> int:
+        return self._running
+
+    def is_pending(self, key) -> bool:
+        """Есть ли в очереди или в работе задача с таким ключом"""
+        return key in self._jobs
+
+    def submit(self, user_id, factory, key=None, bounded: bool = True,
+               counted: bool = True):
+        """Ставит factory() (корутину) в очередь пользователя и возвращает future.
+
+        Задача с уже известным key не запускается повторно — возвращается
+        future первой. При bounded=False лимиты очереди не проверяются:
+        так ставит задачи пакет, который сам ограничивает своё число задач.
+        При counted=False задача не занимает место в лимите пользователя:
+        так ставятся сборки заранее, о которых пользователь не просил.
+        Отказ выдаётся сразу исключением, а не ожиданием в очереди.
+        """
+        if key is not None and key in self._jobs:
+            return self._jobs[key]
+
+        if bounded:
+            if self.per_user and self._user_pending.get(user_id, 0) >= self.per_user:
+                raise UserQueueFull(
+                    f"У пользователя {user_id} уже {self.per_user} задач"
+                )
+            if self._running >= self.slots and self._queued >= self.queue_size:
+                raise GenerationQueueFull(f"В очереди уже {self._queued} задач")
+
+        future = asyncio.get_running_loop().create_future()
+        self._queues.setdefault(user_id, deque()).append((factory, future, key, counted))
+        if counted:
+            self._user_pending[user_id] = self._user_pending.get(user_id, 0) + 1
+        self._queued += 1
+        if key is not None:
+            self._jobs[key] = future
+        self._pump()
+        return future
+
+    def cancel(self, key) -> bool:
+        """Снимает с очереди ещё не начатую задачу; выполняющаяся доработает"""
+        future = self._jobs.get(key)
+        if future is None:
+            return False
+        for user_id, queue in self._queues.items():
+            for job in queue:
+                if job[2] != key:
+                    continue
+                queue.remove(job)
+                if not queue:
+                    del self._queues[user_id]
+                self._queued -= 1
+                if job[3]:
+                    self._release(user_id)
+                del self._jobs[key]
+                future.cancel()
+                return True
+        return False
+
+    def _release(self, user_id):
+        pending = self._user_pending.get(user_id, 1) - 1
+        if pending:
+            self._user_pending[user_id] = pending
+        else:
+            self._user_pending.pop(user_id, None)
+
+    async def run(self, user_id, factory, key=None, bounded: bool = True):
+        """submit() и ожидание результата; отмена ожидающего не отменяет задачу"""
+        return await asyncio.shield(self.submit(user_id, factory, key, bounded))
+
+    def _pump(self):
+        while self._running < self.slots and self._queues:
+            user_id, queue = next(iter(self._queues.items()))
+            job = queue.popleft()
+            # Пользователь уходит в конец круга, следующий слот — другому
+            if queue:
+                self._queues.move_to_end(user_id)
+            else:
+                del self._queues[user_id]
+            self._queued -= 1
+            self._running += 1
+            task = asyncio.ensure_future(self._execute(user_id, job))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+
+    async def _execute(self, user_id, job):
+        factory, future, key, counted = job
+        try:
+            result = await factory()
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except Exception as e:
+            if not future.done():
+                future.set_exception(e)
+        else:
+            if not future.done():
+                future.set_result(result)
+        finally:
+            self._running -= 1
+            if counted:
+                self._release(user_id)
+            if key is not None:
+                self._jobs.pop(key, None)
+            self._pump()
+
+
+generation_scheduler = FairScheduler(
+    'generation',
+    slots=generation_executor.workers,
+    queue_size=GENERATION_QUEUE_SIZE,
+    per_user=USER_MAX_PENDING_JOBS,
+)
+# Разовые запуски LibreOffice тоже можно вести параллельно, но не без меры
+pdf_scheduler = FairScheduler(
+    'pdf',
+    slots=PDF_POOL_SIZE or 2,
+    queue_size=GENERATION_QUEUE_SIZE,
+    per_user=USER_MAX_PENDING_JOBS,
+)
+
+registry.register(Gauge(
+    'kp_scheduler_queued',
+    'Задачи, ждущие слота в планировщике',
+    labels=('scheduler',),
+    callback=lambda: {
+        (scheduler.name,): scheduler.queued
+        for scheduler in (generation_scheduler, pdf_scheduler)
+    },
+))
@@ -0,0 +1,119 @@
+"""Сборка КП заранее, пока пользователь отвечает на последний вопрос.
+
+После ввода лицензий сотрудников известно всё, кроме on-premises, поэтому
+оба варианта ставятся в очередь генерации сразу. Нажатие кнопки забирает
+уже собранный (или собирающийся) вариант, а второй снимается с очереди,
+если ещё не начат. Готовые КП попадают в кэш результатов — по нему
+обработчик их и находит.
+
+Заранее работа запускается только при свободной очереди и не больше
+SPECULATIVE_MAX_JOBS задач одновременно, чтобы не задерживать КП, которые
+уже кто-то ждёт. В лимит задач пользователя такие сборки не входят.
+"""
+import functools
+import logging
+
+from bot.executor import generation_executor, GenerationQueueFull
+from bot.metrics import registry, Counter
+from bot.ppt_service import ppt_service, generate_kp
+from bot.result_cache import result_cache
+from bot.scheduler import generation_scheduler
+from config.config import SPECULATIVE_MAX_JOBS
+
+SPECULATIVE_JOBS = registry.register(Counter(
+    'kp_speculative_jobs_total',
+    'Заранее запущенные сборки КП по исходу',
+    labels=('result',),
+))
+
+ON_PREMISES_VARIANTS = ("Да", "Нет")
+
+
+def kp_job_key(user_id, file_id: str) -> str:
+    """Ключ задачи генерации: повторная постановка того же КП не запускает его снова"""
+    return f"{user_id}:kp:{file_id}"
+
+
+class SpeculativeRenderer:
+    """Заранее собранные варианты КП по пользователям"""
+
+    def __init__(self, max_jobs: int):
+        self.max_jobs = max_jobs
+        self.logger = logging.getLogger('SpeculativeRenderer')
+        # user_id -> {ключ КП: future задачи в планировщике}
+        self._users = {}
+        self._running = 0
+
+    @property
+    def enabled(self) -> bool:
+        # Результат передаётся через кэш, без него заранее собирать бессмысленно
+        return self.max_jobs > 0 and result_cache.enabled
+
+    def start(self, user_id, data: dict):
+        """Ставит в очередь оба варианта on-premises для данных анкеты"""
+        self.cancel(user_id)
+        if not self.enabled:
+            return
+        jobs = {}
+        for on_premises in ON_PREMISES_VARIANTS:
+            variant = dict(data, on_premises=on_premises)
+            file_id = ppt_service.cache_key(variant['template_type'], variant)
+            job_key = kp_job_key(user_id, file_id)
+            if file_id in result_cache or generation_scheduler.is_pending(job_key):
+                continue
+            # Очередь не пуста — слоты нужнее тем, кто уже ждёт
+            if self._running >= self.max_jobs or generation_scheduler.queued:
+                SPECULATIVE_JOBS.inc(result='skipped')
+                continue
+            try:
+                future = generation_scheduler.submit(
+                    user_id,
+                    functools.partial(generation_executor.run, generate_kp,
+                                      variant['template_type'], variant),
+                    key=job_key,
+                    # Пользователь об этих задачах не просил: его /kp и
+                    # кнопки не должны упираться в USER_MAX_PENDING_JOBS
+                    counted=False
+                )
+            except GenerationQueueFull:
+                SPECULATIVE_JOBS.inc(result='skipped')
+                continue
+            self._running += 1
+            future.add_done_callback(functools.partial(self._done, user_id, file_id))
+            jobs[file_id] = future
+            SPECULATIVE_JOBS.inc(result='started')
+        if jobs:
+            self._users[user_id] = jobs
+
+    def _done(self, user_id, file_id: str, future):
+        self._running -= 1
+        jobs = self._users.get(user_id)
+        if jobs is not None and jobs.get(file_id) is future:
+            del jobs[file_id]
+            if not jobs:
+                del self._users[user_id]
+        if future.cancelled():
+            return
+        if future.exception() is not None:
+            self.logger.warning("Заранее КП не собралось: %s", future.exception())
+            return
+        if future.result():
+            result_cache.put(file_id, *future.result())
+
+    def claim(self, user_id, file_id: str):
+        """Future выбранного варианта, если он ещё собирается; остальные снимаются"""
+        jobs = self._users.pop(user_id, None) or {}
+        future = jobs.pop(file_id, None)
+        for other_id in jobs:
+            if generation_scheduler.cancel(kp_job_key(user_id, other_id)):
+                SPECULATIVE_JOBS.inc(result='cancelled')
+        if future is not None:
+            SPECULATIVE_JOBS.inc(result='used')
+        return future
+
+    def cancel(self, user_id):
+        """Снимает с очереди заранее поставленные задачи пользователя"""
+        self.claim(user_id, None)
+
+
+speculative = SpeculativeRenderer(SPECULATIVE_MAX_JOBS)
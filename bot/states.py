@@ -7,3 +7,7 @@ class FormKP(StatesGroup):
     hr_licenses = State()
     employee_licenses = State()
     on_premises = State()
+
+
+class BatchKP(StatesGroup):
+    file = State()
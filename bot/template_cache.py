@@ -0,0 +1,91 @@
+import copy
+import hashlib
+import io
+import logging
+import os
+import threading
+
+from bot.metrics import STAGE_SECONDS
+
+
+class CachedTemplate:
+    """Разобранный и подготовленный шаблон вместе с mtime файла"""
+
+    def __init__(self, path: str, mtime_ns: int, blob: bytes, presentation,
+                 index=None):
+        self.path = path
+        self.mtime_ns = mtime_ns
+        # Подготовленный шаблон в виде .pptx
+        self.blob = blob
+        self.digest = hashlib.sha256(blob).hexdigest()
+        self.presentation = presentation
+        # То, что вернул prepare (индекс мест подстановки)
+        self.index = index
+
+
+class TemplateCache:
+    """Кэш шаблонов: каждый файл разбирается и нормализуется один раз,
+    на запрос выдаётся глубокая копия готового дерева"""
+
+    def __init__(self, prepare=None):
+        # prepare(prs) вызывается один раз после загрузки шаблона,
+        # его результат сохраняется в CachedTemplate.index
+        self.prepare = prepare
+        self.logger = logging.getLogger('TemplateCache')
+        self._entries = {}
+        self._lock = threading.Lock()
+
+    def _load(self, path: str, mtime_ns: int) -> CachedTemplate:
+        # python-pptx тянет lxml и PIL, поэтому импортируется при первой загрузке
+        from pptx import Presentation
+
+        with STAGE_SECONDS.time(stage='template_load'):
+            prs = Presentation(path)
+            index = self.prepare(prs) if self.prepare is not None else None
+            buffer = io.BytesIO()
+            prs.save(buffer)
+            blob = buffer.getvalue()
+            # Эталон перечитывается из байтов: у объекта, с которым уже работали,
+            # python-pptx держит прокси на дочерние элементы, а deepcopy lxml
+            # копирует их отдельно от корня, и правки копии бы терялись
+            pristine = Presentation(io.BytesIO(blob))
+        self.logger.info("Шаблон %s загружен в кэш", path)
+        return CachedTemplate(path, mtime_ns, blob, pristine, index)
+
+    def entry(self, path: str) -> CachedTemplate:
+        """Возвращает запись кэша, перечитывая файл при смене mtime"""
+        mtime_ns = os.stat(path).st_mtime_ns
+        cached = self._entries.get(path)
+        if cached is not None and cached.mtime_ns == mtime_ns:
+            return cached
+
+        with self._lock:
+            cached = self._entries.get(path)
+            if cached is None or cached.mtime_ns != mtime_ns:
+                cached = self._load(path, mtime_ns)
+                self._entries[path] = cached
+        return cached
+
+    def clone(self, cached: CachedTemplate):
+        """Отдаёт независимую копию подготовленной презентации"""
+        # К эталону никто не обращается напрямую, поэтому копировать
+        # его можно из нескольких потоков одновременно
+        return copy.deepcopy(cached.presentation)
+
+    def get(self, path: str):
+        return self.clone(self.entry(path))
+
+    def warm(self, paths):
+        """Заранее загружает шаблоны, пропуская отсутствующие"""
+        for path in paths:
+            try:
+                self.entry(path)
+            except FileNotFoundError:
+                self.logger.warning("Шаблон %s не найден", path)
+
+    def invalidate(self, path: str = None):
+        with self._lock:
+            if path is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(path, None)
@@ -0,0 +1,74 @@
+import re
+
+TEMPLATE_TYPES = ("long", "short")
+
+YES_WORDS = ("да", "yes", "y", "1", "true", "+")
+NO_WORDS = ("нет", "no", "n", "0", "false", "-", "")
+
+
+def parse_license_count(text) -> int:
+    """Число лицензий: целое больше нуля, иначе ValueError"""
+    value = int(str(text).strip())
+    if value <= 0:
+        raise ValueError("Число лицензий должно быть больше нуля")
+    return value
+
+
+def parse_on_premises(text) -> str:
+    """Флаг on-premises в виде, который хранится в FSM: «Да» / «Нет»"""
+    value = str(text).strip().lower()
+    if value in YES_WORDS:
+        return "Да"
+    if value in NO_WORDS:
+        return "Нет"
+    raise ValueError(f"Не понял ответ про on-premises: {text}")
+
+
+def parse_template_type(text) -> str:
+    value = str(text).strip().lower()
+    if value in ("long", "длинный"):
+        return "long"
+    if value in ("short", "короткий"):
+        return "short"
+    raise ValueError(f"Неизвестный вариант КП: {text}")
+
+
+def parse_company_name(text) -> str:
+    value = str(text).strip()
+    if not value:
+        raise ValueError("Пустое название компании")
+    return value
+
+
+# Кавычки, в которые можно взять название компании в однострочной команде
+QUOTES = {'"': '"', '«': '»', '“': '”', "'": "'"}
+_KP_ARGS_RE = re.compile(r'^\s*(\S+)\s+(.+?)\s+(\S+)\s+(\S+)\s+(\S+)\s*$', re.S)
+
+
+def parse_quote_args(text):
+    """Лицензии кадровика, сотрудников и необязательный on-premises:
+    «3 250 да» -> (3, 250, "Да")"""
+    args = str(text or "").split()
+    if len(args) not in (2, 3):
+        raise ValueError("Нужно два или три значения")
+    on_premises = parse_on_premises(args[2]) if len(args) == 3 else "Нет"
+    return parse_license_count(args[0]), parse_license_count(args[1]), on_premises
+
+
+def parse_kp_args(text) -> dict:
+    """Все ответы анкеты одной строкой: long "ООО Ромашка" 3 250 да.
+    Возвращает данные в том же виде, что собирает FSM, иначе ValueError"""
+    match = _KP_ARGS_RE.match(str(text or ""))
+    if match is None:
+        raise ValueError("Нужны вариант, компания, две цифры и on-premises")
+    template_type, company_name, hr_licenses, employee_licenses, on_premises = \
+        match.groups()
+    if len(company_name) > 1 and QUOTES.get(company_name[0]) == company_name[-1]:
+        company_name = company_name[1:-1]
+    return {
+        'template_type': parse_template_type(template_type),
+        'company_name': parse_company_name(company_name),
+        'hr_licenses': parse_license_count(hr_licenses),
+        'employee_licenses': parse_license_count(employee_licenses),
+        'on_premises': parse_on_premises(on_premises),
+    }
@@ -0,0 +1,130 @@
+import asyncio
+import logging
+import signal
+
+from aiohttp import web
+from aiogram import Bot, Dispatcher
+from aiogram.webhook.aiohttp_server import SimpleRequestHandler, setup_application
+
+from bot.executor import generation_executor
+from bot.pdf_converter import pdf_converter
+from bot.readiness import readiness
+from config.config import (
+    WEBHOOK_BASE_URL,
+    WEBHOOK_PATH,
+    WEBHOOK_SECRET,
+    WEB_SERVER_HOST,
+    WEB_SERVER_PORT,
+    WEBHOOK_MAX_CONCURRENT_UPDATES,
+    SHUTDOWN_DRAIN_TIMEOUT,
+)
+
+logger = logging.getLogger('webhook')
+
+
+class LimitedRequestHandler(SimpleRequestHandler):
+    """Обработчик вебхука: Telegram получает ответ сразу, а апдейты
+    обрабатываются в фоне не более max_concurrent одновременно"""
+
+    def __init__(self, dispatcher: Dispatcher, bot: Bot, max_concurrent: int,
+                 drain_timeout: float, **kwargs):
+        super().__init__(dispatcher=dispatcher, bot=bot,
+                         handle_in_background=True, **kwargs)
+        self._semaphore = asyncio.Semaphore(max_concurrent)
+        self.drain_timeout = drain_timeout
+        self.accepting = True
+
+    @property
+    def in_flight(self) -> int:
+        return len(self._background_feed_update_tasks)
+
+    async def handle(self, request: web.Request) -> web.Response:
+        if not self.accepting:
+            # Telegram повторит доставку, когда поднимется новый процесс
+            return web.Response(status=503, text="Shutting down")
+        return await super().handle(request)
+
+    async def _background_feed_update(self, bot: Bot, update):
+        async with self._semaphore:
+            await super()._background_feed_update(bot, update)
+
+    async def drain(self):
+        """Дожидается уже принятых апдейтов (в т.ч. идущих генераций)"""
+        self.accepting = False
+        tasks = set(self._background_feed_update_tasks)
+        if not tasks:
+            return
+        logger.info("Ожидаю завершения %s апдейтов", len(tasks))
+        _, pending = await asyncio.wait(tasks, timeout=self.drain_timeout)
+        if pending:
+            logger.warning("Не дождались %s апдейтов, отменяю", len(pending))
+            for task in pending:
+                task.cancel()
+
+    async def close(self):
+        await self.drain()
+        await super().close()
+
+
+def build_app(dp: Dispatcher, bot: Bot) -> web.Application:
+    """aiohttp-приложение с вебхуком и /health"""
+    app = web.Application()
+    handler = LimitedRequestHandler(
+        dispatcher=dp,
+        bot=bot,
+        max_concurrent=WEBHOOK_MAX_CONCURRENT_UPDATES,
+        drain_timeout=SHUTDOWN_DRAIN_TIMEOUT,
+        secret_token=WEBHOOK_SECRET or None,
+    )
+    # Регистрируется до setup_application, чтобы при остановке апдейты
+    # дослушивались раньше, чем закроются пулы в dp.shutdown
+    handler.register(app, path=WEBHOOK_PATH)
+    app['webhook_handler'] = handler
+
+    async def health(request: web.Request) -> web.Response:
+        return web.json_response({
+            'status': 'ok' if handler.accepting else 'stopping',
+            'in_flight_updates': handler.in_flight,
+            'pending_generations': generation_executor.pending,
+            'pdf_pool_ready': pdf_converter.ready,
+            'startup': readiness.snapshot(),
+        })
+
+    app.router.add_get('/health', health)
+
+    async def set_webhook(bot: Bot):
+        if not WEBHOOK_BASE_URL:
+            logger.warning("WEBHOOK_BASE_URL не задан, вебхук не регистрируется")
+            return
+        await bot.set_webhook(
+            WEBHOOK_BASE_URL.rstrip('/') + WEBHOOK_PATH,
+            secret_token=WEBHOOK_SECRET or None,
+            allowed_updates=dp.resolve_used_update_types(),
+        )
+
+    dp.startup.register(set_webhook)
+    setup_application(app, dp, bot=bot)
+    return app
+
+
+async def run_webhook(dp: Dispatcher, bot: Bot):
+    """Запускает веб-сервер и работает до SIGINT/SIGTERM"""
+    app = build_app(dp, bot)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    site = web.TCPSite(runner, WEB_SERVER_HOST, WEB_SERVER_PORT)
+    await site.start()
+    logger.info("Вебхук слушает %s:%s%s", WEB_SERVER_HOST, WEB_SERVER_PORT, WEBHOOK_PATH)
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        try:
+            loop.add_signal_handler(sig, stop.set)
+        except NotImplementedError:
+            # Windows: остаётся KeyboardInterrupt
+            pass
+    try:
+        await stop.wait()
+    finally:
+        # cleanup вызывает on_shutdown: дослушиваем апдейты и закрываем пулы
+        await runner.cleanup()
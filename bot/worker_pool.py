@@ -0,0 +1,236 @@
+"""Пул процессов-рендереров под присмотром (GENERATION_MODE=workers).
+
+Основной процесс принимает апдейты, а python-pptx работает в N отдельных
+процессах — каждый на своём ядре, без общего GIL. У каждого воркера своя
+пара каналов (Pipe): задача уходит одним сообщением, а байты результата
+передаются через send_bytes/recv_bytes без упаковки в pickle.
+
+В отличие от ProcessPoolExecutor, упавший или зависший воркер не ломает
+весь пул: его задача завершается ошибкой, а процесс перезапускается.
+Новые процессы берутся из forkserver — это чистый процесс без потоков,
+поэтому перезапуск безопасен, даже когда в основном процессе уже
+работают потоки.
+"""
+import logging
+import multiprocessing
+import queue
+import threading
+import time
+from concurrent.futures import Future
+
+from bot.metrics import registry, Counter
+
+WORKER_RESTARTS = registry.register(Counter(
+    'kp_worker_restarts_total',
+    'Перезапуски процессов-рендереров по причине',
+    labels=('reason',),
+))
+
+# Модули, которые forkserver импортирует один раз: воркеры стартуют уже с ними.
+# Пакет bot при импорте ничего не создаёт, Bot и Dispatcher живут в bot.app
+PRELOAD_MODULES = ['bot.ppt_service']
+# Пауза перед повторным перезапуском воркера, который падает сразу после старта
+MAX_RESTART_DELAY = 30
+
+
+class WorkerCrashed(Exception):
+    """Процесс-рендерер завершился, не вернув результат"""
+
+
+class WorkerTimeout(Exception):
+    """Задача не уложилась в таймаут, воркер перезапущен"""
+
+
+def _send_result(conn, result):
+    # bytes внутри кортежа результата идут отдельными сообщениями как есть
+    if isinstance(result, tuple):
+        parts = [isinstance(item, bytes) for item in result]
+        conn.send(('ok', tuple(None if is_bytes else item
+                               for item, is_bytes in zip(result, parts)), parts))
+        for item, is_bytes in zip(result, parts):
+            if is_bytes:
+                conn.send_bytes(item)
+    elif isinstance(result, bytes):
+        conn.send(('ok', None, True))
+        conn.send_bytes(result)
+    else:
+        conn.send(('ok', result, None))
+
+
+def _recv_result(conn):
+    status, value, parts = conn.recv()
+    if status == 'error':
+        raise value
+    if parts is True:
+        return conn.recv_bytes()
+    if parts:
+        return tuple(conn.recv_bytes() if is_bytes else item
+                     for item, is_bytes in zip(value, parts))
+    return value
+
+
+def _worker_main(conn, initializer):
+    """Цикл процесса-рендерера: задача -> результат, None — выход"""
+    if initializer is not None:
+        initializer()
+    conn.send(('ready', None, None))
+    while True:
+        try:
+            job = conn.recv()
+        except EOFError:
+            return
+        if job is None:
+            return
+        func, args = job
+        try:
+            result = func(*args)
+        except Exception as e:
+            try:
+                conn.send(('error', e, None))
+            except Exception:
+                # Исключение не упаковывается в pickle — передаём его текст
+                conn.send(('error', RuntimeError(repr(e)), None))
+        else:
+            _send_result(conn, result)
+
+
+class _Worker:
+    """Процесс и основной конец его канала"""
+
+    def __init__(self, context, index: int, initializer):
+        self.index = index
+        self.conn, child_conn = context.Pipe()
+        self.process = context.Process(
+            target=_worker_main, args=(child_conn, initializer),
+            name=f"kp-render-{index}", daemon=True,
+        )
+        self.process.start()
+        child_conn.close()
+
+    def stop(self, timeout: float = 5):
+        try:
+            self.conn.send(None)
+        except OSError:
+            pass
+        self.process.join(timeout)
+        if self.process.is_alive():
+            self.process.kill()
+            self.process.join()
+        self.conn.close()
+
+
+class WorkerPool:
+    """Пул с интерфейсом Executor (submit/shutdown) поверх своих процессов.
+
+    Каждым воркером управляет свой поток в основном процессе: берёт задачу
+    из общей очереди, отправляет её и ждёт ответа, следя за тем, что
+    процесс жив и укладывается в job_timeout.
+    """
+
+    def __init__(self, workers: int, initializer=None, job_timeout: float = None):
+        self.workers = max(1, workers)
+        self.initializer = initializer
+        self.job_timeout = job_timeout
+        self.logger = logging.getLogger('WorkerPool')
+        self._context = self._make_context()
+        self._jobs = queue.SimpleQueue()
+        self._shutdown = False
+        self._threads = [
+            threading.Thread(target=self._serve, args=(index,),
+                             name=f"kp-render-{index}", daemon=True)
+            for index in range(self.workers)
+        ]
+        for thread in self._threads:
+            thread.start()
+
+    @staticmethod
+    def _make_context():
+        if 'forkserver' in multiprocessing.get_all_start_methods():
+            context = multiprocessing.get_context('forkserver')
+            context.set_forkserver_preload(PRELOAD_MODULES)
+            return context
+        return multiprocessing.get_context('spawn')
+
+    def submit(self, func, *args) -> Future:
+        if self._shutdown:
+            raise RuntimeError("Пул воркеров остановлен")
+        future = Future()
+        self._jobs.put((future, func, args))
+        return future
+
+    def _start_worker(self, index: int, failures: int):
+        """Поднимает процесс и ждёт, пока он прогреется"""
+        if failures:
+            delay = min(2 ** (failures - 1), MAX_RESTART_DELAY)
+            self.logger.warning("Перезапуск воркера %s через %s с", index, delay)
+            time.sleep(delay)
+        try:
+            worker = _Worker(self._context, index, self.initializer)
+        except Exception:
+            self.logger.exception("Не удалось запустить воркер %s", index)
+            return None
+        try:
+            worker.conn.recv()
+        except (EOFError, OSError):
+            worker.stop(0)
+            return None
+        return worker
+
+    def _wait_result(self, worker: _Worker):
+        """Ждёт ответа, проверяя, что процесс жив и не завис"""
+        started = time.monotonic()
+        while not worker.conn.poll(0.5):
+            if not worker.process.is_alive():
+                raise WorkerCrashed(
+                    f"Воркер {worker.index} завершился с кодом {worker.process.exitcode}")
+            if self.job_timeout and time.monotonic() - started > self.job_timeout:
+                raise WorkerTimeout(f"Воркер {worker.index} не ответил за {self.job_timeout} с")
+        try:
+            return _recv_result(worker.conn)
+        except (EOFError, OSError):
+            raise WorkerCrashed(f"Воркер {worker.index} закрыл канал") from None
+
+    def _serve(self, index: int):
+        worker = None
+        while True:
+            failures = 0
+            while worker is None:
+                worker = self._start_worker(index, failures)
+                if worker is None:
+                    failures += 1
+                    WORKER_RESTARTS.inc(reason='start_failed')
+                    if self._shutdown:
+                        return
+
+            job = self._jobs.get()
+            if job is None:
+                worker.stop()
+                return
+            future, func, args = job
+            if not future.set_running_or_notify_cancel():
+                continue
+            try:
+                worker.conn.send((func, args))
+                result = self._wait_result(worker)
+            except (WorkerCrashed, WorkerTimeout, OSError) as e:
+                # Процесс больше не годится: задача — с ошибкой, воркер — заново
+                reason = 'timeout' if isinstance(e, WorkerTimeout) else 'crashed'
+                self.logger.error("%s, перезапускаю", e)
+                WORKER_RESTARTS.inc(reason=reason)
+                worker.stop(0)
+                worker = None
+                future.set_exception(e if not isinstance(e, OSError)
+                                     else WorkerCrashed(str(e)))
+            except Exception as e:
+                future.set_exception(e)
+            else:
+                future.set_result(result)
+
+    def shutdown(self, wait: bool = True):
+        """Задачи, уже стоящие в очереди, выполняются до остановки"""
+        self._shutdown = True
+        for _ in self._threads:
+            self._jobs.put(None)
+        if wait:
+            for thread in self._threads:
+                thread.join()
@@ -0,0 +1,200 @@
+"""Быстрая сборка КП на уровне zip-архива.
+
+Подготовленный шаблон (CachedTemplate.blob) уже сохранён python-pptx,
+поэтому все его части совпадают с тем, что python-pptx записал бы для
+заполненной копии, — кроме слайдов, где меняется текст. Здесь разбираются
+только эти слайды (тем же парсером и теми же классами python-pptx, так что
+правки полностью совпадают с движком pptx), а остальные части копируются
+в новый архив как есть, вместе со сжатыми данными.
+"""
+import io
+import struct
+import threading
+import time
+import zipfile
+import zlib
+from posixpath import join, normpath
+
+_LOCAL_HEADER = struct.Struct('<IHHHHHIIIHH')
+_CENTRAL_HEADER = struct.Struct('<IHHHHHHIIIHHHHHII')
+_END_RECORD = struct.Struct('<IHHHHIIH')
+
+_NS_P = 'http://schemas.openxmlformats.org/presentationml/2006/main'
+_NS_R = 'http://schemas.openxmlformats.org/officeDocument/2006/relationships'
+_NS_RELS = 'http://schemas.openxmlformats.org/package/2006/relationships'
+
+
+def _dos_datetime(date_time):
+    year, month, day, hour, minute, second = date_time
+    return ((hour << 11) | (minute << 5) | (second // 2),
+            ((year - 1980) << 9) | (month << 5) | day)
+
+
+class _Member:
+    """Часть архива шаблона: заголовок и сжатые данные как есть"""
+
+    __slots__ = ('info', 'name', 'record', 'data_offset')
+
+    def __init__(self, info: zipfile.ZipInfo, blob: memoryview):
+        self.info = info
+        self.name = info.filename
+        start = info.header_offset
+        name_length, extra_length = struct.unpack_from('<HH', blob, start + 26)
+        self.data_offset = start + 30 + name_length + extra_length
+        self.record = blob[start:self.data_offset + info.compress_size]
+
+
+def _slide_members(archive: zipfile.ZipFile):
+    """Имена частей слайдов в порядке показа"""
+    from lxml import etree
+
+    presentation = etree.fromstring(archive.read('ppt/presentation.xml'))
+    rels = etree.fromstring(archive.read('ppt/_rels/presentation.xml.rels'))
+    targets = {rel.get('Id'): rel.get('Target')
+               for rel in rels.iter(f'{{{_NS_RELS}}}Relationship')}
+    return [
+        normpath(join('ppt', targets[slide_id.get(f'{{{_NS_R}}}id')]))
+        for slide_id in presentation.iter(f'{{{_NS_P}}}sldId')
+    ]
+
+
+class _XmlSlide:
+    """Слайд с тем же интерфейсом фигур, что и у python-pptx"""
+
+    def __init__(self, element):
+        from pptx.shapes.shapetree import SlideShapes
+
+        self.element = element
+        self.shapes = SlideShapes(element.cSld.spTree, self)
+
+
+class _XmlSlides:
+    def __init__(self, deck):
+        self._deck = deck
+
+    def __getitem__(self, index: int):
+        return self._deck.slide(index)
+
+
+class XmlDeck:
+    """Заполняемая копия шаблона: разбираются только затронутые слайды.
+    Для индекса мест подстановки выглядит как Presentation (prs.slides[i])"""
+
+    def __init__(self, template: 'ZipTemplate'):
+        self.template = template
+        self.slides = _XmlSlides(self)
+        self._slides = {}
+
+    def slide(self, index: int) -> _XmlSlide:
+        slide = self._slides.get(index)
+        if slide is None:
+            from pptx.oxml import parse_xml
+
+            name = self.template.slide_names[index]
+            slide = self._slides[index] = _XmlSlide(
+                parse_xml(self.template.read(name)))
+        return slide
+
+    def changed_parts(self) -> dict:
+        """Имя части -> новый XML, сериализованный как в python-pptx"""
+        from pptx.opc.oxml import serialize_part_xml
+
+        return {
+            self.template.slide_names[index]: serialize_part_xml(slide.element)
+            for index, slide in self._slides.items()
+        }
+
+
+class ZipTemplate:
+    """Разобранный на части архив подготовленного шаблона"""
+
+    def __init__(self, blob: bytes, compresslevel: int = zlib.Z_DEFAULT_COMPRESSION):
+        self.blob = blob
+        self.compresslevel = compresslevel
+        # BytesIO над bytes не копирует данные, пока в него не пишут
+        with zipfile.ZipFile(io.BytesIO(blob)) as archive:
+            view = memoryview(blob)
+            self.members = [_Member(info, view) for info in archive.infolist()]
+            self.slide_names = _slide_members(archive)
+        self._by_name = {member.name: member for member in self.members}
+
+    def read(self, name: str) -> bytes:
+        member = self._by_name[name]
+        data = self.blob[member.data_offset:member.data_offset + member.info.compress_size]
+        if member.info.compress_type == zipfile.ZIP_DEFLATED:
+            return zlib.decompress(data, -15)
+        return data
+
+    def open(self) -> XmlDeck:
+        return XmlDeck(self)
+
+    def save(self, deck: XmlDeck) -> bytes:
+        return self.write(deck.changed_parts())
+
+    def write(self, changed: dict) -> bytes:
+        """Собирает архив: части из changed (имя -> содержимое) сжимаются
+        заново, остальные копируются"""
+        date_time = time.localtime(time.time())[:6]
+        chunks, central = [], []
+        offset = 0
+        for member in self.members:
+            info = member.info
+            content = changed.get(member.name)
+            if content is None:
+                record = member.record
+                crc, compress_size, file_size = info.CRC, info.compress_size, info.file_size
+                dos_time, dos_date = _dos_datetime(info.date_time)
+                method = info.compress_type
+            else:
+                compressor = zlib.compressobj(self.compresslevel, zlib.DEFLATED, -15)
+                data = compressor.compress(content) + compressor.flush()
+                crc, compress_size, file_size = zlib.crc32(content), len(data), len(content)
+                dos_time, dos_date = _dos_datetime(date_time)
+                method = zipfile.ZIP_DEFLATED
+                filename = info.filename.encode('utf-8' if info.flag_bits & 0x800 else 'ascii')
+                record = _LOCAL_HEADER.pack(
+                    0x04034b50, info.extract_version, info.flag_bits, method,
+                    dos_time, dos_date, crc, compress_size, file_size,
+                    len(filename), 0,
+                ) + filename + data
+            chunks.append(record)
+            central.append(self._central_entry(
+                info, method, dos_time, dos_date, crc, compress_size, file_size, offset))
+            offset += len(record)
+
+        directory = b''.join(central)
+        chunks.append(directory)
+        chunks.append(_END_RECORD.pack(
+            0x06054b50, 0, 0, len(central), len(central),
+            len(directory), offset, 0))
+        return b''.join(chunks)
+
+    @staticmethod
+    def _central_entry(info, method, dos_time, dos_date, crc, compress_size,
+                       file_size, offset):
+        filename = info.filename.encode('utf-8' if info.flag_bits & 0x800 else 'ascii')
+        return _CENTRAL_HEADER.pack(
+            0x02014b50, (info.create_system << 8) | info.create_version,
+            info.extract_version, info.flag_bits, method, dos_time, dos_date,
+            crc, compress_size, file_size, len(filename), len(info.extra),
+            len(info.comment), 0, info.internal_attr, info.external_attr, offset,
+        ) + filename + info.extra + info.comment
+
+
+class ZipTemplateCache:
+    """ZipTemplate для каждой версии подготовленного шаблона"""
+
+    def __init__(self):
+        self._templates = {}
+        self._lock = threading.Lock()
+
+    def get(self, cached) -> ZipTemplate:
+        entry = self._templates.get(cached.path)
+        if entry is not None and entry[0] == cached.digest:
+            return entry[1]
+        with self._lock:
+            entry = self._templates.get(cached.path)
+            if entry is None or entry[0] != cached.digest:
+                entry = (cached.digest, ZipTemplate(cached.blob))
+                self._templates[cached.path] = entry
+        return entry[1]
@@ -4,3 +4,118 @@ from dotenv import load_dotenv
 load_dotenv()
 
 BOT_TOKEN = os.getenv("BOT_TOKEN")
+
+# Пул генерации КП: thread | process | workers (процессы-рендереры
+# с перезапуском упавших и зависших, по одному на GENERATION_WORKERS)
+GENERATION_MODE = os.getenv("GENERATION_MODE", "thread")
+GENERATION_WORKERS = int(os.getenv("GENERATION_WORKERS", os.cpu_count() or 2))
+# Сколько задач может ждать свободного воркера сверх уже выполняющихся
+GENERATION_QUEUE_SIZE = int(os.getenv("GENERATION_QUEUE_SIZE", "20"))
+# Таймаут одной генерации, секунды
+GENERATION_TIMEOUT = float(os.getenv("GENERATION_TIMEOUT", "120"))
+
+# Лимит тяжёлых действий (генерация, PDF, пакет) на пользователя:
+# ведро на RATE_LIMIT_BURST токенов, пополняется RATE_LIMIT_PER_MINUTE в минуту
+RATE_LIMIT_PER_MINUTE = float(os.getenv("RATE_LIMIT_PER_MINUTE", "6"))
+RATE_LIMIT_BURST = int(os.getenv("RATE_LIMIT_BURST", "3"))
+# Сколько задач одного пользователя может стоять в очереди одновременно
+USER_MAX_PENDING_JOBS = int(os.getenv("USER_MAX_PENDING_JOBS", "2"))
+# Сколько КП всего может собираться заранее, пока пользователь выбирает
+# on-premises (оба варианта сразу после ввода лицензий); 0 — выключено
+SPECULATIVE_MAX_JOBS = int(os.getenv("SPECULATIVE_MAX_JOBS", "4"))
+# Сколько минут действует кнопка «Получить КП» под ответом инлайн-режима
+DEEP_LINK_TTL_MINUTES = int(os.getenv("DEEP_LINK_TTL_MINUTES", "1440"))
+
+# Движок сборки КП: zip — правятся только нужные слайды, остальные части
+# шаблона копируются как есть; pptx — полная модель python-pptx
+RENDER_ENGINE = os.getenv("RENDER_ENGINE", "zip")
+
+# Прайс и скидки от объёма; файл перечитывается при изменении без перезапуска
+PRICING_FILE = os.getenv("PRICING_FILE", "config/pricing.json")
+
+# Конвертация в PDF: число «тёплых» процессов LibreOffice (0 — только разовый запуск)
+PDF_POOL_SIZE = int(os.getenv("PDF_POOL_SIZE", "2"))
+LIBREOFFICE_BIN = os.getenv("LIBREOFFICE_BIN", "libreoffice")
+# Порты UNO: PDF_BASE_PORT, PDF_BASE_PORT + 1, ...
+PDF_BASE_PORT = int(os.getenv("PDF_BASE_PORT", "2002"))
+PDF_TIMEOUT = float(os.getenv("PDF_TIMEOUT", "60"))
+# Профили LibreOffice для каждого процесса пула (по умолчанию во временной папке)
+PDF_PROFILES_DIR = os.getenv("PDF_PROFILES_DIR", "")
+# pages — LibreOffice рендерит только изменённые слайды, остальные страницы
+# берутся из PDF шаблона (нужен pypdf); libreoffice — конвертация всего файла
+PDF_ENGINE = os.getenv("PDF_ENGINE", "pages")
+# Сколько отрендеренных страниц изменённых слайдов держать в памяти
+PDF_PAGE_CACHE_SIZE = int(os.getenv("PDF_PAGE_CACHE_SIZE", "500"))
+
+# Куда временно выкладываются файлы, когда они нужны на диске (конвертация в PDF).
+# Отдельная папка: сборщик мусора удаляет в ней старые папки задач job_*
+OUTPUT_SPOOL_DIR = os.getenv("OUTPUT_SPOOL_DIR", "templates/output/spool")
+# Сколько минут готовое КП доступно для кнопки «Сделать PDF»
+OUTPUT_TTL_MINUTES = int(os.getenv("OUTPUT_TTL_MINUTES", "10"))
+# Временные файлы старше OUTPUT_SPOOL_TTL_MINUTES удаляются (в том числе оставшиеся
+# от прошлых запусков), при превышении OUTPUT_SPOOL_MAX_MB — самые старые (0 — без квоты)
+OUTPUT_SPOOL_TTL_MINUTES = int(os.getenv("OUTPUT_SPOOL_TTL_MINUTES", "30"))
+OUTPUT_SPOOL_MAX_MB = int(os.getenv("OUTPUT_SPOOL_MAX_MB", "1024"))
+# Как часто проверяется квота, секунды
+JANITOR_INTERVAL = float(os.getenv("JANITOR_INTERVAL", "60"))
+
+# Превью слайда с расчётом: ширина картинки, шрифт с кириллицей (путь к .ttf)
+# и сколько превью держать в памяти
+PREVIEW_WIDTH = int(os.getenv("PREVIEW_WIDTH", "1000"))
+PREVIEW_FONT = os.getenv("PREVIEW_FONT", "")
+PREVIEW_CACHE_SIZE = int(os.getenv("PREVIEW_CACHE_SIZE", "200"))
+
+# Кэш готовых КП/PDF по хэшу (шаблон, данные, цены); 0 — отключён
+RESULT_CACHE_MAX_MB = int(os.getenv("RESULT_CACHE_MAX_MB", "200"))
+RESULT_CACHE_TTL_MINUTES = int(os.getenv("RESULT_CACHE_TTL_MINUTES", "60"))
+
+# Хранилище готовых КП для кнопки «Сделать PDF»: memory | sqlite | redis
+ARTIFACT_STORE = os.getenv("ARTIFACT_STORE", "memory")
+ARTIFACT_STORE_PATH = os.getenv("ARTIFACT_STORE_PATH", "data/artifacts.sqlite3")
+ARTIFACT_MAX_MB = int(os.getenv("ARTIFACT_MAX_MB", "500"))
+REDIS_URL = os.getenv("REDIS_URL", "redis://localhost:6379/0")
+
+# Хранилище состояний анкеты (FSM): memory | sqlite | redis (REDIS_URL)
+FSM_STORAGE = os.getenv("FSM_STORAGE", "sqlite")
+FSM_STORAGE_PATH = os.getenv("FSM_STORAGE_PATH", "data/fsm.sqlite3")
+# Брошенные анкеты удаляются через FSM_TTL_MINUTES без изменений
+FSM_TTL_MINUTES = int(os.getenv("FSM_TTL_MINUTES", "1440"))
+# Как часто изменения сбрасываются на диск, секунды
+FSM_FLUSH_INTERVAL = float(os.getenv("FSM_FLUSH_INTERVAL", "0.2"))
+
+# Режим получения апдейтов: polling | webhook
+BOT_MODE = os.getenv("BOT_MODE", "polling")
+# Публичный адрес, на который Telegram шлёт апдейты, например https://kp.example.com
+WEBHOOK_BASE_URL = os.getenv("WEBHOOK_BASE_URL", "")
+WEBHOOK_PATH = os.getenv("WEBHOOK_PATH", "/webhook")
+WEBHOOK_SECRET = os.getenv("WEBHOOK_SECRET", "")
+WEB_SERVER_HOST = os.getenv("WEB_SERVER_HOST", "0.0.0.0")
+WEB_SERVER_PORT = int(os.getenv("WEB_SERVER_PORT", "8080"))
+# Сколько апдейтов обрабатывается одновременно, остальные ждут
+WEBHOOK_MAX_CONCURRENT_UPDATES = int(os.getenv("WEBHOOK_MAX_CONCURRENT_UPDATES", "100"))
+# Сколько секунд при остановке ждать уже принятые апдейты
+SHUTDOWN_DRAIN_TIMEOUT = float(os.getenv("SHUTDOWN_DRAIN_TIMEOUT", "60"))
+# Свой адрес Bot API (локальный сервер или заглушка для тестов)
+TELEGRAM_API_URL = os.getenv("TELEGRAM_API_URL", "")
+
+# Пакетная генерация /batch_kp
+BATCH_MAX_ROWS = int(os.getenv("BATCH_MAX_ROWS", "200"))
+BATCH_MAX_FILE_MB = int(os.getenv("BATCH_MAX_FILE_MB", "5"))
+# Размер одного архива с результатом: Telegram принимает от бота файлы до 50 МБ,
+# больший пакет делится на несколько архивов
+BATCH_ARCHIVE_MAX_MB = float(os.getenv("BATCH_ARCHIVE_MAX_MB", "49"))
+
+# Прогрев шаблонов и пула LibreOffice при старте:
+# background — бот сразу принимает апдейты, прогрев идёт в фоне;
+# blocking — апдейты начинают приниматься после прогрева
+STARTUP_WARMUP = os.getenv("STARTUP_WARMUP", "background")
+
+# Метрики Prometheus: /metrics на отдельном локальном сервере
+# (в режиме webhook тоже, чтобы не светить его наружу); METRICS_PORT=0 — не поднимать
+METRICS_HOST = os.getenv("METRICS_HOST", "127.0.0.1")
+METRICS_PORT = int(os.getenv("METRICS_PORT", "9100"))
+
+# Логи: text | json; LOG_SAMPLE_RATE — доля сохраняемых записей уровня INFO и ниже
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO")
+LOG_FORMAT = os.getenv("LOG_FORMAT", "text")
+LOG_SAMPLE_RATE = float(os.getenv("LOG_SAMPLE_RATE", "1.0"))
@@ -1,14 +1,89 @@
+import time
+
+# Отсчёт времени запуска ведётся до тяжёлых импортов
+STARTED_AT = time.monotonic()
+
 import asyncio
 import logging
-from bot import dp, bot
+from bot.app import dp, bot
+from bot.executor import generation_executor
+from bot.pdf_converter import pdf_converter
+from bot.pdf_pages import pdf_pages
+from bot.ppt_service import ppt_service
+from bot.artifact_store import artifact_store
+from bot.janitor import janitor
+from bot.logging_setup import setup_logging
+from bot.metrics import start_metrics_server
+from bot.readiness import readiness
+from config.config import BOT_MODE, METRICS_HOST, METRICS_PORT, STARTUP_WARMUP
 
 # Настройка логирования
-logging.basicConfig(level=logging.INFO)
+setup_logging()
+logger = logging.getLogger('main')
+
+background_tasks = set()
+metrics_runner = None
+
+
+async def on_startup():
+    global metrics_runner
+    if METRICS_PORT:
+        try:
+            metrics_runner = await start_metrics_server(METRICS_HOST, METRICS_PORT)
+            logger.info("Метрики доступны на http://%s:%s/metrics",
+                        METRICS_HOST, METRICS_PORT)
+        except OSError as e:
+            logger.warning("Не удалось поднять сервер метрик: %s", e)
+    # Временные файлы прошлых запусков и квота на папку выгрузки
+    await janitor.start()
+    warmup = asyncio.ensure_future(warm_components())
+    if STARTUP_WARMUP == "blocking":
+        await warmup
+    else:
+        # Бот уже принимает апдейты, прогрев идёт в фоне
+        background_tasks.add(warmup)
+        warmup.add_done_callback(background_tasks.discard)
+    readiness.mark('accepting_updates')
+
+
+async def warm_components():
+    readiness.expect('generation_pool', 'templates', 'pdf_pool', 'pdf_pages')
+    # Процессы пула генерации форкаются до запуска потоков прогрева:
+    # fork посреди импорта в соседнем потоке может подвесить дочерний процесс
+    await readiness.track('generation_pool', generation_executor.warm())
+    # Шаблоны (вместе с импортом python-pptx) и пул LibreOffice — параллельно
+    await readiness.warm(
+        templates=asyncio.to_thread(ppt_service.warm_templates),
+        pdf_pool=pdf_converter.start(),
+    )
+    # PDF шаблонов — уже тёплым пулом LibreOffice
+    await readiness.track('pdf_pages', pdf_pages.warm())
+
+
+async def on_shutdown():
+    for task in background_tasks:
+        task.cancel()
+    # Дожидаемся уже запущенных генераций
+    await generation_executor.shutdown()
+    await pdf_converter.close()
+    await artifact_store.close()
+    await janitor.close()
+    if metrics_runner is not None:
+        await metrics_runner.cleanup()
 
 
 async def main():
-    print("🤖 Бот для создания КП запускается...")
-    await dp.start_polling(bot)
+    readiness.begin(STARTED_AT)
+    readiness.mark('imports')
+    logger.info("🤖 Бот для создания КП запускается...")
+    dp.startup.register(on_startup)
+    dp.shutdown.register(on_shutdown)
+
+    if BOT_MODE == "webhook":
+        from bot.webhook import run_webhook
+        await run_webhook(dp, bot)
+    else:
+        await dp.start_polling(bot)
 
 if __name__ == "__main__":
     asyncio.run(main())